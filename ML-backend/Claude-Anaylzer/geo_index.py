@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+import re
+import sys
+import math
+import time
+import random
+import argparse
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE_LAT = 111320.0
+
+# Default grid cell size (~1.1 km of latitude)
+DEFAULT_CELL_DEG = 0.01
+
+# How closely model-returned coordinates must match numbers stated in the upload (~50 m)
+STATED_COORDINATE_TOLERANCE = 5e-4
+
+_DECIMAL_RE = re.compile(r"[-+]?\d{1,3}\.\d+")
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _as_point(lat, lon):
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return lat, lon
+
+
+def _candidate_point(candidate):
+    if not isinstance(candidate, dict):
+        return None
+    lat = candidate.get("lat", candidate.get("latitude"))
+    lon = candidate.get("lon", candidate.get("lng", candidate.get("longitude")))
+    return _as_point(lat, lon)
+
+
+def stated_in_text(point, text, tolerance=STATED_COORDINATE_TOLERANCE):
+    """
+    Check that both coordinates of a point appear as decimal numbers in a text
+
+    Used to accept model-returned coordinates only when the caller actually
+    said them, rather than the model geocoding an address or landmark.
+    """
+    if not point or not text:
+        return False
+    numbers = [float(n) for n in _DECIMAL_RE.findall(text)]
+    lat, lon = point
+    return (any(abs(n - lat) <= tolerance for n in numbers)
+            and any(abs(n - lon) <= tolerance for n in numbers))
+
+
+def model_coordinates(response):
+    """(lat, lon) from a Grok response's `location.coordinates`, or None"""
+    if isinstance(response, dict) and isinstance(response.get("location"), dict):
+        return _candidate_point(response["location"].get("coordinates"))
+    return None
+
+
+def drop_unstated_coordinates(response, item):
+    """
+    Clear `location.coordinates` in a Grok response unless the upload states them
+
+    Args:
+        response: Parsed Grok response (modified in place)
+        item: Upload dictionary the response is for
+
+    Returns:
+        True if coordinates were dropped
+    """
+    point = model_coordinates(response)
+    if not point or stated_in_text(point, (item or {}).get("transcript")):
+        return False
+    response["location"]["coordinates"] = None
+    return True
+
+
+def extract_coordinates(result):
+    """
+    Find the report location in an analyzer result
+
+    Checks coordinate fields on the original upload first, then the Grok
+    response (`location.coordinates`), which is only trusted when the same
+    numbers appear in the upload's transcript.
+
+    Args:
+        result: Result dictionary as written by GrokAnalyzer.save_result
+
+    Returns:
+        (lat, lon) tuple, or None if the report has no usable coordinates
+    """
+    if not isinstance(result, dict):
+        return None
+    original = result.get("original_data")
+    if not isinstance(original, dict):
+        original = {}
+    candidates = [original.get("coordinates"), original]
+    if isinstance(original.get("location"), dict):
+        candidates.insert(1, original["location"].get("coordinates"))
+    for candidate in candidates:
+        point = _candidate_point(candidate)
+        if point:
+            return point
+
+    point = model_coordinates(result.get("grok_response"))
+    if point and stated_in_text(point, original.get("transcript")):
+        return point
+    return None
+
+
+class GeoGridIndex:
+    """
+    Uniform-grid spatial index over report locations
+
+    Points are bucketed into fixed-size lat/lon cells. Radius and bounding-box
+    queries only visit the cells overlapping the query area and then filter by
+    exact distance; nearest-report lookups search outwards ring by ring.
+    """
+
+    def __init__(self, cell_deg=DEFAULT_CELL_DEG):
+        """
+        Initialize an empty index
+
+        Args:
+            cell_deg: Grid cell size in degrees
+        """
+        self.cell_deg = cell_deg
+        self._points = {}
+        self._cells = {}
+        self._bounds = (0, 0, 0, 0)  # min_i, min_j, max_i, max_j of cells ever occupied
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, item_id):
+        return item_id in self._points
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def add(self, item_id, lat, lon):
+        """Insert or move a point"""
+        self.remove(item_id)
+        cell = self._cell(lat, lon)
+        if not self._points:
+            self._bounds = cell + cell
+        else:
+            min_i, min_j, max_i, max_j = self._bounds
+            self._bounds = (min(min_i, cell[0]), min(min_j, cell[1]), max(max_i, cell[0]), max(max_j, cell[1]))
+        self._points[item_id] = (lat, lon)
+        self._cells.setdefault(cell, set()).add(item_id)
+
+    def remove(self, item_id):
+        """Remove a point. Returns True if it was present."""
+        point = self._points.pop(item_id, None)
+        if point is None:
+            return False
+        cell = self._cell(*point)
+        self._cells[cell].discard(item_id)
+        if not self._cells[cell]:
+            del self._cells[cell]
+        return True
+
+    def add_result(self, result):
+        """
+        Index an analyzer result if it carries coordinates
+
+        Returns:
+            The (lat, lon) point indexed, or None
+        """
+        point = extract_coordinates(result)
+        if point:
+            self.add(result.get("id", "unknown"), *point)
+        return point
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Find all points inside a bounding box
+
+        Returns:
+            List of (item_id, lat, lon) tuples
+        """
+        lo_i, lo_j = self._cell(min_lat, min_lon)
+        hi_i, hi_j = self._cell(max_lat, max_lon)
+        found = []
+        if (hi_i - lo_i + 1) * (hi_j - lo_j + 1) > len(self._cells):
+            # Query area covers more cells than exist: scan occupied cells instead
+            cells = (ids for cell, ids in self._cells.items()
+                     if lo_i <= cell[0] <= hi_i and lo_j <= cell[1] <= hi_j)
+        else:
+            cells = (self._cells[(i, j)] for i in range(lo_i, hi_i + 1) for j in range(lo_j, hi_j + 1)
+                     if (i, j) in self._cells)
+        for ids in cells:
+            for item_id in ids:
+                lat, lon = self._points[item_id]
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                    found.append((item_id, lat, lon))
+        return found
+
+    def radius(self, lat, lon, radius_m, limit=None):
+        """
+        Find points within a radius, nearest first
+
+        Args:
+            lat, lon: Query location
+            radius_m: Search radius in meters
+            limit: Optional maximum number of results
+
+        Returns:
+            List of (item_id, distance_m) tuples sorted by distance
+        """
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        found = []
+        for item_id, plat, plon in self.bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+            distance = haversine_m(lat, lon, plat, plon)
+            if distance <= radius_m:
+                found.append((item_id, distance))
+        found.sort(key=lambda hit: hit[1])
+        return found[:limit] if limit else found
+
+    def nearest(self, lat, lon, k=1, exclude=(), max_distance_m=None):
+        """
+        Find the K nearest points by searching outwards ring by ring
+
+        Args:
+            lat, lon: Query location
+            k: Number of neighbours to return
+            exclude: Item IDs to skip (e.g. the query report itself)
+            max_distance_m: Optional cut-off distance
+
+        Returns:
+            List of (item_id, distance_m) tuples sorted by distance
+        """
+        if not self._points:
+            return []
+        ci, cj = self._cell(lat, lon)
+        # Smallest side of a cell in meters, so ring * cell_m never overestimates
+        cell_m = self.cell_deg * METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6)
+        min_i, min_j, max_i, max_j = self._bounds
+        max_ring = max(ci - min_i, max_i - ci, cj - min_j, max_j - cj, 0)
+        if max_distance_m is not None:
+            # Rings beyond the cut-off cannot hold a match
+            max_ring = min(max_ring, math.ceil(max_distance_m / cell_m) + 1)
+
+        best = []
+        for ring in range(max_ring + 1):
+            if (2 * ring + 1) ** 2 > 4 * len(self._cells):
+                # Sparse grid: the next rings are mostly empty cells, so scan the
+                # occupied cells not visited yet instead of walking them
+                for (i, j), ids in self._cells.items():
+                    if max(abs(i - ci), abs(j - cj)) < ring:
+                        continue
+                    for item_id in ids:
+                        if item_id not in exclude:
+                            plat, plon = self._points[item_id]
+                            best.append((item_id, haversine_m(lat, lon, plat, plon)))
+                best.sort(key=lambda hit: hit[1])
+                best = best[:k]
+                break
+            for i in range(ci - ring, ci + ring + 1):
+                edge = abs(i - ci) == ring
+                for j in (range(cj - ring, cj + ring + 1) if edge else (cj - ring, cj + ring)):
+                    for item_id in self._cells.get((i, j), ()):
+                        if item_id in exclude:
+                            continue
+                        plat, plon = self._points[item_id]
+                        best.append((item_id, haversine_m(lat, lon, plat, plon)))
+            best.sort(key=lambda hit: hit[1])
+            best = best[:k]
+            # Every cell outside this ring is at least ring * cell_m away
+            reach = ring * cell_m
+            if len(best) >= k and best[-1][1] <= reach:
+                break
+            if max_distance_m is not None and reach > max_distance_m:
+                break
+        if max_distance_m is not None:
+            best = [hit for hit in best if hit[1] <= max_distance_m]
+        return best
+
+    @classmethod
+    def from_work_items(cls, work_items, cell_deg=DEFAULT_CELL_DEG):
+        """
+        Build a grid index from a WorkItemIndex (entries carry lat/lon)
+
+        Args:
+            work_items: WorkItemIndex instance
+            cell_deg: Grid cell size in degrees
+
+        Returns:
+            GeoGridIndex instance
+        """
+        index = cls(cell_deg)
+        for entry in work_items.entries():
+            point = _as_point(entry.get("lat"), entry.get("lon"))
+            if point:
+                index.add(entry["id"], *point)
+        return index
+
+
+def _benchmark(n_points, n_queries=1000):
+    """Measure build and query latency on random points around San Francisco"""
+    center_lat, center_lon = 37.7749, -122.4194
+    points = [(f"r{i:07d}", center_lat + random.uniform(-0.5, 0.5), center_lon + random.uniform(-0.5, 0.5))
+              for i in range(n_points)]
+
+    index = GeoGridIndex()
+    started = time.perf_counter()
+    for item_id, lat, lon in points:
+        index.add(item_id, lat, lon)
+    print(f"⏱️  Built grid of {n_points} points in {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"({len(index._cells)} cells)")
+
+    queries = [(center_lat + random.uniform(-0.5, 0.5), center_lon + random.uniform(-0.5, 0.5))
+               for _ in range(n_queries)]
+    for desc, fn in [
+        ("radius 250 m", lambda lat, lon: index.radius(lat, lon, 250)),
+        ("radius 1 km", lambda lat, lon: index.radius(lat, lon, 1000)),
+        ("bbox 0.02°", lambda lat, lon: index.bbox(lat - 0.01, lon - 0.01, lat + 0.01, lon + 0.01)),
+        ("nearest 5", lambda lat, lon: index.nearest(lat, lon, k=5)),
+    ]:
+        started = time.perf_counter()
+        hits = sum(len(fn(lat, lon)) for lat, lon in queries)
+        elapsed = time.perf_counter() - started
+        print(f"⏱️  {desc}: {elapsed * 1000 / n_queries:.3f} ms/query (avg {hits / n_queries:.1f} hits)")
+
+
+def main():
+    """Command-line entry point for "reports near here" lookups"""
+    from work_item_index import WorkItemIndex
+
+    parser = argparse.ArgumentParser(description="Find processed reports near a location")
+    parser.add_argument("--output-dir", default="outputs", help="Directory containing result files")
+    parser.add_argument("--near", metavar="LAT,LON", help="Query location")
+    parser.add_argument("--radius", type=float, default=500, help="Search radius in meters")
+    parser.add_argument("--nearest", type=int, metavar="K", help="Return the K nearest reports instead")
+    parser.add_argument("--bbox", metavar="MIN_LAT,MIN_LON,MAX_LAT,MAX_LON", help="Bounding-box query")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Benchmark on N random points and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark)
+        return 0
+
+    work_items = WorkItemIndex.load(args.output_dir)
+    index = GeoGridIndex.from_work_items(work_items)
+
+    if args.bbox:
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in args.bbox.split(","))
+        hits = [(item_id, None) for item_id, _, _ in index.bbox(min_lat, min_lon, max_lat, max_lon)]
+    elif args.near:
+        lat, lon = (float(v) for v in args.near.split(","))
+        if args.nearest:
+            hits = index.nearest(lat, lon, k=args.nearest)
+        else:
+            hits = index.radius(lat, lon, args.radius)
+    else:
+        parser.error("one of --near, --bbox or --benchmark is required")
+
+    print(f"📍 {len(hits)} report(s) found ({len(index)} located of {len(work_items)} indexed)")
+    for item_id, distance in hits:
+        entry = work_items.get(item_id) or {}
+        where = f"{distance:>7.0f} m" if distance is not None else ""
+        print(f"  {where} [{entry.get('priority_score', 0):>3}] {entry.get('category', ''):<16} {item_id}  "
+              f"{entry.get('issue_summary') or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import queue
+import ipaddress
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from process_uploads import (
+    GrokAnalyzer,
+    ENDPOINT_URL,
+    UPDATE_ENDPOINT_URL,
+    SYSTEM_PROMPT_FILE,
+    OUTPUT_DIR,
+    is_valid_upload_id,
+)
+from usage_budget import pre_score, UNKNOWN_PRE_SCORE
+
+# Load environment variables from .env file
+load_dotenv()
+
+INGEST_HOST = os.getenv("INGEST_HOST", "0.0.0.0")
+INGEST_PORT = int(os.getenv("INGEST_PORT", os.getenv("PORT", "8080")))
+# Shared secret; requests must send "Authorization: Bearer <token>". Only optional on a loopback host.
+INGEST_TOKEN = os.getenv("INGEST_TOKEN", "")
+# Fallback full poll so uploads whose push was lost are still picked up
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL_SECONDS", "300"))
+# Longest single wait for the token budget before the queue is looked at again
+BUDGET_WAIT_MAX_SECONDS = 60
+
+
+class IngestQueue:
+    """
+    Push-based upload ingestion for the Grok Analyzer
+
+    Uploads arrive as IDs (pushes) or full payloads (reconciliation polls of
+    the Firebase endpoint) and are processed by a
+    single worker (the analyzer's indexes are not shared across threads),
+    highest keyword pre-score first and in arrival order within a score.
+    An upload pushed by ID waits at a placeholder score until it is fetched,
+    then goes back into the queue at its real pre-score.
+    When the token budget is spent the worker waits, so high-risk reports
+    that arrive meanwhile still go first. A reconciliation thread
+    periodically polls the full backlog and enqueues anything that was missed.
+    """
+
+    def __init__(self, analyzer, endpoint_url=ENDPOINT_URL, output_dir=OUTPUT_DIR,
+                 update_endpoint_url=UPDATE_ENDPOINT_URL, reconcile_interval=RECONCILE_INTERVAL):
+        self.analyzer = analyzer
+        self.endpoint_url = endpoint_url
+        self.output_dir = output_dir
+        self.update_endpoint_url = update_endpoint_url
+        self.reconcile_interval = reconcile_interval
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._reconcile_now = threading.Event()
+        self._stop = threading.Event()
+        self.stats = {"enqueued": 0, "processed": 0, "duplicates": 0, "reconciled": 0, "errors": 0,
+                      "invalid": 0, "budget_waits": 0, "retry_later": 0, "last_latency_seconds": None}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def stats_snapshot(self):
+        """Copy of the counters, safe to serialize while the worker runs"""
+        with self._lock:
+            return dict(self.stats)
+
+    def enqueue(self, upload_id, item=None):
+        """
+        Queue one upload for processing
+
+        Args:
+            upload_id: Upload document ID
+            item: Optional full upload payload as returned by the Firebase endpoint
+                  (skips the fetch by ID); never a payload from an ingest request
+
+        Returns:
+            True if queued, False if the ID is invalid or already pending or processed
+        """
+        if not is_valid_upload_id(upload_id):
+            self._count("invalid")
+            return False
+        with self._lock:
+            if upload_id in self._pending or self.analyzer.is_processed(upload_id, self.output_dir):
+                self.stats["duplicates"] += 1
+                return False
+            self._pending.add(upload_id)
+            self.stats["enqueued"] += 1
+        score = pre_score(item) if item else UNKNOWN_PRE_SCORE
+        self._queue.put((-score, next(self._sequence), time.monotonic(), upload_id, item))
+        return True
+
+    def request_reconcile(self):
+        """Ask the reconciliation thread to poll the backlog right away"""
+        self._reconcile_now.set()
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                entry = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            priority, sequence, queued_at, upload_id, item = entry
+            done = True
+            try:
+                fetched = item is None
+                if fetched:
+                    item = self.analyzer.fetch_upload(upload_id, self.endpoint_url)
+                if item is None:
+                    print(f"⚠️ Upload {upload_id} not found, dropping")
+                    continue
+                item.setdefault('id', upload_id)
+                if fetched and pre_score(item) != -priority:
+                    # Queued by ID at the placeholder score: requeue at its real one
+                    self._queue.put((-pre_score(item), sequence, queued_at, upload_id, item))
+                    done = False
+                    continue
+                if self._wait_for_budget(entry, item):
+                    done = False
+                    continue
+                print(f"\n🔄 Ingest: processing upload {upload_id} ({self.depth()} more queued)")
+                result = self.analyzer.process_item(item, self.output_dir, self.update_endpoint_url)
+                latency = time.monotonic() - queued_at
+                with self._lock:
+                    if result.get('transient'):
+                        # Not saved; the next reconciliation poll queues it again
+                        self.stats["retry_later"] += 1
+                    else:
+                        self.stats["processed"] += 1
+                    if 'error' in result:
+                        self.stats["errors"] += 1
+                    self.stats["last_latency_seconds"] = round(latency, 3)
+                print(f"⏱️  Upload {upload_id} done {latency:.1f}s after it was queued")
+            except Exception as e:
+                self._count("errors")
+                print(f"❌ Ingest error for upload {upload_id}: {e}")
+            finally:
+                if done:
+                    with self._lock:
+                        self._pending.discard(upload_id)
+                self._queue.task_done()
+
+    def _wait_for_budget(self, entry, item):
+        """
+        Put an upload back and wait if the token budget cannot cover it yet
+
+        Returns:
+            True if the upload was requeued
+        """
+        estimate = self.analyzer.scheduler.estimate_tokens(item)
+        if self.analyzer.budget.fits(estimate):
+            return False
+        wait = self.analyzer.budget.seconds_until_fits(estimate)
+        if wait is None:
+            # Bigger than the whole budget: run it rather than block the queue forever
+            print(f"⚠️ Upload {entry[3]} needs ~{estimate} tokens, more than the token budget allows")
+            return False
+        score, sequence, queued_at, upload_id, _ = entry
+        self._queue.put((score, sequence, queued_at, upload_id, item))
+        self._count("budget_waits")
+        print(f"⏸️  Token budget exhausted; upload {upload_id} (pre-score {-score}) waits {wait:.0f}s")
+        self._stop.wait(min(max(wait, 1), BUDGET_WAIT_MAX_SECONDS))
+        return True
+
+    def _reconciler(self):
+        while not self._stop.is_set():
+            self._reconcile_now.wait(timeout=self.reconcile_interval)
+            self._reconcile_now.clear()
+            if self._stop.is_set():
+                break
+            try:
+                items = self.analyzer.fetch_uploads(self.endpoint_url)
+            except Exception as e:
+                print(f"⚠️ Reconciliation poll failed: {e}")
+                continue
+            added = sum(1 for item in items if item.get('id') and self.enqueue(item['id'], item))
+            self._count("reconciled", added)
+            if added:
+                print(f"🔁 Reconciliation queued {added} missed upload(s)")
+
+    def start(self, reconcile_on_start=True):
+        """Start the worker and reconciliation threads"""
+        threading.Thread(target=self._worker, name="ingest-worker", daemon=True).start()
+        threading.Thread(target=self._reconciler, name="ingest-reconciler", daemon=True).start()
+        if reconcile_on_start:
+            self.request_reconcile()
+
+    def stop(self):
+        self._stop.set()
+        self._reconcile_now.set()
+
+
+def make_handler(ingest):
+    """Build the HTTP request handler bound to an IngestQueue"""
+
+    class IngestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self):
+            return not INGEST_TOKEN or self.headers.get("Authorization") == f"Bearer {INGEST_TOKEN}"
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok", "queue_depth": ingest.depth(), **ingest.stats_snapshot(),
+                                      "budget": ingest.analyzer.budget.report()})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/ingest":
+                return self._send_json(404, {"error": "not found"})
+            if not self._authorized():
+                return self._send_json(401, {"error": "unauthorized"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except (ValueError, json.JSONDecodeError):
+                return self._send_json(400, {"error": "invalid JSON body"})
+
+            if not isinstance(body, dict):
+                return self._send_json(400, {"error": "expected a JSON object"})
+
+            # Accepted shapes: {"id": ...}, {"ids": [...]}, {"upload": {...}}, {"uploads": [...]}
+            # Only the IDs are used: every upload is re-fetched from Firebase, so a
+            # pushed payload is never analyzed as sent. An empty body triggers an
+            # immediate reconciliation poll.
+            upload_ids = []
+            if isinstance(body.get("upload"), dict):
+                upload_ids.append(body["upload"].get("id"))
+            upload_ids += [u.get("id") for u in body.get("uploads", []) if isinstance(u, dict)]
+            if body.get("id"):
+                upload_ids.append(body["id"])
+            if isinstance(body.get("ids"), list):
+                upload_ids += body["ids"]
+
+            if not upload_ids:
+                ingest.request_reconcile()
+                return self._send_json(202, {"status": "reconcile_requested"})
+            if not all(is_valid_upload_id(upload_id) for upload_id in upload_ids):
+                return self._send_json(400, {"error": "every upload needs a valid id"})
+
+            queued = [upload_id for upload_id in upload_ids if ingest.enqueue(upload_id)]
+            self._send_json(202, {"queued": queued, "queue_depth": ingest.depth()})
+
+        def log_message(self, format, *args):
+            # Keep request logs out of the analyzer output
+            pass
+
+    return IngestHandler
+
+
+def is_loopback(host):
+    """True for hosts only reachable from this machine"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main():
+    """Run the analyzer as a push-based ingestion service"""
+    if not INGEST_TOKEN and not is_loopback(INGEST_HOST):
+        print(f"❌ INGEST_TOKEN is required when listening on {INGEST_HOST}; "
+              f"set it or use INGEST_HOST=127.0.0.1")
+        return 1
+    print("🚀 Initializing Grok Analyzer...")
+    analyzer = GrokAnalyzer(system_prompt_file=SYSTEM_PROMPT_FILE)
+    ingest = IngestQueue(analyzer)
+    ingest.start()
+
+    server = ThreadingHTTPServer((INGEST_HOST, INGEST_PORT), make_handler(ingest))
+    print(f"📥 Ingest endpoint listening on http://{INGEST_HOST}:{INGEST_PORT}/ingest")
+    print(f"🔁 Reconciliation poll every {RECONCILE_INTERVAL:.0f}s from {ENDPOINT_URL}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingest.stop()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
+
+XAI_BASE_URL = "https://api.x.ai/v1"
+
+# Retries per request on timeouts, connection errors, 429 and 5xx (not on 4xx)
+MAX_RETRIES = int(os.getenv("GROK_MAX_RETRIES", "2"))
+RETRY_BASE_SECONDS = float(os.getenv("GROK_RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("GROK_RETRY_MAX_SECONDS", "8"))
+# Per-attempt HTTP timeout
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("GROK_REQUEST_TIMEOUT_SECONDS", "60"))
+
+# Send a hedge to the backup once the primary is slower than this percentile of its recent latencies
+HEDGE_PERCENTILE = float(os.getenv("GROK_HEDGE_PERCENTILE", "95"))
+# Hedge delay used until enough latencies have been observed
+HEDGE_DEFAULT_SECONDS = float(os.getenv("GROK_HEDGE_DEFAULT_SECONDS", "20"))
+HEDGE_MIN_SAMPLES = 20
+
+# Circuit breaker: open when this share of the recent calls failed, retry after the cooldown
+BREAKER_WINDOW = int(os.getenv("GROK_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("GROK_BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("GROK_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("GROK_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Threads running attempts; stragglers hold one each until they finish, so keep headroom
+LLM_WORKERS = int(os.getenv("GROK_LLM_WORKERS", "32"))
+
+
+class CircuitOpenError(Exception):
+    """Raised when every provider's circuit breaker is open"""
+
+
+def is_retryable(error):
+    """Timeouts, connection failures, rate limits and server errors are worth retrying"""
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one provider
+
+    closed: calls flow, outcomes go into a rolling window.
+    open: calls are refused until the cooldown ends.
+    half-open: one trial call; success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS, error_rate=BREAKER_ERROR_RATE,
+                 cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may be sent now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half-open"
+            if self.state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record(self, success):
+        """Record the outcome of an allowed call"""
+        with self._lock:
+            if self.state == "half-open":
+                self._trial_running = False
+                if success:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._trip()
+
+    def _trip(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+class Provider:
+    """One OpenAI-compatible endpoint with its own breaker and latency history"""
+
+    def __init__(self, name, client, model=None):
+        self.name = name
+        self.client = client
+        self.model = model            # None: use the model the caller asked for
+        self.breaker = CircuitBreaker()
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self, percentile=HEDGE_PERCENTILE):
+        """Seconds to wait on this provider before hedging"""
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return HEDGE_DEFAULT_SECONDS
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(percentile / 100 * len(latencies)))]
+
+
+class ResilientLLM:
+    """
+    chat.completions.create with hedging, per-provider circuit breakers and retries
+
+    If the primary has not answered within its recent latency percentile, the
+    same request is sent to the backup provider and the first successful
+    answer wins. A provider whose breaker is open is skipped, so errors fail
+    over to the backup immediately. Failed attempts are retried with
+    exponential backoff and full jitter.
+
+    Attempts whose answer the caller never sees (failed attempts and losing
+    hedges) are still billed, so each one is passed to on_attempt.
+    """
+
+    def __init__(self, primary, backup=None, max_retries=MAX_RETRIES, hedge_percentile=HEDGE_PERCENTILE):
+        """
+        Args:
+            primary: Provider tried first
+            backup: Optional Provider for hedges and failover
+            max_retries: Retries after the first attempt
+            hedge_percentile: Primary latency percentile after which a hedge is sent
+        """
+        self.providers = [primary] + ([backup] if backup else [])
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self._pool = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+        self._local = threading.local()
+        # on_attempt(context, record) for every failed or losing attempt; record has
+        # provider, model, seconds, the raw usage object (or None), and error or discarded
+        self.on_attempt = None
+        self.stats = {"calls": 0, "hedges": 0, "backup_wins": 0, "retries": 0, "failovers": 0,
+                      "breaker_skips": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, api_key, base_url=XAI_BASE_URL):
+        """
+        Build the primary xAI provider plus an optional backup from the environment
+
+        GROK_BACKUP_BASE_URL / GROK_BACKUP_MODEL / GROK_BACKUP_API_KEY configure the
+        backup; without a backup URL or model, only retries and the breaker apply.
+        """
+        # Retries are done here, so the SDK's own retries are turned off
+        primary = Provider("primary", OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                             timeout=REQUEST_TIMEOUT_SECONDS))
+        backup = None
+        backup_url = os.getenv("GROK_BACKUP_BASE_URL")
+        backup_model = os.getenv("GROK_BACKUP_MODEL")
+        if backup_url or backup_model:
+            client = OpenAI(api_key=os.getenv("GROK_BACKUP_API_KEY", api_key), base_url=backup_url or base_url,
+                            max_retries=0, timeout=REQUEST_TIMEOUT_SECONDS)
+            backup = Provider("backup", client, backup_model)
+        return cls(primary, backup)
+
+    @property
+    def last_call(self):
+        """Details of the calling thread's most recent create() (provider, model, attempts, hedged)"""
+        return getattr(self._local, "last_call", None)
+
+    def _attempt(self, provider, model, kwargs, race):
+        """
+        Send the request to one provider
+
+        Returns:
+            Tuple of (provider, response, won); won is False for an answer that
+            arrived after another attempt of the same call had already succeeded
+        """
+        started = time.monotonic()
+        try:
+            response = provider.client.chat.completions.create(model=provider.model or model, **kwargs)
+        except Exception as e:
+            # Client errors (bad request, auth) say nothing about the provider's health
+            provider.breaker.record(not is_retryable(e))
+            self._report_attempt(race, provider, model, started, error=e)
+            raise
+        provider.observe(time.monotonic() - started)
+        provider.breaker.record(True)
+        with race["lock"]:
+            won = not race["won"]
+            race["won"] = True
+        if not won:
+            # A losing hedge: the caller never sees it, so its usage is reported here
+            self._report_attempt(race, provider, model, started, usage=getattr(response, "usage", None))
+            close = getattr(response, "close", None)
+            if callable(close):
+                # A losing stream would otherwise keep the connection busy
+                close()
+        return provider, response, won
+
+    def _report_attempt(self, race, provider, model, started, usage=None, error=None):
+        if self.on_attempt is None:
+            return
+        record = {"provider": provider.name, "model": provider.model or model,
+                  "seconds": round(time.monotonic() - started, 3), "usage": usage}
+        if error is not None:
+            record["error"] = f"{error.__class__.__name__}: {error}"
+        else:
+            record["discarded"] = True
+        try:
+            self.on_attempt(race["context"], record)
+        except Exception as e:
+            print(f"  ⚠️ Could not record attempt on {provider.name}: {e}")
+
+    def _take(self, candidates):
+        """Pop the next provider whose breaker admits a call now, or None"""
+        while candidates:
+            provider = candidates.pop(0)
+            if provider.breaker.allow():
+                return provider
+            self.stats["breaker_skips"] += 1
+        return None
+
+    def _hedged(self, model, kwargs, info, race):
+        """One attempt: primary, plus the backup as a hedge or failover"""
+        # A breaker is only asked when a call is really sent to it: allow() takes
+        # the half-open trial slot, and an unsent spare would never give it back
+        candidates = list(self.providers)
+        first = self._take(candidates)
+        if first is None:
+            raise CircuitOpenError("all providers have open circuit breakers")
+        if first is not self.providers[0]:
+            self.stats["failovers"] += 1
+
+        pending = {self._pool.submit(self._attempt, first, model, kwargs, race)}
+        delay = first.hedge_delay(self.hedge_percentile) if candidates else None
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            delay = None
+            if not done:
+                # Primary is a straggler: race the backup against it
+                spare = self._take(candidates)
+                if spare is not None:
+                    self.stats["hedges"] += 1
+                    info["hedged"] = True
+                    pending.add(self._pool.submit(self._attempt, spare, model, kwargs, race))
+                continue
+            for future in done:
+                try:
+                    provider, response, won = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if not won:
+                    # Finished a moment after the winner, which is still in pending
+                    continue
+                info["provider"] = provider.name
+                info["model"] = provider.model or model
+                if provider is not self.providers[0]:
+                    self.stats["backup_wins"] += 1
+                return response
+            if not pending and candidates and is_retryable(last_error):
+                # Primary failed fast: fail over now instead of waiting for a retry
+                spare = self._take(candidates)
+                if spare is not None:
+                    self.stats["failovers"] += 1
+                    pending.add(self._pool.submit(self._attempt, spare, model, kwargs, race))
+        raise last_error
+
+    def create(self, model, context=None, **kwargs):
+        """
+        Drop-in for client.chat.completions.create
+
+        For streaming requests the race is on opening the stream, which is
+        where stragglers stall; the losing stream is closed.
+
+        Args:
+            model: Model to request
+            context: Passed through to on_attempt (e.g. the item the call is for)
+            **kwargs: chat.completions.create arguments
+
+        Returns:
+            The winning provider's response (or stream)
+        """
+        self.stats["calls"] += 1
+        info = {"provider": None, "requested_model": model, "model": model, "attempts": 0, "hedged": False}
+        self._local.last_call = info
+        race = {"context": context, "won": False, "lock": threading.Lock()}
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            info["attempts"] = attempt + 1
+            try:
+                response = self._hedged(model, kwargs, info, race)
+                info["seconds"] = round(time.monotonic() - started, 3)
+                return response
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    self.stats["errors"] += 1
+                    # Every attempt has already been passed to on_attempt
+                    info["failed"] = True
+                    raise
+                backoff = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+                self.stats["retries"] += 1
+                print(f"  🔁 {e.__class__.__name__} from Grok, retry {attempt + 1}/{self.max_retries} "
+                      f"in {backoff:.1f}s")
+                time.sleep(backoff)
+
+    def breaker_states(self):
+        return {provider.name: provider.breaker.state for provider in self.providers}
+
+
+def _stub_server(straggler_rate, straggler_seconds, error_rate, base_seconds):
+    """
+    Start a stdlib OpenAI-compatible stub that injects slow and failing responses
+
+    Returns:
+        (server, base_url)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    answer = json.dumps({"issue_summary": "Pothole", "category": "pothole", "scores": {}, "confidence": {"overall": 0.9}})
+
+    usage = {"prompt_tokens": 1200, "completion_tokens": 300, "total_tokens": 1500,
+             "prompt_tokens_details": {"cached_tokens": 900, "image_tokens": 0}}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            roll = random.random()
+            if roll < error_rate:
+                time.sleep(base_seconds)
+                return self._send(500, {"error": {"message": "injected failure"}})
+            delay = straggler_seconds if roll < error_rate + straggler_rate else random.expovariate(1 / base_seconds)
+            time.sleep(delay)
+            if body.get("stream"):
+                return self._send_stream(body.get("model"), answer, (body.get("stream_options") or {}).get("include_usage"))
+            self._send(200, {
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": usage,
+            })
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except BrokenPipeError:
+                pass
+
+        def _send_stream(self, model, content, include_usage=False):
+            chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}]}
+            events = [chunk]
+            if include_usage:
+                events.append({**chunk, "choices": [], "usage": usage})
+            data = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+            data = data.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except BrokenPipeError:
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def _percentiles(latencies):
+    latencies = sorted(latencies)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    return f"p50 {pct(50):7.0f} ms   p95 {pct(95):7.0f} ms   p99 {pct(99):7.0f} ms   max {pct(100):7.0f} ms"
+
+
+def _benchmark(n_items, straggler_rate, straggler_seconds, error_rate, base_seconds, concurrency=8):
+    """Compare plain calls with hedged/retried calls against a straggler-injecting stub"""
+    _, primary_url = _stub_server(straggler_rate, straggler_seconds, error_rate, base_seconds)
+    _, backup_url = _stub_server(straggler_rate, straggler_seconds, error_rate, base_seconds)
+    messages = [{"role": "user", "content": "Transcript: pothole on Oak Street"}]
+    print(f"🧪 {n_items} items, {straggler_rate:.0%} stragglers ({straggler_seconds}s), "
+          f"{error_rate:.0%} errors, ~{base_seconds * 1000:.0f} ms typical\n")
+
+    plain = OpenAI(api_key="stub", base_url=primary_url, max_retries=0, timeout=REQUEST_TIMEOUT_SECONDS)
+    resilient = ResilientLLM(
+        Provider("primary", OpenAI(api_key="stub", base_url=primary_url, max_retries=0)),
+        Provider("backup", OpenAI(api_key="stub", base_url=backup_url, max_retries=0)),
+    )
+    # Warm the latency history so hedging uses the observed percentile
+    for _ in range(HEDGE_MIN_SAMPLES):
+        try:
+            resilient.create("stub-model", messages=messages)
+        except Exception:
+            pass
+    resilient.stats = {k: 0 for k in resilient.stats}
+
+    for name, call in [
+        ("plain", lambda: plain.chat.completions.create(model="stub-model", messages=messages)),
+        ("resilient", lambda: resilient.create("stub-model", messages=messages)),
+    ]:
+        def timed(_):
+            started = time.monotonic()
+            try:
+                call()
+                return time.monotonic() - started, True
+            except Exception:
+                return time.monotonic() - started, False
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, range(n_items)))
+        failures = sum(1 for _, ok in results if not ok)
+        print(f"⏱️  {name:<10} {_percentiles([s for s, _ in results])}   failed {failures}/{n_items}")
+    print(f"\n📊 Resilient client: {resilient.stats}")
+
+
+def main():
+    """Benchmark hedging and retries against a local stub server"""
+    parser = argparse.ArgumentParser(description="Tail-latency benchmark for analyzer LLM calls")
+    parser.add_argument("--benchmark", type=int, default=200, metavar="N", help="Number of requests per client")
+    parser.add_argument("--straggler-rate", type=float, default=0.05, help="Share of slow responses")
+    parser.add_argument("--straggler-seconds", type=float, default=2.0, help="Delay of a slow response")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of HTTP 500 responses")
+    parser.add_argument("--base-seconds", type=float, default=0.05, help="Mean delay of a normal response")
+    args = parser.parse_args()
+    _benchmark(args.benchmark, args.straggler_rate, args.straggler_seconds, args.error_rate, args.base_seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,18 +3,55 @@ import os
 import json
 import base64
 import re
+import time
 import requests
-from openai import OpenAI
 from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
+from stream_parser import IncrementalJSONParser
+from scoring import load_weights, apply_scores
+from work_item_index import WorkItemIndex
+from geo_index import GeoGridIndex, extract_coordinates, drop_unstated_coordinates
+from transcript_compactor import compact_transcript, estimate_tokens
+from llm_resilience import ResilientLLM, CircuitOpenError, is_retryable
+from usage_budget import UsageLedger, TokenBudget, Scheduler, usage_from_response, USAGE_LEDGER_NAME
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Fields needed to route a report into the right queue. In streaming mode a
+# provisional update is sent as soon as all of these have arrived; the
+# composite scores and severity_label are computed locally from the factors.
+ROUTING_FIELDS = ("category", "factors")
+
+# New reports are linked to existing work items within this distance
+NEARBY_RADIUS_M = float(os.getenv("NEARBY_RADIUS_M", "250"))
+
+# Firestore document IDs. Upload IDs end up in file paths and sourceRefs, so
+# anything else (slashes, dots, spaces) is rejected.
+UPLOAD_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def is_valid_upload_id(upload_id):
+    """Check an upload ID against UPLOAD_ID_RE"""
+    return isinstance(upload_id, str) and bool(UPLOAD_ID_RE.match(upload_id))
+
+
+def result_path(item_id, output_dir="outputs"):
+    """
+    Path of the result file for an upload
+    
+    Raises:
+        ValueError: If the ID is not a valid upload ID
+    """
+    if not is_valid_upload_id(item_id):
+        raise ValueError(f"Invalid upload ID: {item_id!r}")
+    return os.path.join(output_dir, f"{item_id}.json")
+
 
 class GrokAnalyzer:
-    def __init__(self, api_key=None, model=None, system_prompt_file="system_prompt.txt"):
+    def __init__(self, api_key=None, model=None, system_prompt_file="system_prompt.txt", stream=None,
+                 cascade=None):
         """
         Initialize the Grok Analyzer
         
@@ -22,14 +59,45 @@ class GrokAnalyzer:
             api_key: xAI API key (defaults to XAI_API_KEY env var)
             model: Grok model to use (defaults to GROK_MODEL env var or grok-3-mini-fast)
             system_prompt_file: Path to file containing the system prompt
+            stream: Stream responses and dispatch routing fields early (defaults to GROK_STREAM env var)
+            cascade: Route items through a fast text model first and escalate hard cases to a
+                     vision model (defaults to GROK_CASCADE env var)
         """
         self.api_key = api_key or os.getenv("XAI_API_KEY")
         if not self.api_key:
             raise ValueError("XAI_API_KEY not found. Set it as an environment variable or pass it to the constructor.")
         
         self.model = model or os.getenv("GROK_MODEL", "grok-3-mini-fast")
-        self.client = OpenAI(api_key=self.api_key, base_url="https://api.x.ai/v1")
+        # Hedged, retried and circuit-broken calls; a backup provider is optional (see llm_resilience.py)
+        self.llm = ResilientLLM.from_env(self.api_key)
+        self.client = self.llm.providers[0].client
         self.system_prompt = self._load_system_prompt(system_prompt_file)
+        self.system_prompt_tokens = estimate_tokens(self.system_prompt)
+        self.transcript_token_budget = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "1500"))
+        # Every model call's tokens and latency, and the per-hour/per-day token budgets checked against it
+        self.ledger = UsageLedger(os.getenv("USAGE_LEDGER_PATH", os.path.join("outputs", USAGE_LEDGER_NAME)))
+        self.budget = TokenBudget(self.ledger)
+        self.scheduler = Scheduler(self.budget, self.system_prompt_tokens, self.transcript_token_budget)
+        # Failed attempts and losing hedges are billed too
+        self.llm.on_attempt = self._record_attempt
+        self.score_weights = load_weights()
+        self._indexes = {}
+        self._geo_indexes = {}
+        if stream is None:
+            stream = os.getenv("GROK_STREAM", "false").lower() in ("1", "true", "yes")
+        self.stream = stream
+        
+        # Model cascade: fast model first, vision model for low-confidence or image-dependent items
+        if cascade is None:
+            cascade = os.getenv("GROK_CASCADE", "false").lower() in ("1", "true", "yes")
+        self.cascade = cascade
+        self.fast_model = os.getenv("GROK_FAST_MODEL", self.model)
+        self.vision_model = os.getenv("GROK_VISION_MODEL", "grok-4")
+        self.cascade_min_confidence = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.6"))
+        self.cascade_image_confidence = float(os.getenv("CASCADE_IMAGE_CONFIDENCE", "0.8"))
+        self.cascade_escalate_categories = {
+            c.strip() for c in os.getenv("CASCADE_ESCALATE_CATEGORIES", "other").split(",") if c.strip()
+        }
     
     def _extract_json_from_markdown(self, text):
         """
@@ -93,6 +161,44 @@ class GrokAnalyzer:
             print(f"Warning: {prompt_file} not found. Using default prompt.")
             return "Analyze the provided image and transcript. Return your analysis as valid JSON."
     
+    def fetch_upload(self, upload_id, endpoint_url):
+        """
+        Fetch a single upload by ID from the endpoint
+        
+        Args:
+            upload_id: Upload document ID
+            endpoint_url: URL of the GET endpoint (accepts an upload_id query parameter)
+            
+        Returns:
+            Upload item dictionary, or None if it does not exist
+        """
+        try:
+            response = requests.get(endpoint_url, params={"upload_id": upload_id}, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+        
+        # Accept a bare document, a wrapped one, or a documents list
+        if isinstance(data, dict) and isinstance(data.get('documents'), list):
+            candidates = data['documents']
+        elif isinstance(data, dict) and isinstance(data.get('document'), dict):
+            candidates = [data['document']]
+        elif isinstance(data, list):
+            candidates = data
+        else:
+            candidates = [data]
+        for candidate in candidates:
+            if isinstance(candidate, dict) and candidate.get('id') == upload_id:
+                return candidate
+        # Single-document responses may omit the id; one that names another upload is not ours
+        if (len(candidates) == 1 and isinstance(candidates[0], dict) and 'transcript' in candidates[0]
+                and 'id' not in candidates[0]):
+            return {**candidates[0], 'id': upload_id}
+        return None
+    
     def fetch_uploads(self, endpoint_url):
         """
         Fetch upload data from the endpoint
@@ -130,12 +236,209 @@ class GrokAnalyzer:
             print(f"Network error fetching data from endpoint: {e}")
             raise
     
-    def process_with_grok(self, item):
+    def _stream_completion(self, model, messages, on_routing_fields=None, item_id=None):
+        """
+        Stream a chat completion, firing a callback once the routing fields arrive
+        
+        Args:
+            model: Grok model to call
+            messages: Chat messages to send
+            on_routing_fields: Optional callable receiving a partial response dict
+            item_id: Upload ID, for the usage ledger
+            
+        Returns:
+            Tuple of (full response text, seconds until routing fields were complete or None,
+            usage from the final chunk or None)
+        """
+        started = time.monotonic()
+        parser = IncrementalJSONParser()
+        routing_elapsed = None
+        parts = []
+        usage = None
+        
+        stream = self.llm.create(
+            model=model,
+            context=item_id,
+            max_tokens=4096,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ''
+            if not delta:
+                continue
+            parts.append(delta)
+            if routing_elapsed is not None or parser.done:
+                continue
+            parser.feed(delta)
+            if all(parser.is_complete(field) for field in ROUTING_FIELDS):
+                routing_elapsed = time.monotonic() - started
+                partial = apply_scores(parser.snapshot(ROUTING_FIELDS), self.score_weights)
+                print(f"  ⚡ Routing fields ready after {routing_elapsed:.2f}s "
+                      f"(category={partial.get('category')}, severity={partial.get('scores', {}).get('severity_label')})")
+                if on_routing_fields:
+                    # Sent inline so the provisional update always lands before the final one
+                    on_routing_fields(partial)
+        
+        return ''.join(parts), routing_elapsed, usage
+    
+    def _call_model(self, model, content, on_routing_fields=None, item_id=None):
+        """
+        Send one request to Grok and parse the JSON response
+        
+        Args:
+            model: Grok model to call
+            content: User message content parts (text and/or image)
+            on_routing_fields: Optional streaming callback (see _stream_completion)
+            item_id: Upload ID, for the usage ledger
+            
+        Returns:
+            Tuple of (parsed response dict, seconds until routing fields were ready or None)
+        """
+        # The system prompt is sent verbatim and first, with nothing per-item in it,
+        # so it stays a byte-identical prefix the provider can cache across items
+        messages = [
+            {
+                "role": "system",
+                "content": self.system_prompt
+            },
+            {
+                "role": "user",
+                "content": content
+            }
+        ]
+        
+        routing_elapsed = None
+        if self.stream:
+            response_text, routing_elapsed, usage = self._stream_completion(model, messages, on_routing_fields, item_id)
+        else:
+            # Call Grok API (OpenAI-compatible)
+            response = self.llm.create(
+                model=model,
+                context=item_id,
+                max_tokens=4096,
+                messages=messages
+            )
+            
+            # Extract response text
+            response_text = response.choices[0].message.content
+            usage = response.usage
+        if self.llm.last_call is not None:
+            self.llm.last_call["usage"] = usage_from_response(usage)
+        
+        # Extract JSON from markdown code blocks if present
+        json_text = self._extract_json_from_markdown(response_text)
+        
+        # Try to parse as JSON
+        try:
+            response_json = json.loads(json_text)
+            print(f"  Successfully parsed JSON response")
+            # Composite scores are computed locally from the raw factors
+            apply_scores(response_json, self.score_weights)
+        except json.JSONDecodeError:
+            print(f"  Warning: Response is not valid JSON. Storing as text.")
+            response_json = {"raw_response": response_text}
+        
+        return response_json, routing_elapsed
+    
+    def _call_info(self):
+        """Provider details of the last model call, for the route stages"""
+        info = self.llm.last_call or {}
+        # This call's usage now lives in a route stage (see _record_usage)
+        info["staged"] = True
+        stage = {"provider": info.get("provider"), "attempts": info.get("attempts", 1)}
+        if info.get("hedged"):
+            stage["hedged"] = True
+        if info.get("model") and info.get("model") != info.get("requested_model"):
+            stage["served_by"] = info["model"]
+        if info.get("usage"):
+            stage["usage"] = info["usage"]
+        return stage
+    
+    def _record_usage(self, item_id, route, error=None, model=None, started=None):
+        """
+        Write each model call of an item to the usage ledger
+        
+        Args:
+            item_id: Upload ID
+            route: Route dict whose stages hold each successful call's usage
+            error: Error message if the item failed
+            model: Model of the failed call
+            started: Monotonic start time of the failed call
+            
+        Returns:
+            Dictionary of token totals across the item's calls
+        """
+        totals = usage_from_response(None)
+        stages = list(route["stages"])
+        info = self.llm.last_call or {}
+        if error and model and not info.get("staged") and not info.get("failed"):
+            # The call answered but the item failed afterwards (parsing, scoring, the
+            # routing callback, a broken stream): its tokens were still spent. Calls that
+            # failed inside the client were already recorded per attempt.
+            stages.append({
+                "model": model,
+                "seconds": round(time.monotonic() - started, 3) if started else None,
+                "error": error,
+                **self._call_info(),
+            })
+        for stage in stages:
+            self.ledger.record(item_id, stage)
+            for key, value in stage.get("usage", {}).items():
+                totals[key] += value
+        return totals
+    
+    def _record_attempt(self, item_id, attempt):
+        """
+        Ledger record for a model call whose answer was not used
+        
+        Args:
+            item_id: Upload ID passed to the client as context
+            attempt: ResilientLLM attempt record (failed attempt or losing hedge)
+        """
+        self.ledger.record(item_id or "unknown", {**attempt, "usage": usage_from_response(attempt["usage"])})
+    
+    def _escalation_reason(self, response_json, has_image):
+        """
+        Decide whether a fast-model answer should be escalated to the vision model
+        
+        Args:
+            response_json: Parsed response from the fast model
+            has_image: Whether the item has a usable picture the fast model did not see
+            
+        Returns:
+            Reason string, or None to accept the fast answer
+        """
+        if not isinstance(response_json, dict) or 'raw_response' in response_json:
+            return "unparseable response"
+        confidence = response_json.get('confidence')
+        overall = confidence.get('overall') if isinstance(confidence, dict) else None
+        if not isinstance(overall, (int, float)):
+            return "missing confidence"
+        if overall < self.cascade_min_confidence:
+            return f"low confidence ({overall:.2f} < {self.cascade_min_confidence:.2f})"
+        if response_json.get('category') in self.cascade_escalate_categories:
+            return f"uncertain category ({response_json.get('category')})"
+        if has_image and overall < self.cascade_image_confidence:
+            return f"image needed ({overall:.2f} < {self.cascade_image_confidence:.2f})"
+        return None
+    
+    def process_with_grok(self, item, on_routing_fields=None):
         """
         Process a single item through Grok API
         
+        In cascade mode the transcript goes to the fast model first, and only
+        low-confidence or image-dependent items are re-run on the vision model.
+        
         Args:
             item: Dictionary containing id, transcript, and optional picture
+            on_routing_fields: Optional callable invoked with a partial response as soon as
+                               the routing fields are parsed (streaming mode only)
             
         Returns:
             Dictionary containing the result
@@ -149,15 +452,22 @@ class GrokAnalyzer:
         
         print(f"Processing item {item_id}...")
         
+        # Drop banners, agent thinking and repeats, then fit the token budget
+        transcript, prompt_stats = compact_transcript(transcript, self.transcript_token_budget)
+        prompt_stats["system_prompt_tokens"] = self.system_prompt_tokens
+        print(f"  ✂️  Transcript compacted: {prompt_stats['raw_tokens']} → {prompt_stats['compact_tokens']} tokens "
+              f"(saved {prompt_stats['saved_tokens']}{', truncated' if prompt_stats['truncated'] else ''})")
+        
         # Prepare the message content
-        content = []
+        image_parts = []
+        text_parts = []
         
         # Add image if present and valid
         if picture_base64:
             media_type = self._detect_image_format(picture_base64)
             if media_type:
                 print(f"  Detected image format: {media_type}")
-                content.append({
+                image_parts.append({
                     "type": "image_url",
                     "image_url": {
                         "url": f"data:{media_type};base64,{picture_base64}",
@@ -169,56 +479,152 @@ class GrokAnalyzer:
         
         # Add transcript text
         if transcript:
-            content.append({
+            text_parts.append({
                 "type": "text",
                 "text": f"Transcript: {transcript}"
             })
         
+        route = {"mode": "cascade" if self.cascade else "single", "stages": [], "escalated": False}
+        if not image_parts and not text_parts:
+            print(f"  ❌ Nothing to analyze: no transcript and no valid image")
+            return {
+                "id": item_id,
+                "error": "no transcript or valid image to analyze",
+                "route": route,
+                "processed_at": datetime.now(timezone.utc).isoformat()
+            }
+        
+        model, started = None, None
         try:
-            # Call Grok API (OpenAI-compatible)
-            response = self.client.chat.completions.create(
-                model=self.model,
-                max_tokens=4096,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ]
-            )
-            
-            # Extract response text
-            response_text = response.choices[0].message.content
-            
-            # Extract JSON from markdown code blocks if present
-            json_text = self._extract_json_from_markdown(response_text)
+            routing_elapsed = None
+            if self.cascade and text_parts:
+                # Stage 1: fast model on the transcript only
+                model, started = self.fast_model, time.monotonic()
+                response_json, routing_elapsed = self._call_model(self.fast_model, text_parts, on_routing_fields,
+                                                                  item_id)
+                reason = self._escalation_reason(response_json, bool(image_parts))
+                route["stages"].append({
+                    "model": self.fast_model,
+                    "with_image": False,
+                    "seconds": round(time.monotonic() - started, 3),
+                    **self._call_info(),
+                })
+                if reason:
+                    print(f"  ⤴️  Escalating to {self.vision_model}: {reason}")
+                    route["escalated"] = True
+                    route["reason"] = reason
+            elif self.cascade:
+                # Image only: nothing for the text model to work with
+                route["escalated"] = True
+                route["reason"] = "image only"
             
-            # Try to parse as JSON
-            try:
-                response_json = json.loads(json_text)
-                print(f"  Successfully parsed JSON response")
-            except json.JSONDecodeError:
-                print(f"  Warning: Response is not valid JSON. Storing as text.")
-                response_json = {"raw_response": response_text}
+            # The single model, or the vision model for escalated cascade items
+            if not self.cascade or route["escalated"]:
+                model = self.vision_model if self.cascade else self.model
+                stage_on_routing = None if route["stages"] else on_routing_fields
+                started = time.monotonic()
+                response_json, stage_routing = self._call_model(model, image_parts + text_parts, stage_on_routing,
+                                                                item_id)
+                routing_elapsed = routing_elapsed if routing_elapsed is not None else stage_routing
+                route["stages"].append({
+                    "model": model,
+                    "with_image": bool(image_parts),
+                    "seconds": round(time.monotonic() - started, 3),
+                    **self._call_info(),
+                })
             
-            return {
+            route["model"] = route["stages"][-1]["model"]
+            # Coordinates the model derived from an address are guesses; keep only ones the caller stated
+            if drop_unstated_coordinates(response_json, item):
+                print(f"  📍 Dropped model-estimated coordinates (not stated in the upload)")
+            result = {
                 "id": item_id,
                 "original_data": item,
                 "grok_response": response_json,
+                "route": route,
+                "prompt_stats": prompt_stats,
+                "usage": self._record_usage(item_id, route),
                 "processed_at": datetime.now(timezone.utc).isoformat()
             }
+            if routing_elapsed is not None:
+                result["routing_ready_seconds"] = round(routing_elapsed, 3)
+            return result
             
         except Exception as e:
             print(f"Error processing item {item_id}: {e}")
-            return {
+            result = {
                 "id": item_id,
                 "error": str(e),
+                "route": route,
+                "usage": self._record_usage(item_id, route, str(e), model, started),
                 "processed_at": datetime.now(timezone.utc).isoformat()
             }
+            if isinstance(e, CircuitOpenError) or is_retryable(e):
+                # Outage, rate limit or timeout: the item itself is fine, try it again later
+                result["transient"] = True
+            return result
+    
+    def get_index(self, output_dir="outputs"):
+        """
+        Get the work-item priority index for an output directory (loaded once)
+        
+        Args:
+            output_dir: Directory containing result files
+            
+        Returns:
+            WorkItemIndex instance
+        """
+        if output_dir not in self._indexes:
+            self._indexes[output_dir] = WorkItemIndex.load(output_dir)
+        return self._indexes[output_dir]
+    
+    def get_geo_index(self, output_dir="outputs"):
+        """
+        Get the spatial index of located reports for an output directory (built once)
+        
+        Args:
+            output_dir: Directory containing result files
+            
+        Returns:
+            GeoGridIndex instance
+        """
+        if output_dir not in self._geo_indexes:
+            self._geo_indexes[output_dir] = GeoGridIndex.from_work_items(self.get_index(output_dir))
+        return self._geo_indexes[output_dir]
+    
+    def link_nearby_reports(self, result, output_dir="outputs", radius_m=NEARBY_RADIUS_M):
+        """
+        Attach existing work items near the report's location to the result
+        
+        Args:
+            result: Processing result (modified in place)
+            output_dir: Directory containing result files
+            radius_m: Search radius in meters
+            
+        Returns:
+            List of nearby report dictionaries (empty if the report has no coordinates)
+        """
+        point = extract_coordinates(result)
+        if not point:
+            return []
+        item_id = result.get('id', 'unknown')
+        work_items = self.get_index(output_dir)
+        nearby = []
+        for other_id, distance in self.get_geo_index(output_dir).radius(*point, radius_m, limit=10):
+            if other_id == item_id:
+                continue
+            entry = work_items.get(other_id) or {}
+            nearby.append({
+                "id": other_id,
+                "distance_m": round(distance, 1),
+                "category": entry.get("category"),
+                "priority_score": entry.get("priority_score"),
+            })
+        result["nearby_reports"] = nearby
+        if nearby:
+            print(f"  📍 {len(nearby)} existing report(s) within {radius_m:.0f} m: "
+                  f"{', '.join(n['id'] for n in nearby[:3])}{'...' if len(nearby) > 3 else ''}")
+        return nearby
     
     def save_result(self, result, output_dir="outputs"):
         """
@@ -232,15 +638,17 @@ class GrokAnalyzer:
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         
         # Generate filename based on id
-        item_id = result.get('id', 'unknown')
-        filename = f"{item_id}.json"
-        filepath = os.path.join(output_dir, filename)
+        filepath = result_path(result.get('id', 'unknown'), output_dir)
         
         # Save to file
         with open(filepath, 'w') as f:
             json.dump(result, f, indent=2)
         
         print(f"Saved result to {filepath}")
+        
+        # Keep the priority and spatial indexes in step with the result files
+        self.get_index(output_dir).upsert_result(result)
+        self.get_geo_index(output_dir).add_result(result)
     
     def _normalize_api_values(self, obj, parent_key=''):
         """
@@ -267,6 +675,8 @@ class GrokAnalyzer:
                 return "other"
             elif parent_key in ['severity_score', 'priority_score']:
                 return 0
+            elif parent_key in ['coordinates', 'lat', 'lon']:
+                return None
             else:
                 return "N/A"
         elif parent_key == 'severity_label':
@@ -286,7 +696,7 @@ class GrokAnalyzer:
         else:
             return obj
     
-    def send_update_notification(self, source_ref, grok_response, update_endpoint_url):
+    def send_update_notification(self, source_ref, grok_response, update_endpoint_url, provisional=False):
         """
         Send POST request to update endpoint after processing completes
         
@@ -294,6 +704,7 @@ class GrokAnalyzer:
             source_ref: The ID from the original GET request (formatted with 'user_uploads/' prefix)
             grok_response: The processed response from Grok
             update_endpoint_url: URL of the POST endpoint to notify
+            provisional: Mark the payload as an early triage update that will be superseded
             
         Returns:
             True if successful, False otherwise
@@ -307,13 +718,16 @@ class GrokAnalyzer:
                 "sourceRef": source_ref,
                 **cleaned_response  # Spread all Grok response fields including issue_summary
             }
+            if provisional:
+                payload["provisional"] = True
             
             response = requests.post(update_endpoint_url, json=payload)
             response.raise_for_status()
             
             result_data = response.json()
             work_item_id = result_data.get('workItemId', 'N/A')
-            print(f"  ✓ Update notification sent successfully (Work Item ID: {work_item_id})")
+            kind = "Provisional update" if provisional else "Update notification"
+            print(f"  ✓ {kind} sent successfully (Work Item ID: {work_item_id})")
             return True
         except requests.RequestException as e:
             print(f"  ✗ Failed to send update notification: {e}")
@@ -321,6 +735,66 @@ class GrokAnalyzer:
                 print(f"  Server response: {e.response.text}")
             return False
     
+    def is_processed(self, item_id, output_dir="outputs"):
+        """Check whether an upload already has a result file (raises ValueError for invalid IDs)"""
+        return os.path.exists(result_path(item_id, output_dir))
+    
+    def process_item(self, item, output_dir="outputs", update_endpoint_url=None):
+        """
+        Process one upload: analyze, save, and notify the update endpoint
+        
+        Args:
+            item: Upload dictionary containing id, transcript, and optional picture
+            output_dir: Directory to save output files
+            update_endpoint_url: Optional URL to POST update notifications
+            
+        Returns:
+            Dictionary containing the result. A result with "transient" set (open
+            circuit breaker, timeout, rate limit, server error) is not saved, so the
+            item stays unprocessed and the next run or reconciliation poll retries it.
+        """
+        item_id = item.get('id', 'unknown')
+        if not is_valid_upload_id(item_id):
+            print(f"❌ Refusing upload with invalid ID {item_id!r}")
+            return {"id": item_id, "error": "invalid upload ID",
+                    "processed_at": datetime.now(timezone.utc).isoformat()}
+        
+        on_routing_fields = None
+        if update_endpoint_url and self.stream:
+            source_ref = f"user_uploads/{item_id}"
+            def on_routing_fields(partial, source_ref=source_ref):
+                print(f"📤 Sending provisional triage to Firebase...")
+                self.send_update_notification(source_ref, partial, update_endpoint_url, provisional=True)
+        
+        result = self.process_with_grok(item, on_routing_fields)
+        
+        if result.get('transient'):
+            print(f"⏳ Upload {item_id} not saved after a transient error ({result['error']}); it will be retried")
+            return result
+        
+        if 'error' not in result:
+            self.link_nearby_reports(result, output_dir)
+        
+        print(f"\n💾 Saving result to file...")
+        self.save_result(result, output_dir)
+        
+        # Send update notification if endpoint is provided and no error occurred
+        if update_endpoint_url and 'error' not in result:
+            grok_response = result.get('grok_response')
+            if item_id and grok_response:
+                print(f"📤 Sending processed data to Firebase...")
+                # Format sourceRef as required by the API (must start with 'user_uploads/')
+                source_ref = f"user_uploads/{item_id}"
+                success = self.send_update_notification(source_ref, grok_response, update_endpoint_url)
+                if success:
+                    print(f"✅ Upload {item_id} fully processed and sent to Firebase!")
+                else:
+                    print(f"⚠️ Upload {item_id} processed but failed to send to Firebase")
+        elif 'error' in result:
+            print(f"❌ Error processing upload {item_id}: {result.get('error')}")
+        
+        return result
+    
     def process_all(self, endpoint_url, output_dir="outputs", update_endpoint_url=None):
         """
         Fetch all uploads and process them through Grok
@@ -341,42 +815,43 @@ class GrokAnalyzer:
         print(f"\n📋 Found {len(items)} new item(s) to process\n")
         
         results = []
-        skipped = 0
+        retry_later = []
+        tokens_saved = 0
+        tokens_used = 0
+        
+        invalid = [item.get('id') for item in items if not is_valid_upload_id(item.get('id'))]
+        if invalid:
+            print(f"⚠️ Ignoring {len(invalid)} upload(s) with invalid IDs: {invalid[:5]}")
+        items = [item for item in items if is_valid_upload_id(item.get('id'))]
+        pending = [item for item in items if not self.is_processed(item['id'], output_dir)]
+        skipped = len(items) - len(pending)
+        if skipped:
+            print(f"Skipping {skipped} already processed item(s)")
+        
+        # Highest pre-score first; whatever the token budget cannot cover waits for a later run
+        planned, deferred = self.scheduler.plan(pending)
+        if self.budget.enabled:
+            print(f"💰 Token budget: {self.budget.remaining()} tokens left, "
+                  f"{len(planned)} item(s) planned, {len(deferred)} deferred")
         
-        for idx, item in enumerate(items, 1):
+        for idx, (item, score, estimate) in enumerate(planned, 1):
             item_id = item.get('id', 'unknown')
             
-            # Check if already processed
-            output_file = os.path.join(output_dir, f"{item_id}.json")
-            if os.path.exists(output_file):
-                print(f"Skipping {idx}/{len(items)} (ID: {item_id}) - already processed")
-                skipped += 1
+            # Estimates can be off, so re-check against the ledger's actual usage
+            if not self.budget.fits(estimate):
+                print(f"⏸️  Deferring {item_id} (pre-score {score}, ~{estimate} tokens) - token budget exhausted")
+                deferred.append(item)
                 continue
             
             print(f"\n{'='*70}")
-            print(f"🔄 Processing [{idx}/{len(items)}] - Upload ID: {item_id}")
+            print(f"🔄 Processing [{idx}/{len(planned)}] - Upload ID: {item_id} (pre-score {score})")
             print(f"{'='*70}")
             
-            result = self.process_with_grok(item)
-            
-            print(f"\n💾 Saving result to file...")
-            self.save_result(result, output_dir)
-            
-            # Send update notification if endpoint is provided and no error occurred
-            if update_endpoint_url and 'error' not in result:
-                grok_response = result.get('grok_response')
-                if item_id and grok_response:
-                    print(f"📤 Sending processed data to Firebase...")
-                    # Format sourceRef as required by the API (must start with 'user_uploads/')
-                    source_ref = f"user_uploads/{item_id}"
-                    success = self.send_update_notification(source_ref, grok_response, update_endpoint_url)
-                    if success:
-                        print(f"✅ Upload {item_id} fully processed and sent to Firebase!")
-                    else:
-                        print(f"⚠️ Upload {item_id} processed but failed to send to Firebase")
-            elif 'error' in result:
-                print(f"❌ Error processing upload {item_id}: {result.get('error')}")
-            
+            result = self.process_item(item, output_dir, update_endpoint_url)
+            if result.get('transient'):
+                retry_later.append(item)
+            tokens_saved += result.get('prompt_stats', {}).get('saved_tokens', 0)
+            tokens_used += result.get('usage', {}).get('total_tokens', 0)
             results.append(result)
         
         print(f"\n{'='*70}")
@@ -385,20 +860,25 @@ class GrokAnalyzer:
         print(f"📊 Summary:")
         print(f"   • Processed: {len(results)} new items")
         print(f"   • Skipped: {skipped} already processed")
+        print(f"   • Deferred by token budget: {len(deferred)}")
+        print(f"   • Left for the next run after transient errors: {len(retry_later)}")
+        print(f"   • Tokens used: {tokens_used}")
+        print(f"   • Prompt tokens saved by compaction: {tokens_saved}")
         print(f"   • Output directory: {output_dir}/")
         print(f"{'='*70}\n")
         
         return results
 
 
+# Configuration from Firebase console
+ENDPOINT_URL = "https://getuserupload-xglsok67aq-uc.a.run.app"
+UPDATE_ENDPOINT_URL = "https://updateprocessedupload-xglsok67aq-uc.a.run.app"
+SYSTEM_PROMPT_FILE = "system_prompt.txt"
+OUTPUT_DIR = "outputs"
+
+
 def main():
     """Main entry point"""
-    # Configuration from Firebase console
-    ENDPOINT_URL = "https://getuserupload-xglsok67aq-uc.a.run.app"
-    UPDATE_ENDPOINT_URL = "https://updateprocessedupload-xglsok67aq-uc.a.run.app"
-    SYSTEM_PROMPT_FILE = "system_prompt.txt"
-    OUTPUT_DIR = "outputs"
-    
     print("\n" + "#"*70)
     print("#" + " "*68 + "#")
     print("#" + "  CIVICGRID - GROK ANALYZER".center(68) + "#")
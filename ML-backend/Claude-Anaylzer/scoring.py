@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import math
+import argparse
+from pathlib import Path
+from work_item_index import WorkItemIndex
+
+# Factor weights for the composite scores. Grok only returns the raw factors;
+# these formulas used to live in system_prompt.txt.
+SEVERITY_WEIGHTS = {
+    "safety_risk": 0.50,
+    "impact_scope": 0.25,
+    "urgency": 0.15,
+    "environmental_risk": 0.10,
+}
+PRIORITY_WEIGHTS = {
+    "safety_risk": 0.32,
+    "impact_scope": 0.22,
+    "urgency": 0.18,
+    "environmental_risk": 0.10,
+    "sla_risk": 0.08,
+    "effort_bonus": 0.10,  # 100 - effort_to_fix (easier/cheaper -> higher priority)
+}
+
+# Upper bound of each severity band, checked in order
+SEVERITY_LABELS = [
+    (20, "low"),
+    (40, "minor"),
+    (60, "moderate"),
+    (80, "high"),
+    (100, "critical"),
+]
+
+FACTOR_NAMES = ["safety_risk", "impact_scope", "urgency", "environmental_risk", "sla_risk", "effort_to_fix"]
+
+# Defaults for factors the model could not score (see system_prompt.txt)
+FACTOR_DEFAULTS = {"effort_to_fix": 50}
+
+
+def load_weights(weights_file=None):
+    """
+    Load scoring weights, optionally overridden from a JSON file
+
+    Args:
+        weights_file: Path to a JSON file with optional "severity" and "priority"
+                      objects (defaults to SCORING_WEIGHTS_FILE env var)
+
+    Returns:
+        Dictionary with "severity" and "priority" weight mappings
+    """
+    weights = {"severity": dict(SEVERITY_WEIGHTS), "priority": dict(PRIORITY_WEIGHTS)}
+    weights_file = weights_file or os.getenv("SCORING_WEIGHTS_FILE")
+    if weights_file:
+        with open(weights_file, 'r') as f:
+            overrides = json.load(f)
+        for kind in ("severity", "priority"):
+            unknown = set(overrides.get(kind, {})) - set(weights[kind])
+            if unknown:
+                raise ValueError(f"Unknown {kind} weight(s) in {weights_file}: {', '.join(sorted(unknown))}")
+            weights[kind].update(overrides.get(kind, {}))
+    return weights
+
+
+def _round_score(value):
+    """Round half up and clamp to the 0-100 score range"""
+    return int(min(100, max(0, math.floor(value + 0.5 + 1e-9))))
+
+
+def _factor_value(factors, name):
+    value = factors.get(name) if isinstance(factors, dict) else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return FACTOR_DEFAULTS.get(name, 0)
+    return min(100, max(0, value))
+
+
+def severity_label(severity_score):
+    """Map a 0-100 severity score to its label"""
+    for upper, label in SEVERITY_LABELS:
+        if severity_score <= upper:
+            return label
+    return SEVERITY_LABELS[-1][1]
+
+
+def compute_scores(factors, weights=None):
+    """
+    Compute the composite scores from Grok's raw factor scores
+
+    Args:
+        factors: Dictionary of 0-100 factor scores (missing values use defaults)
+        weights: Optional weights from load_weights()
+
+    Returns:
+        Dictionary with severity_score, severity_label and priority_score
+    """
+    weights = weights or {"severity": SEVERITY_WEIGHTS, "priority": PRIORITY_WEIGHTS}
+    values = {name: _factor_value(factors, name) for name in FACTOR_NAMES}
+    values["effort_bonus"] = 100 - values["effort_to_fix"]
+
+    severity = _round_score(sum(w * values[k] for k, w in weights["severity"].items()))
+    priority = _round_score(sum(w * values[k] for k, w in weights["priority"].items()))
+    return {
+        "severity_score": severity,
+        "severity_label": severity_label(severity),
+        "priority_score": priority,
+    }
+
+
+def apply_scores(grok_response, weights=None):
+    """
+    Fill in the composite scores of a parsed Grok response in place
+
+    Args:
+        grok_response: Parsed JSON response containing a "factors" object
+        weights: Optional weights from load_weights()
+
+    Returns:
+        The same response dictionary
+    """
+    if not isinstance(grok_response, dict) or not isinstance(grok_response.get("factors"), dict):
+        return grok_response
+    scores = grok_response.get("scores")
+    if not isinstance(scores, dict):
+        scores = grok_response["scores"] = {}
+    scores.update(compute_scores(grok_response["factors"], weights))
+    return grok_response
+
+
+def rescore_matrix(factor_matrix, weights=None):
+    """
+    Vectorized score computation for many items at once
+
+    Args:
+        factor_matrix: NumPy array of shape (n, len(FACTOR_NAMES))
+        weights: Optional weights from load_weights()
+
+    Returns:
+        Tuple of (severity_scores, priority_scores, label_indices) integer arrays
+    """
+    import numpy as np
+
+    weights = weights or {"severity": SEVERITY_WEIGHTS, "priority": PRIORITY_WEIGHTS}
+    columns = {name: i for i, name in enumerate(FACTOR_NAMES)}
+    values = np.clip(factor_matrix, 0, 100)
+    # Append effort_bonus as an extra column so both scores are a single matmul
+    values = np.column_stack([values, 100 - values[:, columns["effort_to_fix"]]])
+    columns["effort_bonus"] = len(FACTOR_NAMES)
+
+    weight_matrix = np.zeros((values.shape[1], 2))
+    for col, kind in enumerate(("severity", "priority")):
+        for name, weight in weights[kind].items():
+            weight_matrix[columns[name], col] = weight
+
+    raw = values @ weight_matrix
+    scores = np.clip(np.floor(raw + 0.5 + 1e-9), 0, 100).astype(np.int64)
+    bounds = np.array([upper for upper, _ in SEVERITY_LABELS])
+    label_indices = np.minimum(np.searchsorted(bounds, scores[:, 0], side='left'), len(bounds) - 1)
+    return scores[:, 0], scores[:, 1], label_indices
+
+
+def rescore_results(output_dir="outputs", weights=None, dry_run=False):
+    """
+    Recompute the scores of every stored result in one vectorized pass
+
+    Args:
+        output_dir: Directory containing {id}.json result files
+        weights: Optional weights from load_weights()
+        dry_run: Report changes without rewriting any files
+
+    Returns:
+        Dictionary with counts of scanned, rescored and changed results
+    """
+    import numpy as np
+
+    paths, results, rows = [], [], []
+    scanned = 0
+    for path in sorted(Path(output_dir).glob("*.json")):
+        scanned += 1
+        try:
+            with open(path, 'r') as f:
+                result = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"  Skipping unreadable result {path}: {e}")
+            continue
+        factors = (result.get("grok_response") or {}).get("factors") if isinstance(result, dict) else None
+        if not isinstance(factors, dict):
+            continue
+        paths.append(path)
+        results.append(result)
+        rows.append([_factor_value(factors, name) for name in FACTOR_NAMES])
+
+    summary = {"scanned": scanned, "rescored": 0, "changed": 0}
+    if not rows:
+        return summary
+
+    severity, priority, label_idx = rescore_matrix(np.array(rows, dtype=float), weights)
+    index = None if dry_run else WorkItemIndex.load(output_dir)
+    for path, result, sev, pri, idx in zip(paths, results, severity.tolist(), priority.tolist(), label_idx.tolist()):
+        scores = result["grok_response"].get("scores")
+        if not isinstance(scores, dict):
+            scores = result["grok_response"]["scores"] = {}
+        new_scores = {
+            "severity_score": sev,
+            "severity_label": SEVERITY_LABELS[idx][1],
+            "priority_score": pri,
+        }
+        summary["rescored"] += 1
+        if all(scores.get(k) == v for k, v in new_scores.items()):
+            continue
+        summary["changed"] += 1
+        scores.update(new_scores)
+        if not dry_run:
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2)
+            index.upsert_result(result)
+    return summary
+
+
+def main():
+    """Command-line entry point for batch re-scoring"""
+    parser = argparse.ArgumentParser(description="Recompute severity/priority scores for stored results")
+    parser.add_argument("--output-dir", default="outputs", help="Directory containing result files")
+    parser.add_argument("--weights", help="JSON file with severity/priority weight overrides")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing files")
+    args = parser.parse_args()
+
+    weights = load_weights(args.weights)
+    summary = rescore_results(args.output_dir, weights, dry_run=args.dry_run)
+    print(f"📊 Rescored {summary['rescored']}/{summary['scanned']} results, "
+          f"{summary['changed']} changed{' (dry run)' if args.dry_run else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Incremental JSON parser for streamed LLM responses
+
+    Characters are fed as they arrive from the model. The parser builds the
+    object tree as it goes and records every value whose closing token has been
+    seen, so callers can act on fields like `category` long before the full
+    response is complete. Anything before the first '{' (e.g. a markdown fence)
+    is ignored, and parsing stops once the top-level object closes.
+    """
+
+    _WHITESPACE = ' \t\r\n'
+
+    def __init__(self):
+        self.root = None
+        self.done = False
+        self.failed = False
+        self._stack = []          # [container, path, expecting_key]
+        self._pending_key = None
+        self._mode = None         # None, 'string' or 'literal'
+        self._token = []
+        self._escape = False
+        self._completed = {}      # dotted path -> value
+
+    def feed(self, chunk):
+        """
+        Feed the next chunk of response text
+
+        Args:
+            chunk: Text fragment received from the stream
+
+        Returns:
+            List of dotted paths completed by this chunk
+        """
+        before = len(self._completed)
+        for ch in chunk or '':
+            if self.done:
+                break
+            try:
+                self._consume(ch)
+            except (ValueError, KeyError, IndexError):
+                # Malformed stream: stop tracking, the full response is still parsed at the end
+                self.failed = True
+                self.done = True
+        return list(self._completed)[before:]
+
+    def is_complete(self, path):
+        """Return True once the value at the dotted path has fully arrived"""
+        return path in self._completed
+
+    def get(self, path, default=None):
+        """Return the completed value at the dotted path"""
+        return self._completed.get(path, default)
+
+    def snapshot(self, paths=()):
+        """
+        Build a partial object from what has arrived so far
+
+        Args:
+            paths: Extra nested dotted paths to include even if their parent
+                   object is still streaming
+
+        Returns:
+            Dictionary of every complete top-level field plus the requested paths
+        """
+        partial = {
+            path: value for path, value in self._completed.items() if '.' not in path
+        }
+        for path in paths:
+            if path not in self._completed or '.' not in path:
+                continue
+            head, *rest = path.split('.')
+            node = partial.get(head)
+            if not isinstance(node, dict):
+                node = partial[head] = {}
+            for key in rest[:-1]:
+                node = node.setdefault(key, {})
+            node[rest[-1]] = self._completed[path]
+        return partial
+
+    def _consume(self, ch):
+        if self._mode == 'string':
+            if self._escape:
+                self._escape = False
+                self._token.append(ch)
+            elif ch == '\\':
+                self._escape = True
+                self._token.append(ch)
+            elif ch == '"':
+                self._mode = None
+                self._on_string(json.loads('"' + ''.join(self._token) + '"'))
+                self._token = []
+            else:
+                self._token.append(ch)
+            return
+
+        if self._mode == 'literal':
+            if ch not in ',}]' and ch not in self._WHITESPACE:
+                self._token.append(ch)
+                return
+            self._mode = None
+            self._add_value(json.loads(''.join(self._token)))
+            self._token = []
+
+        if not self._stack:
+            # Skip preamble until the top-level object opens
+            if ch == '{':
+                self.root = {}
+                self._stack.append([self.root, (), True])
+            return
+
+        if ch in self._WHITESPACE:
+            return
+        if ch in '{[':
+            container = {} if ch == '{' else []
+            path = self._attach(container)
+            self._stack.append([container, path, ch == '{'])
+        elif ch in '}]':
+            container, path, _ = self._stack.pop()
+            if path:
+                self._completed['.'.join(map(str, path))] = container
+            if not self._stack:
+                self.done = True
+        elif ch == '"':
+            self._mode = 'string'
+        elif ch == ':':
+            self._stack[-1][2] = False
+        elif ch == ',':
+            if isinstance(self._stack[-1][0], dict):
+                self._stack[-1][2] = True
+        else:
+            self._mode = 'literal'
+            self._token = [ch]
+
+    def _on_string(self, value):
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[2]:
+            self._pending_key = value
+        else:
+            self._add_value(value)
+
+    def _attach(self, value):
+        container, path, _ = self._stack[-1]
+        if isinstance(container, dict):
+            key = self._pending_key
+            container[key] = value
+        else:
+            key = len(container)
+            container.append(value)
+        return path + (key,)
+
+    def _add_value(self, value):
+        path = self._attach(value)
+        self._completed['.'.join(map(str, path))] = value
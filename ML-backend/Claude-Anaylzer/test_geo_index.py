@@ -0,0 +1,72 @@
+import time
+from geo_index import (
+    GeoGridIndex,
+    drop_unstated_coordinates,
+    extract_coordinates,
+    haversine_m,
+)
+from work_item_index import WorkItemIndex
+
+
+def _brute_nearest(points, lat, lon, k):
+    hits = sorted((haversine_m(lat, lon, plat, plon), item_id) for item_id, (plat, plon) in points.items())
+    return [item_id for _, item_id in hits[:k]]
+
+
+def test_nearest_matches_brute_force_on_sparse_data():
+    points = {"a": (37.7749, -122.4194), "b": (37.80, -122.41), "c": (40.71, -74.0), "d": (51.5, -0.12)}
+    index = GeoGridIndex()
+    for item_id, point in points.items():
+        index.add(item_id, *point)
+    for lat, lon in [(37.77, -122.42), (40.0, -75.0), (0.5, 0.5)]:
+        assert [hit[0] for hit in index.nearest(lat, lon, k=3)] == _brute_nearest(points, lat, lon, 3)
+
+
+def test_nearest_stops_at_max_distance_on_sparse_data():
+    index = GeoGridIndex(cell_deg=0.001)
+    index.add("here", 37.7749, -122.4194)
+    index.add("far", -33.86, 151.21)
+    started = time.perf_counter()
+    hits = index.nearest(37.7749, -122.4194, k=2, max_distance_m=500)
+    assert time.perf_counter() - started < 0.5
+    assert [hit[0] for hit in hits] == ["here"]
+    assert [hit[0] for hit in index.nearest(37.7749, -122.4194, k=2)] == ["here", "far"]
+
+
+def test_nearest_respects_exclude():
+    index = GeoGridIndex()
+    index.add("self", 37.7749, -122.4194)
+    index.add("other", 37.7751, -122.4194)
+    assert [hit[0] for hit in index.nearest(37.7749, -122.4194, k=1, exclude={"self"})] == ["other"]
+
+
+def test_model_coordinates_need_to_be_stated_in_the_transcript():
+    guessed = {"location": {"coordinates": {"lat": 37.7793, "lon": -122.4193}}}
+    stated = {"location": {"coordinates": {"lat": 37.7793, "lon": -122.4193}}}
+    item = {"transcript": "[User] The pothole is in front of City Hall"}
+    assert drop_unstated_coordinates(guessed, item)
+    assert guessed["location"]["coordinates"] is None
+
+    item = {"transcript": "[User] My phone says 37.77931, -122.41928"}
+    assert not drop_unstated_coordinates(stated, item)
+    assert extract_coordinates({"grok_response": stated, "original_data": item}) == (37.7793, -122.4193)
+
+
+def test_upload_coordinates_win_over_model_coordinates():
+    result = {
+        "grok_response": {"location": {"coordinates": {"lat": 10.0, "lon": 10.0}}},
+        "original_data": {"transcript": "near the park", "lat": 37.7, "lon": -122.4},
+    }
+    assert extract_coordinates(result) == (37.7, -122.4)
+    result["original_data"] = {"transcript": "near the park"}
+    assert extract_coordinates(result) is None
+
+
+def test_from_work_items_uses_public_entries():
+    work_items = WorkItemIndex()
+    work_items.upsert({"id": "a", "priority_score": 50, "severity_score": 40, "severity_label": "moderate",
+                       "category": "pothole", "lat": 37.7, "lon": -122.4})
+    work_items.upsert({"id": "b", "priority_score": 10, "severity_score": 10, "severity_label": "low",
+                       "category": "graffiti", "lat": None, "lon": None})
+    index = GeoGridIndex.from_work_items(work_items)
+    assert len(index) == 1 and "a" in index
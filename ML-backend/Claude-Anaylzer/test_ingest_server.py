@@ -0,0 +1,117 @@
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+import ingest_server
+from ingest_server import IngestQueue, is_loopback, make_handler
+from process_uploads import is_valid_upload_id, result_path
+from usage_budget import Scheduler, TokenBudget, UsageLedger
+
+
+class FakeAnalyzer:
+    """Stands in for GrokAnalyzer: uploads come from a dict, results are recorded"""
+
+    def __init__(self, uploads=None):
+        self.uploads = uploads or {}
+        self.processed = []
+        self.budget = TokenBudget(UsageLedger(None), per_hour=0, per_day=0)
+        self.scheduler = Scheduler(self.budget)
+
+    def is_processed(self, item_id, output_dir):
+        return item_id in self.processed
+
+    def fetch_upload(self, upload_id, endpoint_url):
+        return dict(self.uploads[upload_id]) if upload_id in self.uploads else None
+
+    def process_item(self, item, output_dir, update_endpoint_url):
+        self.processed.append(item["id"])
+        return {"id": item["id"]}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(ingest_server, "INGEST_TOKEN", "secret")
+    ingest = IngestQueue(FakeAnalyzer(), reconcile_interval=3600)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(ingest))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield ingest, f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _post(url, body, token="secret"):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    request = urllib.request.Request(f"{url}/ingest", data=json.dumps(body).encode(), headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_requests_without_the_token_are_rejected(server):
+    ingest, url = server
+    assert _post(url, {"id": "abc"}, token=None)[0] == 401
+    assert _post(url, {"id": "abc"}, token="wrong")[0] == 401
+    assert ingest.depth() == 0
+
+
+@pytest.mark.parametrize("upload_id", ["../../etc/passwd", "a/b", "a.json", "", "x" * 129, 5])
+def test_invalid_ids_are_rejected(server, upload_id):
+    ingest, url = server
+    status, _ = _post(url, {"ids": [upload_id]})
+    assert status == 400
+    assert ingest.depth() == 0
+
+
+def test_pushed_payloads_are_queued_by_id_only(server):
+    ingest, url = server
+    status, body = _post(url, {"upload": {"id": "abc123", "transcript": "forged transcript"}})
+    assert status == 202 and body["queued"] == ["abc123"]
+    *_, item = ingest._queue.get_nowait()
+    assert item is None
+
+
+def test_loopback_detection():
+    assert is_loopback("127.0.0.1") and is_loopback("::1") and is_loopback("localhost")
+    assert not is_loopback("0.0.0.0") and not is_loopback("10.0.0.5")
+
+
+def test_main_refuses_open_host_without_token(monkeypatch):
+    monkeypatch.setattr(ingest_server, "INGEST_TOKEN", "")
+    monkeypatch.setattr(ingest_server, "INGEST_HOST", "0.0.0.0")
+    assert ingest_server.main() == 1
+
+
+def test_result_paths_reject_traversal(tmp_path):
+    assert is_valid_upload_id("Ab3_x-9")
+    assert result_path("Ab3_x-9", str(tmp_path)) == str(tmp_path / "Ab3_x-9.json")
+    with pytest.raises(ValueError):
+        result_path("../outside", str(tmp_path))
+
+
+def test_uploads_pushed_by_id_are_reprioritized_once_fetched():
+    analyzer = FakeAnalyzer({
+        "graffiti": {"transcript": "graffiti on the wall"},
+        "gas": {"transcript": "I smell gas near the school"},
+    })
+    ingest = IngestQueue(analyzer, reconcile_interval=3600)
+    # Both pushed by ID (placeholder score), then a pothole found by reconciliation
+    ingest.enqueue("graffiti")
+    ingest.enqueue("gas")
+    ingest.enqueue("pothole", {"id": "pothole", "transcript": "pothole on Oak Street"})
+
+    worker = threading.Thread(target=ingest._worker, daemon=True)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while len(analyzer.processed) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    ingest.stop()
+    worker.join(timeout=5)
+    assert analyzer.processed == ["gas", "pothole", "graffiti"]
+    assert ingest.stats_snapshot()["processed"] == 3
@@ -0,0 +1,152 @@
+import time
+import threading
+import httpx
+import pytest
+from types import SimpleNamespace
+from openai import OpenAI, APITimeoutError
+import llm_resilience
+from llm_resilience import CircuitBreaker, CircuitOpenError, Provider, ResilientLLM
+
+
+class FakeClient:
+    """chat.completions.create that sleeps, then answers or raises per call"""
+
+    def __init__(self, seconds=0.0, fail=False, usage=None):
+        self.seconds = seconds
+        self.fail = fail
+        self.usage = usage
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        self.calls += 1
+        time.sleep(self.seconds)
+        if self.fail:
+            raise APITimeoutError(request=httpx.Request("POST", "http://stub/v1/chat/completions"))
+        return SimpleNamespace(model=model, usage=self.usage)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+    assert breaker.state == "open"
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, cooldown=0.05)
+    breaker.record(True)
+    breaker.record(False)
+    breaker.record(True)
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half-open"
+    assert not breaker.allow()   # only one trial at a time
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_unused_backup_keeps_its_half_open_trial():
+    primary = Provider("primary", FakeClient())
+    backup = Provider("backup", FakeClient())
+    backup.breaker = CircuitBreaker(min_calls=1, cooldown=0)
+    open_breaker(backup.breaker)
+    llm = ResilientLLM(primary, backup, max_retries=0)
+
+    # The primary answers before the hedge delay, so the backup is never asked
+    for _ in range(3):
+        llm.create("grok", messages=[])
+    assert backup.client.calls == 0
+    assert not backup.breaker._trial_running
+    assert backup.breaker.allow()
+
+
+def test_slow_primary_is_hedged_to_backup():
+    primary = Provider("primary", FakeClient(seconds=0.5))
+    backup = Provider("backup", FakeClient(), model="backup-model")
+    primary.hedge_delay = lambda percentile: 0.05
+    llm = ResilientLLM(primary, backup, max_retries=0)
+
+    started = time.monotonic()
+    response = llm.create("grok", messages=[])
+    assert time.monotonic() - started < 0.4
+    assert response.model == "backup-model"
+    assert llm.last_call["provider"] == "backup"
+    assert llm.last_call["hedged"]
+    assert llm.stats["hedges"] == 1
+    assert llm.stats["backup_wins"] == 1
+
+
+def test_failed_primary_fails_over_and_open_breakers_raise():
+    primary = Provider("primary", FakeClient(fail=True))
+    backup = Provider("backup", FakeClient())
+    llm = ResilientLLM(primary, backup, max_retries=0)
+    llm.create("grok", messages=[])
+    assert llm.last_call["provider"] == "backup"
+    assert llm.stats["failovers"] == 1
+
+    open_breaker(primary.breaker)
+    open_breaker(backup.breaker)
+    with pytest.raises(CircuitOpenError):
+        llm.create("grok", messages=[])
+
+
+def test_failed_attempts_and_losing_hedges_are_reported():
+    primary = Provider("primary", FakeClient(seconds=0.3, usage="primary usage"))
+    backup = Provider("backup", FakeClient(usage="backup usage"))
+    primary.hedge_delay = lambda percentile: 0.05
+    llm = ResilientLLM(primary, backup, max_retries=0)
+    reported = []
+    llm.on_attempt = lambda context, record: reported.append((context, record))
+
+    assert llm.create("grok", context="item-1", messages=[]).usage == "backup usage"
+    time.sleep(0.4)
+    [(context, record)] = reported
+    assert context == "item-1"
+    assert record["provider"] == "primary" and record["usage"] == "primary usage" and record["discarded"]
+
+    reported.clear()
+    primary.client = FakeClient(fail=True)
+    llm.create("grok", context="item-2", messages=[])
+    [(context, record)] = reported
+    assert context == "item-2" and record["error"].startswith("APITimeoutError")
+
+
+def test_retries_with_backoff(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "RETRY_BASE_SECONDS", 0.0)
+    client = FakeClient(fail=True)
+    llm = ResilientLLM(Provider("primary", client), max_retries=2)
+    with pytest.raises(APITimeoutError):
+        llm.create("grok", messages=[])
+    assert client.calls == 3
+    assert llm.last_call["attempts"] == 3
+    assert llm.stats["retries"] == 2
+
+
+def test_hedging_against_stub_server():
+    _, slow_url = llm_resilience._stub_server(straggler_rate=1.0, straggler_seconds=1.0, error_rate=0.0, base_seconds=0.01)
+    _, fast_url = llm_resilience._stub_server(straggler_rate=0.0, straggler_seconds=0.0, error_rate=0.0, base_seconds=0.01)
+    primary = Provider("primary", OpenAI(api_key="stub", base_url=slow_url, max_retries=0))
+    primary.hedge_delay = lambda percentile: 0.1
+    llm = ResilientLLM(primary, Provider("backup", OpenAI(api_key="stub", base_url=fast_url, max_retries=0)))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(llm.create("stub", messages=[]))) for _ in range(4)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 4
+    assert time.monotonic() - started < 0.9
+    assert llm.stats["backup_wins"] == 4
@@ -0,0 +1,165 @@
+import json
+import base64
+from pathlib import Path
+from types import SimpleNamespace
+import httpx
+import pytest
+from openai import APITimeoutError
+import llm_resilience
+import process_uploads
+from process_uploads import GrokAnalyzer
+
+HERE = Path(__file__).parent
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64).decode()
+CONFIDENT = {"category": "pothole", "confidence": {"overall": 0.95}, "factors": {}}
+UNSURE = {"category": "pothole", "confidence": {"overall": 0.2}, "factors": {}}
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch):
+    monkeypatch.setenv("USAGE_LEDGER_PATH", str(tmp_path / "usage_ledger.jsonl"))
+    monkeypatch.setenv("GROK_FAST_MODEL", "fast")
+    monkeypatch.setenv("GROK_VISION_MODEL", "vision")
+    analyzer = GrokAnalyzer(api_key="test", model="single", system_prompt_file=str(HERE / "system_prompt.txt"))
+    analyzer.calls = []
+    analyzer.answers = []
+
+    def call_model(model, content, on_routing_fields=None, item_id=None):
+        analyzer.calls.append((model, [part["type"] for part in content]))
+        return dict(analyzer.answers.pop(0)), None
+
+    analyzer._call_model = call_model
+    return analyzer
+
+
+@pytest.mark.parametrize("cascade", [True, False])
+def test_item_without_transcript_or_image_is_not_sent(analyzer, cascade):
+    analyzer.cascade = cascade
+    result = analyzer.process_with_grok({"id": "empty", "transcript": "", "picture": "bm90IGFuIGltYWdl"})
+    assert "error" in result
+    assert analyzer.calls == []
+
+
+def test_single_model_sees_image_and_transcript(analyzer):
+    analyzer.cascade = False
+    analyzer.answers = [CONFIDENT]
+    result = analyzer.process_with_grok({"id": "a", "transcript": "[User] pothole on Oak", "picture": PNG})
+    assert analyzer.calls == [("single", ["image_url", "text"])]
+    assert result["route"]["model"] == "single" and not result["route"]["escalated"]
+
+
+def test_cascade_accepts_confident_fast_answer(analyzer):
+    analyzer.cascade = True
+    analyzer.answers = [CONFIDENT]
+    result = analyzer.process_with_grok({"id": "a", "transcript": "[User] pothole on Oak"})
+    assert analyzer.calls == [("fast", ["text"])]
+    assert result["route"]["model"] == "fast"
+
+
+def test_cascade_escalates_unsure_answer_with_image(analyzer):
+    analyzer.cascade = True
+    analyzer.answers = [UNSURE, CONFIDENT]
+    result = analyzer.process_with_grok({"id": "a", "transcript": "[User] pothole on Oak", "picture": PNG})
+    assert analyzer.calls == [("fast", ["text"]), ("vision", ["image_url", "text"])]
+    assert result["route"]["escalated"] and result["route"]["model"] == "vision"
+
+
+def test_cascade_sends_image_only_items_to_vision_model(analyzer):
+    analyzer.cascade = True
+    analyzer.answers = [CONFIDENT]
+    result = analyzer.process_with_grok({"id": "a", "transcript": "", "picture": PNG})
+    assert analyzer.calls == [("vision", ["image_url"])]
+    assert result["route"]["reason"] == "image only"
+
+
+class FakeClient:
+    """chat.completions.create returning a fixed JSON answer with usage"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        if self.fail:
+            raise APITimeoutError(request=httpx.Request("POST", "http://stub/v1/chat/completions"))
+        message = SimpleNamespace(content=json.dumps(CONFIDENT))
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=200, total_tokens=1200)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.fixture
+def live_analyzer(tmp_path, monkeypatch):
+    """GrokAnalyzer with its real call path against a fake provider client"""
+    monkeypatch.setenv("USAGE_LEDGER_PATH", str(tmp_path / "usage_ledger.jsonl"))
+    analyzer = GrokAnalyzer(api_key="test", model="single", system_prompt_file=str(HERE / "system_prompt.txt"),
+                            stream=False, cascade=False)
+    analyzer.llm.max_retries = 1
+    monkeypatch.setattr(llm_resilience, "RETRY_BASE_SECONDS", 0.0)
+    return analyzer
+
+
+def test_usage_is_kept_when_the_item_fails_after_the_answer(live_analyzer, monkeypatch):
+    live_analyzer.llm.providers[0].client = FakeClient()
+    monkeypatch.setattr(process_uploads, "apply_scores", lambda *args: 1 / 0)
+    result = live_analyzer.process_with_grok({"id": "a", "transcript": "[User] pothole on Oak"})
+    assert "error" in result
+    assert result["usage"]["total_tokens"] == 1200
+    [record] = live_analyzer.ledger.window(3600)
+    assert record["total_tokens"] == 1200 and record["error"]
+
+
+def test_every_failed_attempt_is_recorded_once(live_analyzer):
+    live_analyzer.llm.providers[0].client = FakeClient(fail=True)
+    result = live_analyzer.process_with_grok({"id": "a", "transcript": "[User] pothole on Oak"})
+    assert "error" in result
+    records = live_analyzer.ledger.window(3600)
+    assert len(records) == 2
+    assert all(r["id"] == "a" and r["error"].startswith("APITimeoutError") for r in records)
+
+
+@pytest.mark.parametrize("data, expected", [
+    ({"documents": [{"id": "A", "transcript": "pothole"}, {"id": "B", "transcript": "live wires"}]}, "pothole"),
+    ({"document": {"transcript": "pothole"}}, "pothole"),
+    ({"documents": [{"id": "B", "transcript": "live wires"}]}, None),
+    ({"id": "B", "transcript": "live wires"}, None),
+    ([], None),
+])
+def test_fetch_upload_only_returns_the_requested_upload(analyzer, monkeypatch, data, expected):
+    response = SimpleNamespace(json=lambda: data, raise_for_status=lambda: None)
+    monkeypatch.setattr(process_uploads.requests, "get", lambda *args, **kwargs: response)
+    item = analyzer.fetch_upload("A", "http://uploads")
+    if expected is None:
+        assert item is None
+    else:
+        assert item["id"] == "A" and item["transcript"] == expected
+
+
+def test_items_failing_on_an_open_breaker_are_not_saved(live_analyzer, tmp_path):
+    live_analyzer.llm.providers[0].client = FakeClient()
+    breaker = live_analyzer.llm.providers[0].breaker
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+    output_dir = str(tmp_path / "outputs")
+
+    result = live_analyzer.process_item({"id": "a", "transcript": "[User] pothole on Oak"}, output_dir)
+    assert result["transient"] and "circuit" in result["error"]
+    assert not live_analyzer.is_processed("a", output_dir)
+
+    # After the cooldown the next run sends the half-open trial, which succeeds
+    breaker.cooldown = 0
+    result = live_analyzer.process_item({"id": "a", "transcript": "[User] pothole on Oak"}, output_dir)
+    assert "error" not in result
+    assert live_analyzer.is_processed("a", output_dir)
+
+
+def test_timeouts_are_retried_but_bad_answers_are_saved(live_analyzer, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "outputs")
+    live_analyzer.llm.providers[0].client = FakeClient(fail=True)
+    assert live_analyzer.process_item({"id": "a", "transcript": "[User] pothole"}, output_dir)["transient"]
+    assert not live_analyzer.is_processed("a", output_dir)
+
+    live_analyzer.llm.providers[0].client = FakeClient()
+    monkeypatch.setattr(process_uploads, "apply_scores", lambda *args: 1 / 0)
+    result = live_analyzer.process_item({"id": "b", "transcript": "[User] pothole"}, output_dir)
+    assert "error" in result and not result.get("transient")
+    assert live_analyzer.is_processed("b", output_dir)
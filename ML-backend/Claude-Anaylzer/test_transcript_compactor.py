@@ -0,0 +1,68 @@
+import importlib.util
+from pathlib import Path
+from transcript_compactor import NOISE_PATTERNS, compact_transcript, estimate_tokens, TRIM_MARKER
+
+AGENT_CONFIG = Path(__file__).parent.parent / "voice-agent-backend" / "agent_config.py"
+
+
+def test_noise_and_consecutive_repeats_are_dropped():
+    transcript = "\n".join([
+        "=== Conversation Transcript ===",
+        "Session Started: 2025-10-26 07:05:26",
+        "[Agent Thinking] The user wants to report something",
+        "[User] There is a pothole on Oak Street",
+        "[User] There is a pothole on Oak Street",
+        "[Agent] Got it.",
+        "Session Ended: 2025-10-26 07:06:00",
+    ])
+    compacted, stats = compact_transcript(transcript)
+    assert compacted == "[User] There is a pothole on Oak Street\n[Agent] Got it."
+    assert not stats["truncated"]
+
+
+def test_agent_line_repeated_later_in_the_call_is_kept():
+    transcript = "\n".join([
+        "[Agent] Can you confirm the address?",
+        "[User] 12 Oak Street",
+        "[Agent] Can you confirm the address?",
+        "[User] Yes, 12 Oak Street",
+    ])
+    compacted, _ = compact_transcript(transcript)
+    assert compacted.count("[Agent] Can you confirm the address?") == 2
+
+
+def test_single_line_over_budget_is_trimmed_not_dropped():
+    transcript = "[User] " + " ".join(f"word{i}" for i in range(2000))
+    compacted, stats = compact_transcript(transcript, token_budget=100)
+    assert stats["truncated"]
+    assert compacted.startswith("[User] word0 word1")
+    assert compacted.endswith(TRIM_MARKER)
+    assert estimate_tokens(compacted) <= 110
+
+
+def test_long_first_line_keeps_its_start_and_the_call_end():
+    lines = ["[User] " + "pothole " * 1000] + [f"[Agent] reply {i}" for i in range(50)] + ["[Agent] Report filed."]
+    compacted, stats = compact_transcript("\n".join(lines), token_budget=200)
+    kept = compacted.splitlines()
+    assert kept[0].startswith("[User] pothole pothole")
+    assert kept[-1] == "[Agent] Report filed."
+    assert any("lines omitted" in line for line in kept)
+    assert estimate_tokens(compacted) <= 230
+
+
+def test_truncation_keeps_head_and_tail():
+    lines = [f"[User] line number {i} with some words" for i in range(200)]
+    compacted, stats = compact_transcript("\n".join(lines), token_budget=150)
+    kept = compacted.splitlines()
+    assert kept[0] == lines[0] and kept[-1] == lines[-1]
+    assert stats["truncated"] and stats["lines_dropped"] > 0
+
+
+def test_greeting_pattern_matches_the_voice_agent_greeting():
+    spec = importlib.util.spec_from_file_location("voice_agent_config", AGENT_CONFIG)
+    agent_config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(agent_config)
+    line = f"[Agent] {agent_config.AGENT_GREETING}"
+    assert any(pattern.search(line) for pattern in NOISE_PATTERNS)
+    compact, stats = compact_transcript(f"{line}\n[User] The streetlight on Pine is out", 1500)
+    assert compact == "[User] The streetlight on Pine is out"
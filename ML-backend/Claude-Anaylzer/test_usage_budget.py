@@ -0,0 +1,92 @@
+import json
+import time
+import pytest
+from usage_budget import (
+    HOUR, UNKNOWN_PRE_SCORE, Scheduler, TokenBudget, UsageLedger, pre_score, summarize,
+)
+
+
+@pytest.mark.parametrize("transcript", [
+    "the fire hydrant on Elm is leaking",
+    "smoke detector in the library is beeping",
+    "the fire station driveway has a pothole",
+])
+def test_fire_and_smoke_compounds_are_not_high_risk(transcript):
+    assert pre_score({"transcript": transcript}) < 60
+
+
+@pytest.mark.parametrize("transcript", [
+    "there is a fire in the dumpster",
+    "smoke is coming out of the manhole",
+    "I smell gas by the school",
+])
+def test_hazards_are_high_risk(transcript):
+    assert pre_score({"transcript": transcript}) >= 60
+
+
+def test_pre_score_without_transcript():
+    assert pre_score({"transcript": "", "picture": "x"}) == UNKNOWN_PRE_SCORE
+    assert pre_score({"transcript": ""}) == 0
+    assert pre_score({"transcript": "hello there"}) == 20
+
+
+def record(ledger, tokens, ts=None, **fields):
+    entry = ledger.record("item", {"model": "grok", "usage": {"total_tokens": tokens, "completion_tokens": 100},
+                                   **fields})
+    if ts is not None:
+        entry["ts"] = ts
+    return entry
+
+
+def test_ledger_persists_and_budget_counts_windows(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    ledger = UsageLedger(str(path))
+    record(ledger, 1000)
+    record(ledger, 500, error="APITimeoutError: timed out")
+    record(ledger, 200, discarded=True)
+    assert ledger.tokens_used(HOUR) == 1700
+    assert len(UsageLedger(str(path)).window(HOUR)) == 3
+
+    budget = TokenBudget(ledger, per_hour=2000, per_day=0)
+    assert budget.remaining() == 300
+    assert budget.fits(300) and not budget.fits(301)
+    assert budget.seconds_until_fits(5000) is None
+
+    totals = summarize(str(path))["grok"]
+    assert (totals["calls"], totals["errors"], totals["discarded"], totals["total_tokens"]) == (3, 1, 1, 1700)
+
+
+def test_seconds_until_fits_waits_for_old_usage_to_expire(tmp_path):
+    ledger = UsageLedger(None)
+    budget = TokenBudget(ledger, per_hour=1000, per_day=0)
+    now = time.time()
+    record(ledger, 800, ts=now - HOUR + 60)
+    record(ledger, 100, ts=now - 10)
+    assert budget.seconds_until_fits(100, now=now) == 0
+    assert budget.seconds_until_fits(500, now=now) == pytest.approx(60)
+
+
+def test_scheduler_runs_highest_pre_score_first_and_defers_the_rest():
+    ledger = UsageLedger(None)
+    items = [
+        {"id": "graffiti", "transcript": "graffiti on the wall"},
+        {"id": "gas", "transcript": "I smell gas near the school"},
+        {"id": "pothole", "transcript": "pothole on Oak Street"},
+    ]
+    unlimited = Scheduler(TokenBudget(ledger, 0, 0), system_prompt_tokens=100)
+    run, deferred = unlimited.plan(items)
+    assert [item["id"] for item, _, _ in run] == ["gas", "pothole", "graffiti"]
+    assert deferred == []
+
+    estimate = unlimited.estimate_tokens(items[1])
+    tight = Scheduler(TokenBudget(ledger, per_hour=estimate + 10, per_day=0), system_prompt_tokens=100)
+    run, deferred = tight.plan(items)
+    assert [item["id"] for item, _, _ in run] == ["gas"]
+    assert {item["id"] for item in deferred} == {"pothole", "graffiti"}
+
+
+def test_ledger_file_is_jsonl(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    record(UsageLedger(str(path)), 42, provider="backup")
+    line = json.loads(path.read_text().splitlines()[0])
+    assert line["total_tokens"] == 42 and line["provider"] == "backup" and line["prompt_tokens"] == 0
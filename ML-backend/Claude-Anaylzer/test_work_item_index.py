@@ -0,0 +1,24 @@
+from work_item_index import WorkItemIndex
+
+
+def result(item_id, priority, category="pothole", label="high"):
+    return {"id": item_id, "processed_at": "2025-10-26T07:00:00+00:00",
+            "grok_response": {"category": category, "issue_summary": item_id,
+                              "scores": {"priority_score": priority, "severity_score": priority,
+                                         "severity_label": label}}}
+
+
+def test_top_k_orders_by_priority_within_filters(tmp_path):
+    index = WorkItemIndex.load(str(tmp_path))
+    for args in [("a", 40), ("b", 90), ("c", 70, "graffiti", "low"), ("d", 60, "pothole", "low")]:
+        assert index.upsert_result(result(*args))
+    assert not index.upsert_result({"id": "e", "error": "failed"})
+
+    assert [e["id"] for e in index.top_k(3)] == ["b", "c", "d"]
+    assert [e["id"] for e in index.top_k(10, category="pothole")] == ["b", "d", "a"]
+    assert [e["id"] for e in index.top_k(10, category="pothole", severity_label="low")] == ["d"]
+    assert "status" not in index.get("a")
+
+    # The log replays to the same index
+    reloaded = WorkItemIndex.load(str(tmp_path))
+    assert [e["id"] for e in reloaded.top_k(10)] == ["b", "c", "d", "a"]
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import math
+import argparse
+
+# Default token budget for the transcript part of the prompt
+DEFAULT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "1500"))
+
+# Share of the budget kept from the start of the call when truncating; the
+# rest comes from the end, where the agent usually reads the report back.
+HEAD_SHARE = 0.6
+
+# Lines added by the voice agent's TranscriptManager that carry no evidence
+NOISE_PATTERNS = [
+    re.compile(r"^=== Conversation Transcript ===$"),
+    re.compile(r"^Session (Started|Ended): "),
+    re.compile(r"^\[Agent Thinking\]"),
+    # Opening of agent_config.AGENT_GREETING in voice-agent-backend (kept in sync by a test)
+    re.compile(r"^\[Agent\] Hey there! This is the AI service agent\b"),
+]
+
+# Appended to a line that was cut to fit the budget
+TRIM_MARKER = " [...]"
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """
+    Fast BPE-style token estimate without loading a tokenizer
+
+    Counts one token per punctuation mark and one per ~4 characters of each word.
+    """
+    return sum(max(1, math.ceil(len(w) / 4)) if w[0].isalnum() or w[0] == '_' else 1
+               for w in _WORD_RE.findall(text))
+
+
+def _json_turns(lines):
+    """
+    Expand the older transcript format where each turn was dumped as a JSON blob:
+
+        [User] {
+            "type": "ConversationText",
+            "role": "user",
+            "content": "..."
+        }
+    """
+    blob, speaker = None, None
+    for line in lines:
+        if blob is not None:
+            blob.append(line)
+            if line.strip() == "}":
+                try:
+                    content = json.loads("\n".join(blob)).get("content", "")
+                except (json.JSONDecodeError, AttributeError):
+                    content = " ".join(l.strip() for l in blob)
+                yield f"{speaker} {content}".rstrip()
+                blob = None
+            continue
+        match = re.match(r"^(\[[^\]]+\]) \{$", line.strip())
+        if match:
+            speaker, blob = match.group(1), ["{"]
+            continue
+        yield line
+    if blob is not None:
+        yield f"{speaker} " + " ".join(l.strip() for l in blob)
+
+
+def _trim_line(line, token_budget):
+    """Cut one line down to about token_budget tokens, keeping its start"""
+    room = max(1, token_budget - estimate_tokens(TRIM_MARKER))
+    words, used = [], 0
+    for word in line.split(" "):
+        tokens = estimate_tokens(word)
+        if used + tokens > room:
+            if not words:
+                # One huge "word" (e.g. a pasted blob): cut it by characters
+                words.append(word[:(room - used) * 4])
+            break
+        words.append(word)
+        used += tokens
+    return " ".join(words) + TRIM_MARKER
+
+
+def compact_transcript(transcript, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Strip non-evidence lines, deduplicate and truncate a transcript to a token budget
+
+    Args:
+        transcript: Raw transcript text as stored by the voice agent
+        token_budget: Maximum estimated tokens to keep (None or 0 disables truncation)
+
+    Returns:
+        Tuple of (compacted transcript, stats dict)
+    """
+    kept = []
+    dropped = 0
+    for line in _json_turns(transcript.splitlines()):
+        line = line.strip()
+        if not line or any(p.search(line) for p in NOISE_PATTERNS):
+            dropped += 1
+            continue
+        # Speaker tag with nothing said
+        if re.fullmatch(r"\[[^\]]+\]\s*", line):
+            dropped += 1
+            continue
+        # Consecutive repeats (STT echoes); a line said again later in the call is kept
+        if kept and kept[-1] == line:
+            dropped += 1
+            continue
+        kept.append(line)
+
+    line_tokens = [estimate_tokens(line) + 1 for line in kept]
+    truncated = False
+    if token_budget and sum(line_tokens) > token_budget:
+        truncated = True
+        if len(kept) == 1:
+            kept = [_trim_line(kept[0], token_budget)]
+        else:
+            head_budget = int(token_budget * HEAD_SHARE)
+            head, used = [], 0
+            for line, tokens in zip(kept, line_tokens):
+                if used + tokens > head_budget:
+                    break
+                head.append(line)
+                used += tokens
+            if not head:
+                # The first line alone is over the head share: keep its start rather than nothing
+                head = [_trim_line(kept[0], head_budget)]
+                used = estimate_tokens(head[0]) + 1
+            tail = []
+            for line, tokens in zip(reversed(kept[len(head):]), reversed(line_tokens[len(head):])):
+                if used + tokens > token_budget:
+                    break
+                tail.append(line)
+                used += tokens
+            if not tail and token_budget - used > 8:
+                tail = [_trim_line(kept[-1], token_budget - used)]
+            tail.reverse()
+            omitted = len(kept) - len(head) - len(tail)
+            dropped += omitted
+            kept = head + ([f"[... {omitted} lines omitted ...]"] if omitted else []) + tail
+
+    compacted = "\n".join(kept)
+    raw_tokens = estimate_tokens(transcript)
+    compact_tokens = estimate_tokens(compacted)
+    return compacted, {
+        "raw_tokens": raw_tokens,
+        "compact_tokens": compact_tokens,
+        "saved_tokens": raw_tokens - compact_tokens,
+        "lines_dropped": dropped,
+        "truncated": truncated,
+    }
+
+
+def main():
+    """Report how much each transcript file would shrink"""
+    parser = argparse.ArgumentParser(description="Preview transcript compaction")
+    parser.add_argument("files", nargs="+", help="Transcript files")
+    parser.add_argument("--budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Token budget per transcript")
+    parser.add_argument("--show", action="store_true", help="Print the compacted transcripts")
+    args = parser.parse_args()
+
+    total_raw = total_compact = 0
+    for path in args.files:
+        with open(path, 'r') as f:
+            compacted, stats = compact_transcript(f.read(), args.budget)
+        total_raw += stats["raw_tokens"]
+        total_compact += stats["compact_tokens"]
+        print(f"{path}: {stats['raw_tokens']} → {stats['compact_tokens']} tokens"
+              f"{' (truncated)' if stats['truncated'] else ''}")
+        if args.show:
+            print(compacted + "\n")
+    if total_raw:
+        print(f"✂️  Total: {total_raw} → {total_compact} tokens "
+              f"({100 * (total_raw - total_compact) / total_raw:.0f}% saved)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from transcript_compactor import compact_transcript
+
+USAGE_LEDGER_NAME = "usage_ledger.jsonl"
+
+# Token budgets over rolling windows; 0 means unlimited
+TOKENS_PER_HOUR = int(os.getenv("GROK_TOKENS_PER_HOUR", "0"))
+TOKENS_PER_DAY = int(os.getenv("GROK_TOKENS_PER_DAY", "0"))
+
+# Estimates used before the ledger has enough history
+IMAGE_TOKEN_ESTIMATE = int(os.getenv("IMAGE_TOKEN_ESTIMATE", "1500"))
+COMPLETION_TOKEN_ESTIMATE = int(os.getenv("COMPLETION_TOKEN_ESTIMATE", "700"))
+
+# Pre-score at or above which a report counts as high risk
+HIGH_RISK_SCORE = int(os.getenv("HIGH_RISK_SCORE", "60"))
+# Pre-score for uploads queued by ID only (no transcript to look at yet)
+UNKNOWN_PRE_SCORE = 50
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Transcript keywords and the pre-score they add; the highest match counts fully,
+# every further match adds a quarter of its weight
+RISK_KEYWORDS = [
+    (re.compile(r"\b(injur\w*|bleeding|unconscious|ambulance|emergency)\b"), 80),
+    (re.compile(r"\b(live wires?|downed (power )?lines?|power lines?|sparking|electrocut\w*)\b"), 80),
+    # "fire" and "smoke" on their own, not as in fire hydrant, fire station or smoke detector
+    (re.compile(r"\b(gas leak|smell(s|ing)? (of )?gas|explosion|"
+                r"fire(?! (hydrant|station|department|dept|lane|alarm|exit|escape|door|extinguisher|truck|pit)s?\b)|"
+                r"smoke(?! (detector|alarm)s?\b))\b"), 75),
+    (re.compile(r"\b(sinkhole|collaps\w*|exposed rebar|falling|fallen tree|tree (down|fell))\b"), 65),
+    (re.compile(r"\b(flood\w*|sewage|chemical|spill|burst|water main)\b"), 55),
+    (re.compile(r"\b(traffic (light|signal)s?|stop sign|school|hospital|wheelchair|ada)\b"), 45),
+    (re.compile(r"\b(blocked|blocking|can'?t pass|dangerous|hazard\w*|urgent|accident)\b"), 40),
+    (re.compile(r"\b(pothole|crack\w*|streetlight|street light|debris|ice|icy|hydrant)\b"), 25),
+    (re.compile(r"\b(graffiti|litter|noise|dumping|trash)\b"), 10),
+]
+
+
+def usage_from_response(usage):
+    """
+    Token counts from an OpenAI-compatible `usage` object
+
+    Args:
+        usage: response.usage (or the final stream chunk's usage), may be None
+
+    Returns:
+        Dictionary of token counts (zeros when the provider sent no usage)
+    """
+    def count(obj, name):
+        value = getattr(obj, name, None) if obj is not None else None
+        return value if isinstance(value, int) else 0
+
+    prompt_details = getattr(usage, "prompt_tokens_details", None) if usage is not None else None
+    completion_details = getattr(usage, "completion_tokens_details", None) if usage is not None else None
+    return {
+        "prompt_tokens": count(usage, "prompt_tokens"),
+        "completion_tokens": count(usage, "completion_tokens"),
+        "total_tokens": count(usage, "total_tokens"),
+        "cached_tokens": count(prompt_details, "cached_tokens"),
+        "image_tokens": count(prompt_details, "image_tokens"),
+        "reasoning_tokens": count(completion_details, "reasoning_tokens"),
+    }
+
+
+def pre_score(item):
+    """
+    Cheap 0-100 risk estimate for an upload from its transcript keywords
+
+    Used only to order work before the model has seen it; the model's own
+    scores (scoring.py) replace it once the item is analyzed.
+    """
+    transcript = (item.get('transcript') or '').lower()
+    if not transcript:
+        return UNKNOWN_PRE_SCORE if item.get('picture') else 0
+    weights = sorted((weight for pattern, weight in RISK_KEYWORDS if pattern.search(transcript)), reverse=True)
+    if not weights:
+        return 20
+    return min(100, weights[0] + sum(weights[1:]) // 4)
+
+
+class UsageLedger:
+    """
+    Append-only JSONL record of every model call's tokens, latency and model
+
+    The last day of records is kept in memory for budget checks; the file
+    keeps the full history for cost reports.
+    """
+
+    def __init__(self, path):
+        """
+        Load the recent part of an existing ledger
+
+        Args:
+            path: JSONL ledger file (created on the first record)
+        """
+        self.path = path
+        self._recent = deque()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            cutoff = time.time() - DAY
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("ts", 0) >= cutoff:
+                        self._recent.append(record)
+
+    def record(self, item_id, stage):
+        """
+        Append one model call
+
+        Args:
+            item_id: Upload ID the call was for
+            stage: Route stage dict (model, seconds, provider and a "usage" dict), or a
+                   failed / discarded attempt with "error" or "discarded" set
+
+        Returns:
+            The ledger record
+        """
+        usage = stage.get("usage") or {}
+        record = {
+            "ts": round(time.time(), 3),
+            "at": datetime.now(timezone.utc).isoformat(),
+            "id": item_id,
+            "model": stage.get("served_by") or stage.get("model"),
+            "provider": stage.get("provider"),
+            "with_image": stage.get("with_image", False),
+            "seconds": stage.get("seconds"),
+            **usage_from_response(None),
+            **usage,
+        }
+        if stage.get("error"):
+            record["error"] = stage["error"]
+        if stage.get("discarded"):
+            # A losing hedge: billed, but its answer was not used
+            record["discarded"] = True
+        with self._lock:
+            self._recent.append(record)
+            self._expire()
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+        return record
+
+    def _expire(self, now=None):
+        cutoff = (now or time.time()) - DAY
+        while self._recent and self._recent[0]["ts"] < cutoff:
+            self._recent.popleft()
+
+    def window(self, seconds, now=None):
+        """Records from the last `seconds`, oldest first"""
+        now = now or time.time()
+        with self._lock:
+            self._expire(now)
+            return [r for r in self._recent if r["ts"] >= now - seconds]
+
+    def tokens_used(self, seconds, now=None):
+        return sum(r["total_tokens"] for r in self.window(seconds, now))
+
+    def mean_completion_tokens(self):
+        """Average completion tokens over the last day (None without history)"""
+        records = [r for r in self.window(DAY) if r["completion_tokens"]]
+        if len(records) < 5:
+            return None
+        return sum(r["completion_tokens"] for r in records) // len(records)
+
+
+class TokenBudget:
+    """Per-hour and per-day token limits checked against the usage ledger"""
+
+    def __init__(self, ledger, per_hour=TOKENS_PER_HOUR, per_day=TOKENS_PER_DAY):
+        self.ledger = ledger
+        self.limits = [(HOUR, per_hour), (DAY, per_day)]
+
+    @property
+    def enabled(self):
+        return any(limit for _, limit in self.limits)
+
+    def remaining(self, now=None):
+        """Tokens left in the tightest window (None when unlimited)"""
+        left = [limit - self.ledger.tokens_used(seconds, now) for seconds, limit in self.limits if limit]
+        return max(0, min(left)) if left else None
+
+    def fits(self, tokens, now=None):
+        remaining = self.remaining(now)
+        return remaining is None or tokens <= remaining
+
+    def seconds_until_fits(self, tokens, now=None):
+        """
+        Seconds until enough old usage leaves the windows for `tokens` to fit
+
+        Returns:
+            0 if it fits now, None if it can never fit (larger than a limit)
+        """
+        now = now or time.time()
+        wait = 0.0
+        for seconds, limit in self.limits:
+            if not limit:
+                continue
+            if tokens > limit:
+                return None
+            excess = self.ledger.tokens_used(seconds, now) + tokens - limit
+            for record in self.ledger.window(seconds, now):
+                if excess <= 0:
+                    break
+                excess -= record["total_tokens"]
+                wait = max(wait, record["ts"] + seconds - now)
+        return wait
+
+    def report(self, now=None):
+        return {
+            "tokens_last_hour": self.ledger.tokens_used(HOUR, now),
+            "tokens_last_day": self.ledger.tokens_used(DAY, now),
+            "tokens_per_hour_limit": self.limits[0][1] or None,
+            "tokens_per_day_limit": self.limits[1][1] or None,
+            "tokens_remaining": self.remaining(now),
+        }
+
+
+class Scheduler:
+    """
+    Orders pending uploads by pre-score and fits them into the token budget
+
+    Items run highest pre-score first. When the budget cannot cover the whole
+    backlog, items that do not fit are deferred to a later run, and cheaper
+    items further down may still fill the remaining budget.
+    """
+
+    def __init__(self, budget, system_prompt_tokens=0, transcript_token_budget=1500):
+        self.budget = budget
+        self.system_prompt_tokens = system_prompt_tokens
+        self.transcript_token_budget = transcript_token_budget
+
+    def estimate_tokens(self, item, completion=None):
+        """
+        Expected total tokens for analyzing one upload
+
+        Args:
+            item: Upload dictionary
+            completion: Expected completion tokens (defaults to the ledger's recent mean)
+        """
+        transcript = (item.get('transcript') or '').strip("'\"")
+        _, stats = compact_transcript(transcript, self.transcript_token_budget)
+        completion = completion or self.budget.ledger.mean_completion_tokens() or COMPLETION_TOKEN_ESTIMATE
+        image = IMAGE_TOKEN_ESTIMATE if item.get('picture') else 0
+        return self.system_prompt_tokens + stats["compact_tokens"] + image + completion
+
+    def plan(self, items):
+        """
+        Split items into those to run now (in order) and those to defer
+
+        Args:
+            items: Pending upload dictionaries
+
+        Returns:
+            Tuple of (list of (item, pre_score, estimate) to run, list of deferred items)
+        """
+        scored = sorted(((pre_score(item), -idx, item) for idx, item in enumerate(items)),
+                        key=lambda entry: entry[:2], reverse=True)
+        remaining = self.budget.remaining()
+        completion = self.budget.ledger.mean_completion_tokens() or COMPLETION_TOKEN_ESTIMATE
+        run, deferred = [], []
+        for score, _, item in scored:
+            estimate = self.estimate_tokens(item, completion)
+            if remaining is None or estimate <= remaining:
+                run.append((item, score, estimate))
+                if remaining is not None:
+                    remaining -= estimate
+            else:
+                deferred.append(item)
+        return run, deferred
+
+
+def summarize(ledger_path, hours=24):
+    """Per-model token and latency totals from a ledger file"""
+    cutoff = time.time() - hours * HOUR
+    models = {}
+    with open(ledger_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("ts", 0) < cutoff:
+                continue
+            entry = models.setdefault(record.get("model") or "unknown", {
+                "calls": 0, "errors": 0, "discarded": 0, "prompt_tokens": 0, "completion_tokens": 0, "image_tokens": 0,
+                "cached_tokens": 0, "total_tokens": 0, "seconds": [],
+            })
+            entry["calls"] += 1
+            entry["errors"] += 1 if record.get("error") else 0
+            entry["discarded"] += 1 if record.get("discarded") else 0
+            for key in ("prompt_tokens", "completion_tokens", "image_tokens", "cached_tokens", "total_tokens"):
+                entry[key] += record.get(key) or 0
+            if record.get("seconds") is not None:
+                entry["seconds"].append(record["seconds"])
+    for entry in models.values():
+        seconds = sorted(entry.pop("seconds"))
+        entry["p50_seconds"] = seconds[len(seconds) // 2] if seconds else None
+        entry["p95_seconds"] = seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))] if seconds else None
+    return models
+
+
+def _benchmark(n_items, budget_share=0.3):
+    """
+    Compare arrival-order and scheduled processing when the budget covers only part of the backlog
+
+    Each synthetic phrase carries a hand-assigned high-risk label that does not
+    come from RISK_KEYWORDS, including phrases the keywords get wrong both ways,
+    so coverage measures the pre-score rather than restating it.
+    """
+    phrases = [
+        ("there is a pothole on Oak Street", False), ("graffiti on the wall by the park", False),
+        ("trash dumping behind the store", False), ("a streetlight is out", False),
+        ("the fire hydrant on Elm is painted over", False), ("the smoke detector in the library is beeping", False),
+        ("noise from construction at night", False), ("an icy patch on the bike lane", False),
+        ("the traffic signal is broken at 5th", True), ("live wires down after the storm", True),
+        ("I smell gas near the school", True), ("someone was injured on the broken sidewalk", True),
+        ("a fallen tree is blocking the road", True), ("there is smoke coming from a manhole", True),
+        ("a child fell into an uncovered drain", True), ("the bridge railing is hanging loose over the river", True),
+    ]
+    random.seed(7)
+    items, high_risk = [], set()
+    for idx in range(n_items):
+        chosen = random.sample(phrases, random.choice([1, 1, 2]))
+        text = " and ".join(phrase for phrase, _ in chosen) + ". " + "details " * random.randint(20, 300)
+        items.append({"id": f"item-{idx}", "transcript": text, "picture": "x" if random.random() < 0.4 else ""})
+        if any(label for _, label in chosen):
+            high_risk.add(f"item-{idx}")
+
+    ledger = UsageLedger(None)
+    scheduler = Scheduler(TokenBudget(ledger, per_hour=0, per_day=0), system_prompt_tokens=900)
+    started = time.perf_counter()
+    estimates = [scheduler.estimate_tokens(item) for item in items]
+    limit = int(sum(estimates) * budget_share)
+    scheduler.budget = TokenBudget(ledger, per_hour=limit, per_day=0)
+    run, deferred = scheduler.plan(items)
+    elapsed = time.perf_counter() - started
+
+    flagged = {item["id"] for item in items if pre_score(item) >= HIGH_RISK_SCORE}
+    fifo, used = [], 0
+    for item, estimate in zip(items, estimates):
+        if used + estimate <= limit:
+            fifo.append(item)
+            used += estimate
+    share = lambda selected: sum(1 for item in selected if item["id"] in high_risk) / max(1, len(high_risk))
+    print(f"🧪 {n_items} uploads, {len(high_risk)} labelled high risk, budget {limit} tokens "
+          f"({budget_share:.0%} of backlog)")
+    print(f"🏷️  Pre-score >= {HIGH_RISK_SCORE}: recall {len(flagged & high_risk) / max(1, len(high_risk)):.0%}, "
+          f"precision {len(flagged & high_risk) / max(1, len(flagged)):.0%}")
+    print(f"⏱️  Planning: {elapsed * 1000:.1f} ms ({elapsed / n_items * 1e6:.0f} µs per item)")
+    print(f"📊 Arrival order: {len(fifo)} processed, {share(fifo):.0%} of labelled high-risk reports")
+    print(f"📊 Scheduled:     {len(run)} processed, {share([item for item, _, _ in run]):.0%} of labelled "
+          f"high-risk reports, {len(deferred)} deferred")
+
+
+def main():
+    """Usage ledger summary and scheduler benchmark"""
+    parser = argparse.ArgumentParser(description="Analyzer token usage and budget scheduling")
+    parser.add_argument("--ledger", default=os.path.join("outputs", USAGE_LEDGER_NAME), help="Usage ledger JSONL file")
+    parser.add_argument("--hours", type=float, default=24, help="Summary window in hours")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Benchmark scheduling N synthetic uploads")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark)
+        return 0
+    if not os.path.exists(args.ledger):
+        print(f"❌ No usage ledger at {args.ledger}")
+        return 1
+    models = summarize(args.ledger, args.hours)
+    print(f"💰 Usage over the last {args.hours:g}h ({args.ledger})")
+    for model, entry in sorted(models.items()):
+        print(f"  {model}: {entry['calls']} calls ({entry['errors']} failed, {entry['discarded']} losing hedges), "
+              f"{entry['prompt_tokens']} prompt / {entry['completion_tokens']} completion / "
+              f"{entry['image_tokens']} image / {entry['cached_tokens']} cached tokens, "
+              f"p50 {entry['p50_seconds']}s, p95 {entry['p95_seconds']}s")
+    if not models:
+        print("  No calls in this window")
+    print(f"  Budget: {TokenBudget(UsageLedger(args.ledger)).report()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from bisect import bisect_left, insort
+from pathlib import Path
+from geo_index import extract_coordinates
+
+INDEX_LOG_NAME = "work_items.jsonl"
+
+# Fields copied from each result into the index
+ENTRY_FIELDS = ["id", "priority_score", "severity_score", "severity_label", "category",
+                "issue_summary", "processed_at", "lat", "lon"]
+
+
+class WorkItemIndex:
+    """
+    In-memory priority index over processed work items
+
+    Every item is kept in sorted lists (highest priority first) for all items,
+    per category, per severity_label and per (category, severity_label) pair,
+    so a top-K query is a slice of the most specific list instead of a scan of
+    every result file. Changes are appended to a JSONL log next to the results,
+    which is replayed on load.
+
+    Work item status is not tracked yet: analyzer results do not carry it (it
+    lives on the work item in Firebase), so there is no status filter.
+    """
+
+    def __init__(self, log_path=None):
+        """
+        Initialize an empty index
+
+        Args:
+            log_path: Optional JSONL file that upserts/removals are appended to
+        """
+        self.log_path = log_path
+        self._entries = {}
+        self._buckets = {}
+        self._log_lines = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item_id):
+        return item_id in self._entries
+
+    @staticmethod
+    def _sort_key(entry):
+        return (-entry["priority_score"], -entry["severity_score"], entry["id"])
+
+    @staticmethod
+    def _bucket_names(entry):
+        category, label = entry["category"], entry["severity_label"]
+        return [None, ("category", category), ("label", label), ("category_label", category, label)]
+
+    @staticmethod
+    def entry_from_result(result):
+        """
+        Build an index entry from an analyzer result
+
+        Args:
+            result: Result dictionary as written by GrokAnalyzer.save_result
+
+        Returns:
+            Entry dictionary, or None if the result has no scores (e.g. an error)
+        """
+        response = result.get("grok_response") if isinstance(result, dict) else None
+        if not isinstance(response, dict) or not isinstance(response.get("scores"), dict):
+            return None
+        scores = response["scores"]
+        point = extract_coordinates(result) or (None, None)
+        return {
+            "id": result.get("id", "unknown"),
+            "priority_score": scores.get("priority_score") or 0,
+            "severity_score": scores.get("severity_score") or 0,
+            "severity_label": scores.get("severity_label") or "low",
+            "category": response.get("category") or "other",
+            "issue_summary": response.get("issue_summary") or "",
+            "processed_at": result.get("processed_at"),
+            "lat": point[0],
+            "lon": point[1],
+        }
+
+    def get(self, item_id):
+        """Return the indexed entry for an item ID, or None"""
+        return self._entries.get(item_id)
+
+    def entries(self):
+        """Iterate over all indexed entries in no particular order"""
+        return iter(list(self._entries.values()))
+
+    def upsert(self, entry, log=True):
+        """
+        Insert or replace an entry, keeping every bucket sorted
+
+        Args:
+            entry: Entry dictionary (see ENTRY_FIELDS)
+            log: Append the change to the index log
+        """
+        entry = {field: entry.get(field) for field in ENTRY_FIELDS}
+        if entry["id"] in self._entries:
+            self._unlink(self._entries[entry["id"]])
+        self._entries[entry["id"]] = entry
+        key = self._sort_key(entry)
+        for name in self._bucket_names(entry):
+            insort(self._buckets.setdefault(name, []), key)
+        if log:
+            self._append_log({"op": "upsert", **entry})
+
+    def upsert_result(self, result):
+        """
+        Index an analyzer result (results without scores are ignored)
+
+        Returns:
+            True if the result was indexed
+        """
+        entry = self.entry_from_result(result)
+        if entry is None:
+            return False
+        self.upsert(entry)
+        return True
+
+    def remove(self, item_id, log=True):
+        """Remove an item from the index. Returns True if it was present."""
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return False
+        self._unlink(entry)
+        if log:
+            self._append_log({"op": "remove", "id": item_id})
+        return True
+
+    def _unlink(self, entry):
+        key = self._sort_key(entry)
+        for name in self._bucket_names(entry):
+            bucket = self._buckets.get(name)
+            pos = bisect_left(bucket, key)
+            if pos < len(bucket) and bucket[pos] == key:
+                del bucket[pos]
+            if not bucket:
+                del self._buckets[name]
+
+    def top_k(self, k=50, category=None, severity_label=None):
+        """
+        Return the K highest-priority items matching the filters
+
+        Args:
+            k: Maximum number of items to return
+            category: Optional category filter
+            severity_label: Optional severity label filter
+
+        Returns:
+            List of entry dictionaries ordered by priority_score, then severity_score
+        """
+        if category and severity_label:
+            name = ("category_label", category, severity_label)
+        elif category:
+            name = ("category", category)
+        elif severity_label:
+            name = ("label", severity_label)
+        else:
+            name = None
+
+        return [self._entries[key[2]] for key in self._buckets.get(name, [])[:k]]
+
+    def counts(self):
+        """Return item counts per category and per severity label"""
+        return {
+            "total": len(self._entries),
+            "category": {name[1]: len(b) for name, b in self._buckets.items() if name and name[0] == "category"},
+            "severity_label": {name[1]: len(b) for name, b in self._buckets.items() if name and name[0] == "label"},
+        }
+
+    def bulk_load(self, entries):
+        """Replace the index contents, sorting each bucket once instead of per insert"""
+        self._entries = {entry["id"]: {f: entry.get(f) for f in ENTRY_FIELDS} for entry in entries}
+        self._buckets = {}
+        for entry in self._entries.values():
+            key = self._sort_key(entry)
+            for name in self._bucket_names(entry):
+                self._buckets.setdefault(name, []).append(key)
+        for bucket in self._buckets.values():
+            bucket.sort()
+
+    def _append_log(self, record):
+        if not self.log_path:
+            return
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        self._log_lines += 1
+
+    def compact(self):
+        """Rewrite the log so it holds exactly one line per indexed item"""
+        if not self.log_path:
+            return
+        tmp_path = f"{self.log_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps({"op": "upsert", **entry}) + "\n")
+        os.replace(tmp_path, self.log_path)
+        self._log_lines = len(self._entries)
+
+    @classmethod
+    def load(cls, output_dir="outputs", rebuild=False):
+        """
+        Load the index for a results directory
+
+        Replays the index log if present, otherwise (or with rebuild=True)
+        scans every result file once and writes a fresh log.
+
+        Args:
+            output_dir: Directory containing {id}.json result files
+            rebuild: Ignore the log and rebuild from the result files
+
+        Returns:
+            WorkItemIndex instance
+        """
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        index = cls(os.path.join(output_dir, INDEX_LOG_NAME))
+
+        if os.path.exists(index.log_path) and not rebuild:
+            entries = {}
+            with open(index.log_path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    index._log_lines += 1
+                    if record.pop("op") == "remove":
+                        entries.pop(record["id"], None)
+                    else:
+                        entries[record["id"]] = record
+            index.bulk_load(entries.values())
+            if index._log_lines > 2 * max(len(index), 1000):
+                index.compact()
+            return index
+
+        entries = []
+        for path in Path(output_dir).glob("*.json"):
+            try:
+                with open(path, 'r') as f:
+                    entry = cls.entry_from_result(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+            if entry is not None:
+                entries.append(entry)
+        index.bulk_load(entries)
+        index.compact()
+        return index
+
+
+def _benchmark(n_items, n_queries=1000):
+    """Measure load, incremental update and top-K query latency on synthetic items"""
+    categories = ["pothole", "streetlight_out", "flooding", "illegal_dumping", "graffiti", "tree_hazard", "other"]
+    labels = ["low", "minor", "moderate", "high", "critical"]
+    entries = [{
+        "id": f"item{i:07d}",
+        "priority_score": random.randint(0, 100),
+        "severity_score": random.randint(0, 100),
+        "severity_label": random.choice(labels),
+        "category": random.choice(categories),
+    } for i in range(n_items)]
+
+    index = WorkItemIndex()
+    started = time.perf_counter()
+    index.bulk_load(entries)
+    print(f"⏱️  Bulk load of {n_items} items: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    for i in range(n_queries):
+        index.upsert({**random.choice(entries), "priority_score": random.randint(0, 100)}, log=False)
+    print(f"⏱️  Incremental upsert: {(time.perf_counter() - started) * 1e6 / n_queries:.1f} µs/op")
+
+    for desc, kwargs in [
+        ("top 50 overall", {}),
+        ("top 50 in category", {"category": "pothole"}),
+        ("top 50 category+label", {"category": "flooding", "severity_label": "high"}),
+    ]:
+        started = time.perf_counter()
+        for _ in range(n_queries):
+            index.top_k(50, **kwargs)
+        print(f"⏱️  {desc}: {(time.perf_counter() - started) * 1000 / n_queries:.3f} ms/query")
+
+
+def main():
+    """Command-line entry point for top-K queries"""
+    parser = argparse.ArgumentParser(description="Query the highest-priority processed work items")
+    parser.add_argument("--output-dir", default="outputs", help="Directory containing result files")
+    parser.add_argument("--top", type=int, default=50, help="Number of items to return")
+    parser.add_argument("--category", help="Only items in this category")
+    parser.add_argument("--label", help="Only items with this severity label")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from result files")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Benchmark on N synthetic items and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.benchmark)
+        return 0
+
+    started = time.perf_counter()
+    index = WorkItemIndex.load(args.output_dir, rebuild=args.rebuild)
+    loaded = time.perf_counter()
+    items = index.top_k(args.top, category=args.category, severity_label=args.label)
+    queried = time.perf_counter()
+
+    if args.json:
+        print(json.dumps(items, indent=2))
+        return 0
+
+    print(f"📋 Top {len(items)} of {len(index)} indexed items "
+          f"(load {(loaded - started) * 1000:.1f} ms, query {(queried - loaded) * 1000:.2f} ms)")
+    for rank, item in enumerate(items, 1):
+        print(f"{rank:>4}. [{item['priority_score']:>3}] {item['severity_label']:<9} {item['category']:<16} "
+              f"{item['id']}  {item['issue_summary'] or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import os
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+CLOUD_FUNCTION_URL = "https://adduserupload-xglsok67aq-uc.a.run.app"
+
+# Push endpoint of the Grok Analyzer ingest service (Claude-Anaylzer/ingest_server.py).
+# When unset, the analyzer is launched as a local subprocess after each call.
+ANALYZER_INGEST_URL = os.environ.get("ANALYZER_INGEST_URL", "")
+ANALYZER_INGEST_TOKEN = os.environ.get("ANALYZER_INGEST_TOKEN", "")
+
+ANALYZER_PATH = Path(__file__).parent.parent / "Claude-Anaylzer" / "process_uploads.py"
+
+# Time allowed on SIGTERM/SIGINT to flush open calls before the process exits
+DRAIN_DEADLINE_SECONDS = float(os.environ.get("DRAIN_DEADLINE_SECONDS", "20"))
+
+ALLOWED_ORIGINS = [
+    "http://localhost:5173",
+    "http://localhost:5174",
+    "https://localhost:5173",
+    "https://localhost:5174",
+    "https://nnicholas-c.github.io",
+]
+
+AGENT_GREETING = "Hey there! This is the AI service agent. What problem or issue can I help report for you today?"
+
+_PROMPT_PATH = Path(__file__).parent / 'agent_prompt.txt'
+_agent_prompt = None
+
+
+def load_agent_prompt():
+    """Read agent_prompt.txt once and cache it (avoid disk read on every connection)"""
+    global _agent_prompt
+    if _agent_prompt is None:
+        with open(_PROMPT_PATH, 'r') as f:
+            _agent_prompt = f.read()
+    return _agent_prompt
+
+
+_deepgram_client = None
+_deepgram_lock = threading.Lock()
+
+
+def get_deepgram_client():
+    """Build the Deepgram client on first use (the SDK import alone takes a few hundred ms)"""
+    global _deepgram_client
+    if _deepgram_client is None:
+        with _deepgram_lock:
+            if _deepgram_client is None:
+                from deepgram import DeepgramClient, DeepgramClientOptions
+
+                # No local audio — we relay via WebSocket
+                config = DeepgramClientOptions(
+                    options={
+                        "keepalive": "true",
+                    }
+                )
+                _deepgram_client = DeepgramClient(os.getenv("DEEPGRAM_API_KEY", ""), config)
+    return _deepgram_client
+
+
+def build_agent_settings(prompt=None, functions=None):
+    """Build the Deepgram agent SettingsOptions used for every call
+
+    Args:
+        prompt: Agent prompt (defaults to agent_prompt.txt)
+        functions: Client-side function definitions (name, description, JSON schema parameters)
+    """
+    from deepgram import SettingsOptions, Input, Output
+
+    options = SettingsOptions()
+
+    # Configure audio input settings
+    options.audio.input = Input(
+        encoding="linear16",
+        sample_rate=16000  # Match the output sample rate
+    )
+
+    # Configure audio output settings
+    options.audio.output = Output(
+        encoding="linear16",
+        sample_rate=16000,
+        container="none"
+    )
+
+    # LLM provider configuration
+    options.agent.think.provider.type = "google"
+    options.agent.think.provider.model = "gemini-2.5-flash"
+
+    # Use pre-loaded prompt (cached at startup)
+    options.agent.think.prompt = prompt if prompt is not None else load_agent_prompt()
+
+    # Functions answered by this server; plain dicts because the SDK's Function
+    # dataclass requires a url/method, which only applies to server-side functions
+    if functions:
+        options.agent.think.functions = functions
+
+    # Deepgram STT configuration (nova-2 for faster init)
+    options.agent.listen.provider.model = "nova-2"
+    options.agent.listen.provider.type = "deepgram"
+    options.agent.listen.provider.endpointing = 300
+    options.agent.listen.provider.interim_results = True
+    options.agent.listen.provider.keyterms = ["hello", "goodbye"]
+
+    # Deepgram TTS configuration (aura-helios for faster init)
+    options.agent.speak.provider.type = "deepgram"
+    options.agent.speak.provider.model = "aura-helios-en"
+
+    # Sets Agent greeting
+    options.agent.greeting = AGENT_GREETING
+    return options
+
+
+def upload_id_from_data(data):
+    """Pull the new upload document ID out of a Cloud Function JSON response"""
+    if isinstance(data, dict):
+        for key in ("id", "uploadId", "upload_id", "documentId", "docId"):
+            if data.get(key):
+                return data[key]
+    return None
+
+
+def analyzer_ingest_request(upload_id):
+    """Body and headers for pushing an upload to the analyzer ingest endpoint"""
+    # Only the ID is sent: the analyzer re-fetches the upload from Firebase. Without an
+    # ID it cannot find the upload, so an empty body asks it to reconcile instead.
+    body = {"id": upload_id} if upload_id else {}
+    headers = {"Authorization": f"Bearer {ANALYZER_INGEST_TOKEN}"} if ANALYZER_INGEST_TOKEN else {}
+    return body, headers
+
+
+def event_data(event):
+    """JSON-friendly dict of a Deepgram event object"""
+    return getattr(event, '__dict__', None) or {'value': str(event)}
+
+
+def audio_payload(event):
+    """Extract PCM audio from the various Deepgram event shapes as a list of byte values"""
+    if isinstance(event, (bytes, bytearray)):
+        return list(event)
+    if isinstance(event, list):
+        return event
+    for source in (event, getattr(event, 'data', None)):
+        if isinstance(source, dict):
+            audio = source.get('audio')
+        else:
+            audio = getattr(source, 'audio', None)
+        if audio:
+            return list(audio) if isinstance(audio, (bytes, bytearray)) else audio
+    data = getattr(event, 'data', None)
+    if isinstance(data, (bytes, bytearray)) and data:
+        return list(data)
+    return None
@@ -0,0 +1,382 @@
+import os
+import re
+import json
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+GET_ALL_WORK_URL = "https://getallworkitems-xglsok67aq-uc.a.run.app"
+GET_USER_UPLOAD_URL = "https://getuserupload-xglsok67aq-uc.a.run.app"
+
+# The caller hears dead air while a tool runs, so every call is bounded
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("TOOL_TIMEOUT_SECONDS", "2.5"))
+TOOL_WORKERS = int(os.environ.get("TOOL_WORKERS", "4"))
+TOOL_CACHE_TTL_SECONDS = float(os.environ.get("TOOL_CACHE_TTL_SECONDS", "60"))
+# Work item list shared by all tools; refreshed at most this often
+WORK_ITEMS_TTL_SECONDS = float(os.environ.get("WORK_ITEMS_TTL_SECONDS", "30"))
+NEARBY_RADIUS_M = float(os.environ.get("NEARBY_RADIUS_M", "250"))
+MAX_NEARBY_RESULTS = 5
+
+# How each work item status is read out to the caller
+STATUS_DESCRIPTIONS = {
+    "identified": "reported and waiting for review",
+    "pending_gov_approval": "waiting for city approval",
+    "gov_approved": "approved and waiting for a crew",
+    "gov_denied": "reviewed and not approved for repair",
+    "fixing": "being fixed now",
+    "self_report_completed": "marked fixed by the crew, pending final check",
+    "completed": "fixed and closed",
+}
+# Reports in these states are not offered as "already reported"
+CLOSED_STATUSES = {"completed", "gov_denied"}
+
+_STOPWORDS = {"the", "and", "near", "street", "st", "ave", "avenue", "road", "rd", "at", "on", "by", "of", "in"}
+
+
+class TTLCache:
+    """Small thread-safe cache whose entries expire after a fixed time"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (hit, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False, None
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                # Dicts keep insertion order: drop the oldest entry
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+
+class ToolStats:
+    """Per-tool call counts and latency (including cache hits, which is what the caller hears)"""
+
+    def __init__(self, window=500):
+        self._window = window
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, outcome):
+        """
+        Record one tool call
+
+        Args:
+            name: Tool name
+            seconds: Wall time from request to output
+            outcome: 'ok', 'cache_hit', 'timeout' or 'error'
+        """
+        with self._lock:
+            tool = self._tools.setdefault(name, {"calls": 0, "ok": 0, "cache_hit": 0, "timeout": 0, "error": 0,
+                                                 "latencies": deque(maxlen=self._window)})
+            tool["calls"] += 1
+            tool[outcome] += 1
+            tool["latencies"].append(seconds)
+
+    def report(self):
+        with self._lock:
+            report = {}
+            for name, tool in self._tools.items():
+                latencies = sorted(tool["latencies"])
+                pct = lambda p: round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 1)
+                report[name] = {
+                    **{k: v for k, v in tool.items() if k != "latencies"},
+                    "latency_ms": {"p50": pct(50), "p95": pct(95), "max": pct(100)},
+                }
+            return report
+
+
+class ToolRegistry:
+    """
+    Function tools the voice agent can call mid-conversation
+
+    Tools run on a shared thread pool so a slow lookup never blocks the
+    Deepgram event handlers, each call is cut off at its timeout, and
+    results are cached per (tool, arguments) for the TTL.
+    """
+
+    def __init__(self, workers=TOOL_WORKERS, timeout=TOOL_TIMEOUT_SECONDS, cache_ttl=TOOL_CACHE_TTL_SECONDS):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache = TTLCache()
+        self.stats = ToolStats()
+        self._tools = {}
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def register(self, name, description, parameters, timeout=None, cache_ttl=None):
+        """
+        Decorator that registers a function as an agent tool
+
+        Args:
+            name: Function name the model calls
+            description: When the model should call it
+            parameters: JSON schema of the arguments
+            timeout: Per-call timeout (defaults to the registry timeout)
+            cache_ttl: Result cache TTL in seconds (0 disables caching)
+        """
+        def decorator(fn):
+            self._tools[name] = {
+                "fn": fn,
+                "definition": {"name": name, "description": description, "parameters": parameters},
+                "timeout": timeout or self.timeout,
+                "cache_ttl": self.cache_ttl if cache_ttl is None else cache_ttl,
+            }
+            return fn
+        return decorator
+
+    def definitions(self):
+        """Function definitions for options.agent.think.functions"""
+        return [tool["definition"] for tool in self._tools.values()]
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent-tool")
+        return self._pool
+
+    @staticmethod
+    def _cache_key(name, args):
+        normalized = {k: v.strip().lower() if isinstance(v, str) else v for k, v in args.items()}
+        return f"{name}:{json.dumps(normalized, sort_keys=True)}"
+
+    def _prepare(self, name, arguments):
+        """Return (immediate output or None, tool, args, cache key)"""
+        tool = self._tools.get(name)
+        if tool is None:
+            return json.dumps({"error": f"{name} is not available"}), None, None, None
+        try:
+            args = json.loads(arguments) if isinstance(arguments, str) and arguments.strip() else (arguments or {})
+        except json.JSONDecodeError:
+            return json.dumps({"error": "arguments were not valid JSON"}), None, None, None
+        if not isinstance(args, dict):
+            return json.dumps({"error": "arguments must be an object"}), None, None, None
+        # Drop anything the model made up that is not in the schema
+        allowed = tool["definition"]["parameters"].get("properties", {})
+        args = {k: v for k, v in args.items() if k in allowed and v is not None}
+        key = self._cache_key(name, args)
+        if tool["cache_ttl"]:
+            hit, value = self.cache.get(key)
+            if hit:
+                return value, tool, args, key
+        return None, tool, args, key
+
+    def _finish(self, name, tool, key, started, result=None, error=None, timed_out=False):
+        elapsed = time.perf_counter() - started
+        if timed_out:
+            self.stats.record(name, elapsed, "timeout")
+            print(f"⏱️  Tool {name} timed out after {elapsed * 1000:.0f} ms")
+            return json.dumps({"error": "the lookup took too long, please try again later"})
+        if error is not None:
+            self.stats.record(name, elapsed, "error")
+            print(f"❌ Tool {name} failed after {elapsed * 1000:.0f} ms: {error}")
+            return json.dumps({"error": "the lookup failed"})
+        output = json.dumps(result)
+        if tool["cache_ttl"]:
+            self.cache.set(key, output, tool["cache_ttl"])
+        self.stats.record(name, elapsed, "ok")
+        print(f"🔧 Tool {name}: {elapsed * 1000:.0f} ms")
+        return output
+
+    def call(self, name, arguments):
+        """
+        Run a tool and return its JSON output (blocking; for the sync server)
+
+        Args:
+            name: Tool name from the FunctionCallRequest
+            arguments: JSON string (or dict) of arguments
+
+        Returns:
+            JSON string for FunctionCallResponse.output
+        """
+        started = time.perf_counter()
+        output, tool, args, key = self._prepare(name, arguments)
+        if output is not None:
+            if tool is not None:
+                self.stats.record(name, time.perf_counter() - started, "cache_hit")
+            return output
+        future = self._executor().submit(tool["fn"], **args)
+        try:
+            return self._finish(name, tool, key, started, result=future.result(timeout=tool["timeout"]))
+        except FutureTimeoutError:
+            future.cancel()
+            return self._finish(name, tool, key, started, timed_out=True)
+        except Exception as e:
+            return self._finish(name, tool, key, started, error=e)
+
+    async def call_async(self, name, arguments):
+        """Same as call(), awaiting the worker without blocking the event loop"""
+        started = time.perf_counter()
+        output, tool, args, key = self._prepare(name, arguments)
+        if output is not None:
+            if tool is not None:
+                self.stats.record(name, time.perf_counter() - started, "cache_hit")
+            return output
+        future = self._executor().submit(tool["fn"], **args)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), tool["timeout"])
+            return self._finish(name, tool, key, started, result=result)
+        except asyncio.TimeoutError:
+            return self._finish(name, tool, key, started, timed_out=True)
+        except Exception as e:
+            return self._finish(name, tool, key, started, error=e)
+
+
+registry = ToolRegistry()
+
+
+def _get_json(url, params=None):
+    # Deferred: tools only run once a call is live
+    from transcript_manager import upload_session
+
+    # Leave a little of the tool budget for serializing the answer
+    response = upload_session().get(url, params=params, timeout=max(0.5, TOOL_TIMEOUT_SECONDS - 0.3))
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+def work_items():
+    """All work items, cached for WORK_ITEMS_TTL_SECONDS and shared by every tool"""
+    hit, items = registry.cache.get("__work_items__")
+    if hit:
+        return items
+    data = _get_json(GET_ALL_WORK_URL) or {}
+    items = data.get("workItems", []) if isinstance(data, dict) else data
+    registry.cache.set("__work_items__", items, WORK_ITEMS_TTL_SECONDS)
+    return items
+
+
+def prefetch():
+    """Load the work item list ahead of the first tool call (best effort)"""
+    try:
+        items = work_items()
+        print(f"🔧 Agent tools ready ({len(items)} work items cached)")
+    except Exception as e:
+        print(f"⚠️ Work item prefetch failed, first lookup will fetch: {e}")
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371000 * 2 * math.asin(math.sqrt(a))
+
+
+def _words(text):
+    return {w for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(w) > 1 and w not in _STOPWORDS}
+
+
+def _priority(item):
+    return (item.get("scores") or {}).get("priority_score") or 0
+
+
+def _upload_documents(data):
+    """Documents in a GET_USER_UPLOAD_URL response (a bare document, a wrapped one, or a list)"""
+    if isinstance(data, dict) and isinstance(data.get("documents"), list):
+        return data["documents"]
+    if isinstance(data, dict) and isinstance(data.get("document"), dict):
+        return [data["document"]]
+    if isinstance(data, list):
+        return data
+    return [data] if isinstance(data, dict) else []
+
+
+def _summary(item, distance=None):
+    status = item.get("status")
+    summary = {
+        "report_id": item.get("case_id") or item.get("id"),
+        "summary": item.get("issue_summary"),
+        "category": item.get("category"),
+        "location": (item.get("location") or {}).get("free_text"),
+        "status": status,
+        "status_description": STATUS_DESCRIPTIONS.get(status, status),
+    }
+    if distance is not None:
+        summary["distance_m"] = round(distance)
+    return summary
+
+
+@registry.register(
+    "find_nearby_reports",
+    "Find existing reports near a location, so you can tell the caller if their issue is already reported. "
+    "Call it once you know the location, before filing a new report.",
+    {
+        "type": "object",
+        "properties": {
+            "location": {"type": "string", "description": "Street address, intersection or landmark"},
+            "lat": {"type": "number", "description": "Latitude, if the caller shared GPS"},
+            "lon": {"type": "number", "description": "Longitude, if the caller shared GPS"},
+            "category": {"type": "string", "description": "Issue category, e.g. pothole"},
+        },
+        "required": ["location"],
+    },
+)
+def find_nearby_reports(location, lat=None, lon=None, category=None, radius_m=NEARBY_RADIUS_M):
+    """Open reports within radius_m of a point, or whose location text matches the address"""
+    matches = []
+    wanted = _words(location)
+    for item in work_items():
+        if item.get("status") in CLOSED_STATUSES:
+            continue
+        if category and (item.get("category") or "").lower() != category.strip().lower():
+            continue
+        point = (item.get("location") or {}).get("coordinates") or {}
+        if lat is not None and lon is not None and point.get("lat") is not None and point.get("lon") is not None:
+            distance = _distance_m(lat, lon, point["lat"], point["lon"])
+            if distance <= radius_m:
+                matches.append((distance, -_priority(item), item))
+            continue
+        # No coordinates on one side: fall back to how much of the spoken address matches
+        found = _words((item.get("location") or {}).get("free_text"))
+        if wanted and found and len(wanted & found) / len(wanted) >= 0.5:
+            matches.append((None, -_priority(item), item))
+
+    matches.sort(key=lambda m: (m[0] is None, m[0] or 0, m[1]))
+    reports = [_summary(item, distance) for distance, _, item in matches[:MAX_NEARBY_RESULTS]]
+    return {"count": len(matches), "reports": reports}
+
+
+@registry.register(
+    "check_report_status",
+    "Look up the current status of a report by the report or ticket number the caller gives.",
+    {
+        "type": "object",
+        "properties": {
+            "report_id": {"type": "string", "description": "Report, ticket or case number"},
+        },
+        "required": ["report_id"],
+    },
+)
+def check_report_status(report_id):
+    """Status of a work item by case ID or ID, falling back to uploads not yet analyzed"""
+    report_id = report_id.strip()
+    for item in work_items():
+        # sourceRef is "user_uploads/<upload id>", so the upload ID also finds its work item
+        source_ref = item.get("sourceRef") or ""
+        if report_id in (item.get("case_id"), item.get("id"), source_ref, source_ref.rsplit("/", 1)[-1]):
+            return {"found": True, **_summary(item), "updated_at": item.get("updatedAt")}
+    # The endpoint may ignore upload_id and return every upload: only an exact ID match counts
+    data = _get_json(GET_USER_UPLOAD_URL, params={"upload_id": report_id})
+    if any(isinstance(doc, dict) and doc.get("id") == report_id for doc in _upload_documents(data)):
+        return {"found": True, "report_id": report_id, "status": "received",
+                "status_description": "received and still being reviewed"}
+    return {"found": False, "report_id": report_id}
@@ -1,39 +1,31 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO
-from deepgram import (
-    DeepgramClient,
-    DeepgramClientOptions,
-    AgentWebSocketEvents,
-    SettingsOptions,
-    FunctionCallRequest,
-    FunctionCallResponse,
-    Input,
-    Output,
-)
 import os
 import signal
 import sys
 import subprocess
 import threading
-from datetime import datetime, date, timedelta
-from pathlib import Path
+import time
 from dotenv import load_dotenv
-import requests
+from agent_config import (
+    ALLOWED_ORIGINS,
+    ANALYZER_INGEST_URL,
+    ANALYZER_PATH,
+    DRAIN_DEADLINE_SECONDS,
+    build_agent_settings,
+    get_deepgram_client,
+    load_agent_prompt,
+)
+from readiness import Readiness
+from agent_tools import registry as tools, prefetch as prefetch_tools
+from audio_relay import AudioRelay, RelayStats
+from rate_limiter import RateLimiter, DAILY_CALL_LIMIT, rate_limit_message
+from transcript_manager import TranscriptManager, upload_session
 
 # Load environment variables from .env file
 load_dotenv()
 
-CLOUD_FUNCTION_URL = "https://adduserupload-xglsok67aq-uc.a.run.app"
-
-ALLOWED_ORIGINS = [
-    "http://localhost:5173",
-    "http://localhost:5174",
-    "https://localhost:5173",
-    "https://localhost:5174",
-    "https://nnicholas-c.github.io",
-]
-
 app = Flask(__name__)
 # Enable CORS for React frontend
 CORS(app, resources={
@@ -49,90 +41,16 @@ socketio = SocketIO(app,
                     ping_timeout=10,
                     ping_interval=5)
 
-# Transcript management
-class TranscriptManager:
-    def __init__(self):
-        self.transcript_lines = []
-        self.current_session_id = None
-        self.picture_data = None
-    
-    def start_session(self):
-        """Start a new transcript session"""
-        self.current_session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.transcript_lines = []
-        self.picture_data = None
-        self.transcript_lines.append(f"=== Conversation Transcript ===")
-        self.transcript_lines.append(f"Session Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        self.transcript_lines.append("")
-        return self.current_session_id
-    
-    def add_user_message(self, message):
-        """Add user message to transcript"""
-        if message.strip():
-            self.transcript_lines.append(f"[User] {message}")
-    
-    def add_agent_message(self, message):
-        """Add agent message to transcript"""
-        if message.strip():
-            self.transcript_lines.append(f"[Agent] {message}")
-    
-    def add_thinking(self, thinking_text):
-        """Add agent thinking to transcript"""
-        if thinking_text.strip():
-            self.transcript_lines.append(f"[Agent Thinking] {thinking_text}")
-    
-    def save_transcript(self):
-        """Save transcript to file"""
-        if not self.current_session_id:
-            return None
-        
-        filename = f"transcripts/transcript_{self.current_session_id}.txt"
-        os.makedirs("transcripts", exist_ok=True)
-        
-        self.transcript_lines.append("")
-        self.transcript_lines.append(f"Session Ended: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        with open(filename, 'w') as f:
-            f.write('\n'.join(self.transcript_lines))
-
-        self.send_transcript_to_cloud()
-
-        return filename
-    
-    def get_transcript_text(self):
-        """Get current transcript as string"""
-        return '\n'.join(self.transcript_lines)
-
-    def set_picture(self, picture_base64: str | None):
-        """Store the uploaded picture data for later upload"""
-        self.picture_data = picture_base64
-
-    def send_transcript_to_cloud(self):
-        """Send the current transcript to the Cloud Function"""
-        if not self.transcript_lines:
-            return None
-
-        payload = {
-            "transcript": self.get_transcript_text(),
-            "picture": self.picture_data or ""
-        }
-
-        try:
-            response = requests.post(CLOUD_FUNCTION_URL, json=payload, timeout=10)
-            response.raise_for_status()
-            print(f"Transcript uploaded successfully: {response.text}")
-            return response
-        except requests.RequestException as exc:
-            print(f"Failed to upload transcript: {exc}")
-            return None
-
 transcript_manager = TranscriptManager()
 
 # Function to trigger Grok Analyzer
 def trigger_grok_analyzer():
     """Trigger the Grok Analyzer to process the uploaded transcript"""
+    if ANALYZER_INGEST_URL:
+        # Uploads are pushed to the ingest service as they are created
+        return None
     try:
-        analyzer_path = Path(__file__).parent.parent / "Claude-Anaylzer" / "process_uploads.py"
+        analyzer_path = ANALYZER_PATH
         if analyzer_path.exists():
             print("\n" + "="*50)
             print("🤖 TRIGGERING GROK ANALYZER")
@@ -172,15 +90,31 @@ def trigger_grok_analyzer():
         traceback.print_exc()
         return None
 
+draining = False  # Set on shutdown; new calls are refused from then on
+
 # Signal handler to save transcript on exit
 def signal_handler(sig, frame):
-    """Handle SIGINT (Ctrl+C) and SIGTERM to save transcript before exit"""
-    print("\n\n=== Saving transcript before shutdown ===")
-    transcript_file = transcript_manager.save_transcript()
-    if transcript_file:
-        print(f"✓ Transcript saved to {transcript_file}")
-        # Trigger Grok Analyzer
-        trigger_grok_analyzer()
+    """Handle SIGINT (Ctrl+C) and SIGTERM: flush the open call within DRAIN_DEADLINE_SECONDS"""
+    global draining
+    if draining:
+        # Second signal: stop waiting for the drain
+        sys.exit(1)
+    draining = True
+    print(f"\n\n=== Draining before shutdown (deadline {DRAIN_DEADLINE_SECONDS:.0f}s) ===")
+    started = time.monotonic()
+
+    # Upload the transcript and close Deepgram in parallel
+    workers = [threading.Thread(target=save_and_process_transcript, name="transcript upload", daemon=True)]
+    if dg_connection is not None:
+        workers.append(threading.Thread(target=close_deepgram, name="Deepgram close", daemon=True))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(max(0.0, DRAIN_DEADLINE_SECONDS - (time.monotonic() - started)))
+
+    unfinished = [worker.name for worker in workers if worker.is_alive()]
+    print(f"✓ Drain finished in {time.monotonic() - started:.1f}s"
+          + (f", cut off at the deadline: {', '.join(unfinished)}" if unfinished else ""))
     print("Shutting down gracefully...")
     sys.exit(0)
 
@@ -188,60 +122,23 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)   # Ctrl+C
 signal.signal(signal.SIGTERM, signal_handler)  # Termination signal
 
-# Initialize Deepgram client (no local audio — we relay via WebSocket)
-config = DeepgramClientOptions(
-    options={
-        "keepalive": "true",
-    }
-)
-deepgram = DeepgramClient(os.getenv("DEEPGRAM_API_KEY", ""), config)
+# Deepgram client, agent prompt and upload session are built lazily: a warm-up
+# thread loads them right after startup, and /ready reports when they are done
 dg_connection = None  # Will be created per connection
+audio_relay = None    # Silence gate + stats for the caller's microphone, per connection
+audio_totals = RelayStats()
+readiness = Readiness(["deepgram_client", "agent_prompt", "upload_client"])
 
-# Pre-load agent prompt at startup (avoid disk read on every connection)
-_prompt_path = Path(__file__).parent / 'agent_prompt.txt'
-with open(_prompt_path, 'r') as _f:
-    AGENT_PROMPT = _f.read()
-print(f"✅ Agent prompt loaded ({len(AGENT_PROMPT)} chars)")
+def warm_up():
+    """Build the lazily-initialized dependencies in the background"""
+    readiness.warm("agent_prompt", load_agent_prompt)
+    readiness.warm("deepgram_client", get_deepgram_client)
+    readiness.warm("upload_client", upload_session)
+    prefetch_tools()
+
+threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
 
-# --- Rate Limiter ---
-class RateLimiter:
-    """Simple daily call counter to control Deepgram API costs."""
-    
-    def __init__(self, daily_limit: int = 15):
-        self.daily_limit = daily_limit
-        self._today = date.today()
-        self._count = 0
-        self._lock = threading.Lock()
-    
-    def _reset_if_new_day(self):
-        today = date.today()
-        if today != self._today:
-            self._today = today
-            self._count = 0
-    
-    def try_acquire(self) -> bool:
-        """Try to use a call slot. Returns True if allowed."""
-        with self._lock:
-            self._reset_if_new_day()
-            if self._count >= self.daily_limit:
-                return False
-            self._count += 1
-            print(f"📞 Call {self._count}/{self.daily_limit} today")
-            return True
-    
-    def status(self) -> dict:
-        with self._lock:
-            self._reset_if_new_day()
-            return {
-                "used": self._count,
-                "limit": self.daily_limit,
-                "remaining": max(0, self.daily_limit - self._count),
-                "reset_date": str(self._today + timedelta(days=1)),
-            }
-
-
-DAILY_CALL_LIMIT = int(os.environ.get("DAILY_CALL_LIMIT", "5"))
 rate_limiter = RateLimiter(daily_limit=DAILY_CALL_LIMIT)
 print(f"📞 Rate limiter: {DAILY_CALL_LIMIT} calls/day")
 
@@ -251,8 +148,28 @@ def index():
 
 @app.route('/health')
 def health():
+    if draining:
+        return jsonify({"status": "draining"}), 503
     return jsonify({"status": "ok"}), 200
 
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the Deepgram client, prompt and upload client are warmed"""
+    report = readiness.report()
+    if draining:
+        report["status"] = "draining"
+    return jsonify(report), 200 if readiness.is_ready() and not draining else 503
+
+@app.route('/tool-stats')
+def get_tool_stats():
+    """Return per-tool call counts, cache hits, timeouts and latency"""
+    return jsonify(tools.stats.report()), 200
+
+@app.route('/audio-stats')
+def get_audio_stats():
+    """Return microphone relay stats (silence suppression, per-frame relay latency)"""
+    return jsonify(audio_totals.report()), 200
+
 @app.route('/rate-limit')
 def get_rate_limit():
     """Return current rate limit status"""
@@ -279,61 +196,36 @@ def upload_picture():
 
 @socketio.on('connect')
 def handle_connect():
-    global dg_connection
+    global dg_connection, audio_relay
     
+    if draining:
+        socketio.emit('server_draining', {'message': 'Server is restarting, please call again shortly.'})
+        return False
+
     # Check rate limit before spinning up Deepgram
     if not rate_limiter.try_acquire():
         status = rate_limiter.status()
         print(f"🚫 Rate limit reached ({status['used']}/{status['limit']})")
         socketio.emit('rate_limited', {
-            'message': f"Daily voice call limit reached ({status['limit']} calls/day). Resets tomorrow.",
+            'message': rate_limit_message(status),
             **status
         })
         return False  # reject the connection
     
     # Create a fresh Deepgram connection for this session
-    dg_connection = deepgram.agent.websocket.v("1")
+    from deepgram import AgentWebSocketEvents, FunctionCallResponse
+
+    dg_connection = get_deepgram_client().agent.websocket.v("1")
+    audio_relay = AudioRelay(totals=audio_totals)
     
     # Start a new transcript session
     session_id = transcript_manager.start_session()
     print(f"New session started: {session_id}")
     socketio.emit('session_started', {'session_id': session_id})
     
-    options = SettingsOptions()
-
-    # Configure audio input settings
-    options.audio.input = Input(
-        encoding="linear16",
-        sample_rate=16000  # Match the output sample rate
-    )
-
-    # Configure audio output settings
-    options.audio.output = Output(
-        encoding="linear16",
-        sample_rate=16000,
-        container="none"
-    )
-
-    # LLM provider configuration
-    options.agent.think.provider.type = "google"
-    options.agent.think.provider.model = "gemini-2.5-flash"
-    
-    # Use pre-loaded prompt (cached at startup)
-    options.agent.think.prompt = AGENT_PROMPT
-
-    # Deepgram STT configuration (nova-2 for faster init)
-    options.agent.listen.provider.model = "nova-2"
-    options.agent.listen.provider.type = "deepgram"
-    options.agent.listen.provider.endpointing = 300
-    options.agent.listen.provider.interim_results = True
-    options.agent.listen.provider.keyterms = ["hello", "goodbye"]
-    
-    # Deepgram TTS configuration (aura-helios for faster init)
-    options.agent.speak.provider.type = "deepgram"
-    options.agent.speak.provider.model = "aura-helios-en"
-
-    # Sets Agent greeting
-    options.agent.greeting = "Hey there! This is the AI service agent. What problem or issue can I help report for you today?"
+    options = build_agent_settings(load_agent_prompt(), tools.definitions())
+    readiness.used("deepgram_client")
+    readiness.used("agent_prompt")
 
     # Event handlers (self = Deepgram WebSocket client)
     def on_open(self, *args, **kwargs):
@@ -425,12 +317,19 @@ def handle_connect():
         function_call_request = kwargs.get('function_call_request') or (args[0] if args else None)
         if not function_call_request:
             return
-        response = FunctionCallResponse(
-            function_call_id=function_call_request.function_call_id,
-            output="Function response here"
-        )
-        dg_connection.send_function_call_response(response)
-        socketio.emit('function_call', {'data': function_call_request.__dict__})
+        connection = self
+
+        def answer():
+            output = tools.call(function_call_request.function_name, function_call_request.input)
+            response = FunctionCallResponse(
+                function_call_id=function_call_request.function_call_id,
+                output=output
+            )
+            connection.send(str(response))
+            socketio.emit('function_call', {'data': function_call_request.__dict__, 'output': output})
+
+        # Answer off the Deepgram listener thread so agent audio keeps flowing while the tool runs
+        threading.Thread(target=answer, daemon=True).start()
 
     def on_agent_started_speaking(self, *args, **kwargs):
         agent_started_speaking = kwargs.get('agent_started_speaking') or (args[0] if args else None)
@@ -551,7 +450,12 @@ def handle_connect():
 
 
 def save_and_process_transcript():
-    """Helper function to save transcript and trigger processing"""
+    """
+    Helper function to save transcript and trigger processing
+
+    Safe to call from end_call, disconnect and the shutdown drain: the
+    session is archived and uploaded by whichever call gets there first.
+    """
     try:
         transcript_file = transcript_manager.save_transcript()
         if transcript_file:
@@ -567,10 +471,13 @@ def save_and_process_transcript():
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    global dg_connection
-    
     print("Client disconnected, saving session")
     save_and_process_transcript()
+    close_deepgram()
+
+def close_deepgram():
+    """Close the current Deepgram connection, if any"""
+    global dg_connection
     
     if dg_connection is not None:
         try:
@@ -579,6 +486,18 @@ def handle_disconnect():
             print(f"Warning: Error closing Deepgram connection: {e}")
         dg_connection = None
 
+@socketio.on('user_audio')
+def handle_user_audio(data):
+    """Forward browser microphone audio (binary linear16 at 16 kHz) to the Deepgram agent"""
+    connection, relay = dg_connection, audio_relay
+    if connection is None or relay is None:
+        return
+    frame, keepalive, received = relay.plan(data)
+    if keepalive:
+        connection.send(keepalive)
+    if frame is not None:
+        relay.sent(frame, received, ok=connection.send(frame))
+
 @socketio.on('end_call')
 def handle_end_call():
     """Explicitly end call and save transcript"""
@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+"""
+Asyncio (ASGI) server mode for the voice agent
+
+Same Socket.IO events and HTTP routes as app.py, but every call runs on a
+single event loop: an async Socket.IO server, the async Deepgram agent
+client and httpx for uploads. There is no thread per call, and each
+Socket.IO connection gets its own CallSession, so concurrent callers no
+longer share one transcript and Deepgram connection.
+
+Usage:
+    python asgi_app.py                               # drains open calls on SIGTERM
+    uvicorn asgi_app:app --host 0.0.0.0 --port 3000
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+from importlib import import_module
+from urllib.parse import parse_qs
+import socketio
+from agent_config import (
+    ALLOWED_ORIGINS,
+    ANALYZER_INGEST_URL,
+    ANALYZER_PATH,
+    CLOUD_FUNCTION_URL,
+    DRAIN_DEADLINE_SECONDS,
+    analyzer_ingest_request,
+    audio_payload,
+    build_agent_settings,
+    event_data,
+    get_deepgram_client,
+    load_agent_prompt,
+    upload_id_from_data,
+)
+from agent_tools import registry as tools, prefetch as prefetch_tools
+from audio_relay import AudioRelay, RelayStats
+from rate_limiter import RateLimiter, DAILY_CALL_LIMIT, rate_limit_message
+from readiness import Readiness
+from transcript_manager import TranscriptManager
+
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins=ALLOWED_ORIGINS,
+    ping_timeout=10,
+    ping_interval=5,
+    # Accept first so 'rate_limited' reaches the client before it is dropped
+    always_connect=True,
+)
+
+rate_limiter = RateLimiter(daily_limit=DAILY_CALL_LIMIT)
+print(f"📞 Rate limiter: {DAILY_CALL_LIMIT} calls/day")
+
+sessions = {}          # Socket.IO sid -> CallSession
+draining = False       # Set on shutdown; new calls are refused from then on
+_background = set()    # Fire-and-forget tasks (kept referenced until done)
+audio_totals = RelayStats()
+_http = None
+# Deepgram client, agent prompt and upload client are built after startup (see warm_up)
+readiness = Readiness(["deepgram_client", "agent_prompt", "upload_client"])
+
+
+def http_client():
+    """Shared connection-pooled HTTP client for uploads and analyzer pushes"""
+    global _http
+    if _http is None:
+        import httpx
+        _http = httpx.AsyncClient(timeout=10)
+    return _http
+
+
+def spawn(coro):
+    """Run a coroutine in the background without losing the task reference"""
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+async def send_transcript_to_cloud(payload):
+    """Upload a finished transcript to the Cloud Function"""
+    import httpx
+
+    if payload is None:
+        return None
+    try:
+        response = await http_client().post(CLOUD_FUNCTION_URL, json=payload)
+        response.raise_for_status()
+        print(f"Transcript uploaded successfully: {response.text}")
+        readiness.used("upload_client")
+    except httpx.HTTPError as exc:
+        print(f"Failed to upload transcript: {exc}")
+        return None
+
+    if ANALYZER_INGEST_URL:
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        await notify_analyzer(upload_id_from_data(data))
+    return response
+
+
+async def notify_analyzer(upload_id):
+    """Push a new upload to the analyzer ingest endpoint so it is processed right away"""
+    import httpx
+
+    body, headers = analyzer_ingest_request(upload_id)
+    try:
+        response = await http_client().post(ANALYZER_INGEST_URL, json=body, headers=headers, timeout=5)
+        response.raise_for_status()
+        print(f"📥 Analyzer notified of upload {upload_id or '(reconcile)'}")
+        return True
+    except httpx.HTTPError as exc:
+        # The analyzer's reconciliation poll will still pick the upload up
+        print(f"⚠️ Failed to notify analyzer: {exc}")
+        return False
+
+
+async def trigger_grok_analyzer():
+    """Launch the Grok Analyzer as a subprocess without blocking the event loop"""
+    if ANALYZER_INGEST_URL:
+        # Uploads are pushed to the ingest service as they are created
+        return None
+    if not ANALYZER_PATH.exists():
+        print(f"❌ Grok Analyzer not found at {ANALYZER_PATH}")
+        return None
+    try:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(ANALYZER_PATH),
+            cwd=str(ANALYZER_PATH.parent),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        print(f"❌ Error triggering Grok Analyzer: {e}")
+        return None
+    print(f"🤖 Grok Analyzer started (PID: {process.pid})")
+    spawn(_report_analyzer(process))
+    return process
+
+
+async def _report_analyzer(process):
+    stdout, stderr = await process.communicate()
+    if stdout:
+        print("📤 Analyzer output:", stdout.decode(errors='replace')[-200:])
+    if stderr:
+        print("⚠️  Analyzer errors:", stderr.decode(errors='replace')[-200:])
+    print(f"✅ Analyzer (PID {process.pid}) exited with code {process.returncode}")
+
+
+class CallSession:
+    """State of one voice call: its transcript and its Deepgram agent connection"""
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.transcript = TranscriptManager()
+        self.dg_connection = None
+        self.dg_started = False
+        self.audio = AudioRelay(totals=audio_totals)
+        self.saved = False
+        self.archived_to = None
+        self.uploaded = False
+        self._start_task = None
+
+    async def emit(self, event, data=None):
+        await sio.emit(event, data, to=self.sid)
+
+    async def start(self):
+        """Start the transcript session and open the Deepgram connection in the background"""
+        session_id = self.transcript.start_session()
+        print(f"New session started: {session_id} (sid {self.sid}, {len(sessions)} active)")
+        await self.emit('session_started', {'session_id': session_id})
+
+        self.dg_connection = get_deepgram_client().agent.asyncwebsocket.v("1")
+        self._register_handlers()
+        # Return from the connect handler right away; the handshake runs as a task
+        self._start_task = asyncio.create_task(self._start_deepgram())
+        return session_id
+
+    async def _start_deepgram(self):
+        try:
+            if not await self.dg_connection.start(build_agent_settings(load_agent_prompt(), tools.definitions())):
+                print("Failed to start Deepgram connection")
+                await self.emit('error', {'data': {'message': 'Failed to start connection'}})
+                return
+            self.dg_started = True
+            readiness.used("deepgram_client")
+            readiness.used("agent_prompt")
+            print(f"✅ Deepgram connection started for {self.sid}")
+        except Exception as e:
+            print(f"❌ Deepgram start error: {e}")
+            await self.emit('error', {'data': {'message': f'Deepgram error: {str(e)}'}})
+
+    def _register_handlers(self):
+        from deepgram import AgentWebSocketEvents, FunctionCallResponse
+
+        transcript = self.transcript
+        emit = self.emit
+
+        # Event handlers (self = Deepgram WebSocket client)
+        async def on_open(self, *args, **kwargs):
+            open_event = kwargs.get('open') or (args[0] if args else None)
+            if open_event:
+                await emit('open', {'data': event_data(open_event)})
+
+        async def on_welcome(self, *args, **kwargs):
+            welcome = kwargs.get('welcome') or (args[0] if args else None)
+            if welcome:
+                await emit('welcome', {'data': event_data(welcome)})
+                # Signal to frontend that Deepgram is ready for audio
+                await emit('deepgram_ready')
+
+        async def on_conversation_text(self, *args, **kwargs):
+            conversation_text = kwargs.get('conversation_text') or (args[0] if args else None)
+            if not conversation_text:
+                return
+            message = getattr(conversation_text, 'text', None) or getattr(conversation_text, 'content', '') or ''
+            role = getattr(conversation_text, 'role', 'unknown')
+            if role == 'user':
+                transcript.add_user_message(message)
+            elif role in ('agent', 'assistant'):
+                transcript.add_agent_message(message)
+            await emit('conversation', {
+                'data': event_data(conversation_text),
+                'transcript': transcript.get_transcript_text()
+            })
+
+        async def on_agent_thinking(self, *args, **kwargs):
+            agent_thinking = kwargs.get('agent_thinking') or (args[0] if args else None)
+            if not agent_thinking:
+                return
+            thinking_text = getattr(agent_thinking, 'content', None) or getattr(agent_thinking, 'text', '') or ''
+            transcript.add_thinking(thinking_text)
+            await emit('thinking', {
+                'data': event_data(agent_thinking),
+                'transcript': transcript.get_transcript_text()
+            })
+
+        async def answer_function_call(dg, function_call_request):
+            output = await tools.call_async(function_call_request.function_name, function_call_request.input)
+            response = FunctionCallResponse(
+                function_call_id=function_call_request.function_call_id,
+                output=output
+            )
+            await dg.send(str(response))
+            await emit('function_call', {'data': event_data(function_call_request), 'output': output})
+
+        async def on_function_call_request(self, *args, **kwargs):
+            function_call_request = kwargs.get('function_call_request') or (args[0] if args else None)
+            if not function_call_request:
+                return
+            # Answer in the background so agent audio keeps flowing while the tool runs
+            spawn(answer_function_call(self, function_call_request))
+
+        async def on_agent_started_speaking(self, *args, **kwargs):
+            agent_started_speaking = kwargs.get('agent_started_speaking') or (args[0] if args else None)
+            if agent_started_speaking:
+                await emit('agent_speaking', {'data': event_data(agent_started_speaking)})
+
+        async def on_user_started_speaking(self, *args, **kwargs):
+            user_started_speaking = kwargs.get('user_started_speaking') or (args[0] if args else None)
+            if user_started_speaking:
+                await emit('user_started_speaking', {'data': event_data(user_started_speaking)})
+
+        async def on_audio_data(self, *args, **kwargs):
+            """Agent speech arrives as binary frames (passed as data=bytes)"""
+            event = kwargs.get('data') or kwargs.get('audio_data') or (args[0] if args else None)
+            audio = audio_payload(event) if event is not None else None
+            if audio:
+                await emit('agent_audio', {'audio': audio, 'format': 'pcm16'})
+
+        async def on_error(self, *args, **kwargs):
+            error = kwargs.get('error') or (args[0] if args else None)
+            if not error:
+                return
+            print(f"⚠️ Deepgram error: {error}")
+            await emit('error', {'data': {
+                'message': str(error),
+                'type': error.__class__.__name__,
+                'details': event_data(error)
+            }})
+
+        dg = self.dg_connection
+        dg.on(AgentWebSocketEvents.Open, on_open)
+        dg.on(AgentWebSocketEvents.Welcome, on_welcome)
+        dg.on(AgentWebSocketEvents.ConversationText, on_conversation_text)
+        dg.on(AgentWebSocketEvents.AgentThinking, on_agent_thinking)
+        dg.on(AgentWebSocketEvents.FunctionCallRequest, on_function_call_request)
+        dg.on(AgentWebSocketEvents.AgentStartedSpeaking, on_agent_started_speaking)
+        dg.on(AgentWebSocketEvents.UserStartedSpeaking, on_user_started_speaking)
+        dg.on(AgentWebSocketEvents.AudioData, on_audio_data)
+        dg.on(AgentWebSocketEvents.Error, on_error)
+
+    async def relay_audio(self, data):
+        """Forward one microphone PCM frame to Deepgram unless the silence gate drops it"""
+        frame, keepalive, received = self.audio.plan(data)
+        if keepalive and self.dg_started:
+            await self.dg_connection.send(keepalive)
+        if frame is None:
+            return
+        if not self.dg_started:
+            # Deepgram handshake still running; the client should wait for 'deepgram_ready'
+            self.audio.sent(frame, received, ok=False)
+            return
+        ok = await self.dg_connection.send(frame)
+        self.audio.sent(frame, received, ok=ok)
+
+    async def save(self, trigger_analyzer=True):
+        """
+        Archive and upload the transcript once, then trigger the analyzer
+
+        Args:
+            trigger_analyzer: Launch the analyzer after the upload (drain triggers it once for all calls)
+
+        Returns:
+            Archive location of the transcript, or None if it was already saved
+        """
+        if self.saved:
+            return None
+        self.saved = True
+        transcript_file = self.archive()
+        if not transcript_file:
+            return None
+        self.uploaded = await send_transcript_to_cloud(self.transcript.build_upload_payload()) is not None
+        if trigger_analyzer:
+            await trigger_grok_analyzer()
+        return transcript_file
+
+    def archive(self):
+        """
+        Append the transcript to the shared local archive (once per call)
+
+        Returns:
+            Archive location of the transcript, or None if there is nothing to archive
+        """
+        if self.archived_to is None:
+            self.archived_to = self.transcript.finalize()
+            if self.archived_to:
+                print(f"✓ Transcript saved to {self.archived_to}")
+        return self.archived_to
+
+    async def close(self):
+        """Stop the Deepgram connection (or its pending handshake)"""
+        if self._start_task and not self._start_task.done():
+            self._start_task.cancel()
+        self.dg_started = False
+        if self.audio.stats.frames_in:
+            stats = self.audio.stats.report()
+            print(f"🎙️  {self.sid}: {stats['audio_seconds_sent']}s of {stats['audio_seconds_in']}s audio sent "
+                  f"({stats['suppressed_ratio']:.0%} silence suppressed), relay p95 {stats['relay_latency_ms']['p95']} ms")
+        if self.dg_connection is not None:
+            try:
+                await self.dg_connection.finish()
+            except Exception as e:
+                print(f"Warning: Error closing Deepgram connection: {e}")
+            self.dg_connection = None
+
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    if draining:
+        await sio.emit('server_draining', {'message': 'Server is restarting, please call again shortly.'}, to=sid)
+        return False
+
+    # Check rate limit before spinning up Deepgram
+    if not rate_limiter.try_acquire():
+        status = rate_limiter.status()
+        print(f"🚫 Rate limit reached ({status['used']}/{status['limit']})")
+        await sio.emit('rate_limited', {'message': rate_limit_message(status), **status}, to=sid)
+        return False  # reject the connection
+
+    session = CallSession(sid)
+    sessions[sid] = session
+    await session.start()
+
+
+@sio.event
+async def disconnect(sid, *args):
+    session = sessions.pop(sid, None)
+    if session is None:
+        return
+    print(f"Client {sid} disconnected, saving session")
+    try:
+        await session.save()
+    except Exception as e:
+        print(f"Error saving transcript: {e}")
+    await session.close()
+
+
+@sio.event
+async def end_call(sid):
+    """Explicitly end call and save transcript"""
+    session = sessions.get(sid)
+    if session is None:
+        return
+    print(f"\n=== End call requested ({sid}) ===")
+    try:
+        await session.save()
+    except Exception as e:
+        print(f"Error saving transcript: {e}")
+    await session.emit('call_ended', {'status': 'success'})
+
+
+@sio.event
+async def user_audio(sid, data):
+    """Browser microphone audio: binary linear16 frames at 16 kHz"""
+    session = sessions.get(sid)
+    if session is not None:
+        await session.relay_audio(data)
+
+
+def _find_session(session_id):
+    """
+    Open call by transcript session ID
+
+    Calls run concurrently here, so there is no "current" call to fall back
+    to: the browser sends the ID it received in session_started.
+    """
+    for session in sessions.values():
+        if session.transcript.current_session_id == session_id:
+            return session
+    return None
+
+
+# --- Plain HTTP routes (everything outside /socket.io) ---
+
+async def _read_json(receive):
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    try:
+        data = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def http_app(scope, receive, send):
+    """Minimal JSON router for the REST endpoints of app.py"""
+    if scope["type"] != "http":
+        return
+
+    headers = dict(scope.get("headers") or [])
+    origin = headers.get(b"origin", b"").decode()
+    response_headers = [(b"content-type", b"application/json")]
+    if origin in ALLOWED_ORIGINS:
+        response_headers += [
+            (b"access-control-allow-origin", origin.encode()),
+            (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+            (b"access-control-allow-headers", b"Content-Type, Authorization"),
+            (b"vary", b"Origin"),
+        ]
+
+    async def respond(status, body):
+        data = json.dumps(body).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": response_headers + [(b"content-length", str(len(data)).encode())]})
+        await send({"type": "http.response.body", "body": data})
+
+    method, path = scope["method"], scope["path"]
+    query = parse_qs(scope.get("query_string", b"").decode())
+
+    if method == "OPTIONS":
+        return await respond(204, {})
+    if method == "GET" and path == "/":
+        return await respond(200, {"service": "CivicGrid Voice Agent", "status": "running"})
+    if method == "GET" and path == "/health":
+        if draining:
+            return await respond(503, {"status": "draining", "sessions": len(sessions)})
+        return await respond(200, {"status": "ok", "sessions": len(sessions)})
+    if method == "GET" and path == "/ready":
+        report = readiness.report()
+        if draining:
+            report["status"] = "draining"
+        return await respond(200 if readiness.is_ready() and not draining else 503, report)
+    if method == "GET" and path == "/tool-stats":
+        return await respond(200, tools.stats.report())
+    if method == "GET" and path == "/audio-stats":
+        return await respond(200, audio_totals.report())
+    if method == "GET" and path == "/rate-limit":
+        return await respond(200, rate_limiter.status())
+    if method == "GET" and path == "/transcript":
+        session_id = (query.get("session_id") or [None])[0]
+        if not session_id:
+            return await respond(400, {'error': 'session_id is required'})
+        session = _find_session(session_id)
+        if session is None:
+            return await respond(404, {'error': 'no active session with that session_id'})
+        return await respond(200, {
+            'transcript': session.transcript.get_transcript_text(),
+            'session_id': session_id
+        })
+    if method == "POST" and path == "/upload_picture":
+        data = await _read_json(receive)
+        picture = data.get('picture')
+        if picture is None:
+            return await respond(400, {'error': 'picture field is required'})
+        if not data.get('session_id'):
+            return await respond(400, {'error': 'session_id is required'})
+        session = _find_session(data['session_id'])
+        if session is None:
+            return await respond(404, {'error': 'no active session with that session_id'})
+        session.transcript.set_picture(picture)
+        return await respond(200, {'status': 'ok'})
+    return await respond(404, {"error": "not found"})
+
+
+async def drain(deadline=DRAIN_DEADLINE_SECONDS):
+    """
+    Refuse new calls, then flush every open call within a deadline
+
+    Transcripts are archived first, one session at a time through the shared
+    archive (local, fast), then all uploads and all Deepgram closes run
+    concurrently. Whatever is still running at the deadline is cancelled;
+    its transcript stays in the local archive.
+
+    Args:
+        deadline: Seconds allowed for uploads and Deepgram closes
+
+    Returns:
+        Report dictionary with per-outcome session IDs and the elapsed time
+    """
+    global draining
+    draining = True
+    started = time.monotonic()
+    open_sessions = list(sessions.values())
+    sessions.clear()
+    if open_sessions:
+        print(f"\n=== Draining {len(open_sessions)} open session(s), deadline {deadline:.0f}s ===")
+
+    for session in open_sessions:
+        try:
+            session.archive()
+        except Exception as e:
+            print(f"Error archiving transcript: {e}")
+    tasks = [asyncio.create_task(s.save(trigger_analyzer=False)) for s in open_sessions]
+    tasks += [asyncio.create_task(s.close()) for s in open_sessions]
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    report = {
+        "sessions": len(open_sessions),
+        "uploaded": [s.transcript.current_session_id for s in open_sessions if s.uploaded],
+        "archived_only": [s.transcript.current_session_id for s in open_sessions if s.archived_to and not s.uploaded],
+        "deepgram_closed": sum(1 for s in open_sessions if s.dg_connection is None),
+        "timed_out": len(pending),
+    }
+    if report["uploaded"] and deadline - (time.monotonic() - started) > 0:
+        await trigger_grok_analyzer()
+    report["elapsed_seconds"] = round(time.monotonic() - started, 3)
+
+    if open_sessions:
+        print(f"✓ Drain: {len(report['uploaded'])} uploaded, {len(report['archived_only'])} archived only "
+              f"(upload failed or cut off), {report['deepgram_closed']}/{len(open_sessions)} Deepgram connections closed, "
+              f"{report['timed_out']} task(s) cut at the deadline, {report['elapsed_seconds']}s")
+        for session_id in report["archived_only"]:
+            print(f"  ⚠️ {session_id} is only in the local archive")
+    return report
+
+
+async def warm_up():
+    """Build the lazily-initialized dependencies off the event loop"""
+    await asyncio.to_thread(readiness.warm, "agent_prompt", load_agent_prompt)
+    await asyncio.to_thread(readiness.warm, "deepgram_client", get_deepgram_client)
+    # Import httpx in a thread, then create the client on the loop it belongs to
+    # (a single attempt: backing off here would block the loop)
+    await asyncio.to_thread(import_module, "httpx")
+    readiness.warm("upload_client", http_client, attempts=1)
+    await asyncio.to_thread(prefetch_tools)
+
+
+async def on_startup():
+    spawn(warm_up())
+
+
+async def on_shutdown():
+    """Drain whatever is still open when the ASGI server shuts down"""
+    await drain()
+    if _http is not None:
+        await _http.aclose()
+    print("Shutting down gracefully...")
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=http_app, socketio_path='socket.io',
+                       on_startup=on_startup, on_shutdown=on_shutdown)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    class DrainingServer(uvicorn.Server):
+        """uvicorn server that drains open calls on the first SIGTERM/SIGINT before exiting"""
+        _drain_task = None
+
+        def handle_exit(self, sig, frame):
+            if self._drain_task is not None:
+                # Second signal: stop waiting for the drain
+                return super().handle_exit(sig, frame)
+            self._captured_signals.append(sig)
+            self._drain_task = asyncio.get_event_loop().create_task(self._drain_then_exit())
+
+        async def _drain_then_exit(self):
+            try:
+                await drain()
+            finally:
+                self.should_exit = True
+
+    port = int(os.environ.get('PORT', 3000))
+    server = DrainingServer(uvicorn.Config(app, host='0.0.0.0', port=port, log_level='warning'))
+    server.run()
@@ -0,0 +1,184 @@
+import os
+import math
+import time
+from collections import deque
+
+try:
+    import audioop  # C implementation; removed from the stdlib in Python 3.13
+except ImportError:
+    audioop = None
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # linear16
+
+# RMS (in 16-bit sample units) below which a frame counts as silence; 0 disables the gate
+SILENCE_RMS_THRESHOLD = int(os.environ.get("SILENCE_RMS_THRESHOLD", "300"))
+# Audio still sent after speech stops, so Deepgram's endpointing (300 ms) sees the pause
+SILENCE_HANGOVER_MS = int(os.environ.get("SILENCE_HANGOVER_MS", "700"))
+# While the gate is closed, send a KeepAlive this often so the agent socket stays open
+KEEPALIVE_INTERVAL_SECONDS = float(os.environ.get("AUDIO_KEEPALIVE_SECONDS", "5"))
+
+KEEPALIVE_MESSAGE = '{"type": "KeepAlive"}'
+
+
+def frame_bytes(data):
+    """
+    Normalize a user_audio payload to a bytes-like PCM frame
+
+    Binary Socket.IO attachments are used as-is (no copy); the older
+    {'audio': [int, ...]} shape is converted for compatibility.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return data
+    if isinstance(data, dict):
+        data = data.get('audio')
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return data
+    if isinstance(data, list):
+        return bytes(data)
+    return None
+
+
+def frame_rms(frame):
+    """RMS energy of a little-endian 16-bit PCM frame"""
+    if len(frame) < SAMPLE_WIDTH:
+        return 0
+    if len(frame) % SAMPLE_WIDTH:
+        frame = memoryview(frame)[:-1]
+    if audioop is not None:
+        return audioop.rms(frame, SAMPLE_WIDTH)
+    # Pure-Python fallback: every 4th sample is plenty for a speech/silence decision
+    samples = memoryview(frame).cast('B').cast('h')[::4]
+    return int(math.sqrt(sum(s * s for s in samples) / len(samples)))
+
+
+class SilenceGate:
+    """
+    Energy-based gate that drops silent microphone frames
+
+    A frame is sent when its RMS is above the threshold, and for
+    hangover_ms of audio after the last loud frame so trailing syllables and
+    the end-of-utterance pause still reach the speech-to-text endpointing.
+    """
+
+    def __init__(self, threshold=SILENCE_RMS_THRESHOLD, hangover_ms=SILENCE_HANGOVER_MS):
+        self.threshold = threshold
+        self.hangover_ms = hangover_ms
+        self._hangover_left = 0.0
+
+    def should_send(self, frame):
+        """Return True if the frame should be forwarded upstream"""
+        if not self.threshold:
+            return True
+        if frame_rms(frame) >= self.threshold:
+            self._hangover_left = self.hangover_ms
+            return True
+        if self._hangover_left > 0:
+            self._hangover_left -= len(frame) / SAMPLE_WIDTH / SAMPLE_RATE * 1000
+            return True
+        return False
+
+
+class RelayStats:
+    """Frame counts, suppressed audio and per-frame relay latency for the user_audio path"""
+
+    def __init__(self, window=2000):
+        self.frames_in = 0
+        self.frames_sent = 0
+        self.frames_suppressed = 0
+        self.frames_dropped = 0   # arrived before the Deepgram connection was up, or send failed
+        self.bytes_in = 0
+        self.bytes_sent = 0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, size, sent, latency=None, dropped=False):
+        """
+        Record one incoming frame
+
+        Args:
+            size: Frame size in bytes
+            sent: True if the frame was forwarded to Deepgram
+            latency: Seconds from receipt to send completion (sent frames only)
+            dropped: True if the frame was lost rather than suppressed
+        """
+        self.frames_in += 1
+        self.bytes_in += size
+        if sent:
+            self.frames_sent += 1
+            self.bytes_sent += size
+            if latency is not None:
+                self._latencies.append(latency)
+        elif dropped:
+            self.frames_dropped += 1
+        else:
+            self.frames_suppressed += 1
+
+    def report(self):
+        """Summary dictionary (latencies in milliseconds over the recent window)"""
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+
+        seconds = lambda n: round(n / SAMPLE_WIDTH / SAMPLE_RATE, 1)
+        return {
+            "frames_in": self.frames_in,
+            "frames_sent": self.frames_sent,
+            "frames_suppressed": self.frames_suppressed,
+            "frames_dropped": self.frames_dropped,
+            "audio_seconds_in": seconds(self.bytes_in),
+            "audio_seconds_sent": seconds(self.bytes_sent),
+            "suppressed_ratio": round(1 - self.bytes_sent / self.bytes_in, 3) if self.bytes_in else 0.0,
+            "relay_latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99), "max": pct(100)},
+        }
+
+
+class AudioRelay:
+    """
+    Per-call user_audio path: silence gate, KeepAlive while gated, and stats
+
+    The relay only decides what to send (plan) and records the outcome
+    (sent); the server does the send itself, so the same relay works with
+    the sync (app.py) and async (asgi_app.py) Deepgram clients.
+    """
+
+    def __init__(self, totals=None):
+        self.gate = SilenceGate()
+        self.stats = RelayStats()
+        self.totals = totals          # Optional server-wide RelayStats
+        self._last_sent = time.monotonic()
+
+    def _record(self, *args, **kwargs):
+        self.stats.record(*args, **kwargs)
+        if self.totals is not None:
+            self.totals.record(*args, **kwargs)
+
+    def plan(self, data):
+        """
+        Decide what to send for an incoming frame
+
+        Returns:
+            Tuple of (frame or None, keepalive message or None, receipt time)
+        """
+        received = time.perf_counter()
+        frame = frame_bytes(data)
+        if frame is None:
+            return None, None, received
+        if self.gate.should_send(frame):
+            return frame, None, received
+        self._record(len(frame), sent=False)
+        now = time.monotonic()
+        if now - self._last_sent >= KEEPALIVE_INTERVAL_SECONDS:
+            self._last_sent = now
+            return None, KEEPALIVE_MESSAGE, received
+        return None, None, received
+
+    def sent(self, frame, received, ok=True):
+        """Record the outcome of forwarding a frame returned by plan()"""
+        if ok:
+            self._last_sent = time.monotonic()
+            self._record(len(frame), sent=True, latency=time.perf_counter() - received)
+        else:
+            self._record(len(frame), sent=False, dropped=True)
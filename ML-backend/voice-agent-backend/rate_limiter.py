@@ -0,0 +1,48 @@
+import os
+import threading
+from datetime import date, timedelta
+
+
+# --- Rate Limiter ---
+class RateLimiter:
+    """Simple daily call counter to control Deepgram API costs."""
+    
+    def __init__(self, daily_limit: int = 15):
+        self.daily_limit = daily_limit
+        self._today = date.today()
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def _reset_if_new_day(self):
+        today = date.today()
+        if today != self._today:
+            self._today = today
+            self._count = 0
+    
+    def try_acquire(self) -> bool:
+        """Try to use a call slot. Returns True if allowed."""
+        with self._lock:
+            self._reset_if_new_day()
+            if self._count >= self.daily_limit:
+                return False
+            self._count += 1
+            print(f"📞 Call {self._count}/{self.daily_limit} today")
+            return True
+    
+    def status(self) -> dict:
+        with self._lock:
+            self._reset_if_new_day()
+            return {
+                "used": self._count,
+                "limit": self.daily_limit,
+                "remaining": max(0, self.daily_limit - self._count),
+                "reset_date": str(self._today + timedelta(days=1)),
+            }
+
+
+DAILY_CALL_LIMIT = int(os.environ.get("DAILY_CALL_LIMIT", "5"))
+
+
+def rate_limit_message(status):
+    """Message sent with the 'rate_limited' event"""
+    return f"Daily voice call limit reached ({status['limit']} calls/day). Resets tomorrow."
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+
+WARMUP_ATTEMPTS = int(os.environ.get("WARMUP_ATTEMPTS", "5"))
+WARMUP_BACKOFF_SECONDS = float(os.environ.get("WARMUP_BACKOFF_SECONDS", "0.5"))
+WARMUP_MAX_BACKOFF_SECONDS = 30.0
+
+
+class Readiness:
+    """
+    Tracks which startup dependencies are warmed
+
+    /health only says the process is up; /ready reports this state so the
+    platform routes calls to an instance once the Deepgram client, agent
+    prompt and upload client are built. A failed warm-up step is retried
+    with backoff, and a component that still failed is marked warmed the
+    first time real traffic uses it successfully (see used).
+    """
+
+    def __init__(self, components, attempts=WARMUP_ATTEMPTS, backoff=WARMUP_BACKOFF_SECONDS):
+        self.started = time.monotonic()
+        self.ready_at = None
+        self._components = {name: None for name in components}   # name -> seconds taken, None until warmed
+        self._errors = {}
+        self._lock = threading.Lock()
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+
+    def warm(self, name, fn, attempts=None):
+        """
+        Run one warm-up step, retrying failures with exponential backoff
+
+        Blocks while backing off, so call it from a thread.
+
+        Args:
+            name: Component name (one of the names given to the constructor)
+            fn: Callable that builds or loads the component
+            attempts: Tries before giving up (default: the constructor's attempts)
+
+        Returns:
+            True if the step succeeded
+        """
+        attempts = attempts or self.attempts
+        delay = self.backoff
+        for attempt in range(1, attempts + 1):
+            started = time.monotonic()
+            try:
+                fn()
+            except Exception as e:
+                with self._lock:
+                    self._errors[name] = str(e)
+                if attempt == attempts:
+                    print(f"❌ Warm-up of {name} failed after {attempts} attempt(s): {e}")
+                    return False
+                print(f"⚠️ Warm-up of {name} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, WARMUP_MAX_BACKOFF_SECONDS)
+                continue
+            self.mark(name, time.monotonic() - started)
+            return True
+
+    def mark(self, name, seconds=0.0):
+        """Record a component as warmed"""
+        with self._lock:
+            self._components[name] = round(seconds, 4)
+            self._errors.pop(name, None)
+            if self.ready_at is None and all(v is not None for v in self._components.values()):
+                self.ready_at = time.monotonic()
+                print(f"✅ Ready {self.ready_at - self.started:.2f}s after start")
+
+    def used(self, name):
+        """Record a successful real use of a component (marks it warmed if warm-up had failed)"""
+        if self._components.get(name) is None:
+            self.mark(name)
+
+    def is_ready(self):
+        return self.ready_at is not None
+
+    def report(self):
+        """JSON body for the /ready probe"""
+        with self._lock:
+            return {
+                "status": "ready" if self.ready_at is not None else "warming",
+                "components": {name: seconds is not None for name, seconds in self._components.items()},
+                "warmup_seconds": dict(self._components),
+                "errors": dict(self._errors),
+                "seconds_to_ready": round(self.ready_at - self.started, 3) if self.ready_at is not None else None,
+            }
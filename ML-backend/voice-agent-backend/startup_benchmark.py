@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the voice agent server
+
+Each run starts a fresh server process, launched the way the Dockerfile
+launches it, and measures:
+  - import:   time to import the server module
+  - listening: time until /health answers
+  - ready:    time until /ready returns 200 (Deepgram client, prompt and upload client warmed)
+
+Exits non-zero when the slowest time-to-ready exceeds the target, so it can
+gate deploys that would slow down scale-out.
+
+Usage:
+    python startup_benchmark.py --server asgi --runs 5 --target 3
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+from pathlib import Path
+
+HERE = Path(__file__).parent
+# Server mode -> (module, command line as in the Dockerfile; {port} is filled in)
+SERVERS = {
+    "asgi": ("asgi_app", [sys.executable, "asgi_app.py"]),
+    "eventlet": ("app", [sys.executable, "-m", "gunicorn", "--worker-class", "eventlet", "-w", "1",
+                         "--timeout", "120", "--bind", "127.0.0.1:{port}", "app:app"]),
+    "dev": ("app", [sys.executable, "app.py"]),
+}
+DEFAULT_TARGET = float(os.environ.get("STARTUP_TARGET_SECONDS", "3"))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+def measure_import(module):
+    """Seconds to import the server module in a fresh interpreter"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True,
+                            env={**os.environ, "DAILY_CALL_LIMIT": os.environ.get("DAILY_CALL_LIMIT", "5")})
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_start(command, timeout=60):
+    """
+    Start the server and time until it listens and until it is ready
+
+    Args:
+        command: Server command line ({port} placeholders are filled in)
+        timeout: Seconds to wait for readiness
+
+    Returns:
+        Tuple of (seconds to /health 200, seconds to /ready 200), None where not reached
+    """
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([arg.format(port=port) for arg in command], cwd=HERE,
+                               env={**os.environ, "PORT": str(port)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening = ready = None
+    try:
+        while time.perf_counter() - started < timeout and process.poll() is None:
+            if listening is None and _status(f"{base}/health") == 200:
+                listening = time.perf_counter() - started
+            if listening is not None and _status(f"{base}/ready") == 200:
+                ready = time.perf_counter() - started
+                break
+            time.sleep(0.01)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return listening, ready
+
+
+def _summary(name, values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return f"{name:<10} n/a"
+    return (f"{name:<10} median {statistics.median(values) * 1000:7.0f} ms   "
+            f"max {max(values) * 1000:7.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure voice agent cold-start time")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="asgi",
+                        help="Server mode to start (eventlet = gunicorn eventlet worker, dev = python app.py)")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold starts")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET, help="Max seconds to /ready")
+    args = parser.parse_args()
+
+    module, command = SERVERS[args.server]
+    imports, listening, ready = [], [], []
+    for run in range(1, args.runs + 1):
+        imports.append(measure_import(module))
+        up, warm = measure_start(command)
+        listening.append(up)
+        ready.append(warm)
+        print(f"  run {run}: import {imports[-1] * 1000:.0f} ms, "
+              f"listening {up * 1000 if up else float('nan'):.0f} ms, "
+              f"ready {warm * 1000 if warm else float('nan'):.0f} ms")
+
+    print(f"\n⏱️  {args.server} ({module}) cold start over {args.runs} run(s)")
+    print(_summary("import", imports))
+    print(_summary("listening", listening))
+    print(_summary("ready", ready))
+
+    if any(r is None for r in ready):
+        print("❌ Server did not become ready in every run")
+        return 1
+    if max(ready) > args.target:
+        print(f"❌ Slowest time-to-ready {max(ready):.2f}s exceeds target {args.target:.2f}s")
+        return 1
+    print(f"✅ Time-to-ready within target ({args.target:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
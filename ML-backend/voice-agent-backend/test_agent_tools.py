@@ -0,0 +1,67 @@
+import json
+import pytest
+import agent_tools
+
+
+WORK_ITEMS = [
+    {"id": "w1", "case_id": "CASE-1", "sourceRef": "user_uploads/up1", "status": "identified",
+     "category": "pothole", "location": {"free_text": "Main Street and 5th", "coordinates": {"lat": 37.0, "lon": -122.0}},
+     "scores": {"priority_score": 40}},
+    {"id": "w2", "case_id": "CASE-2", "status": "completed", "category": "pothole",
+     "location": {"free_text": "Main Street and 5th", "coordinates": {"lat": 37.0001, "lon": -122.0}},
+     "scores": {"priority_score": 90}},
+    {"id": "w3", "case_id": "CASE-3", "status": "fixing", "category": "pothole",
+     "location": {"free_text": "Main Street and 5th"}, "scores": {"priority_score": None}},
+    {"id": "w4", "case_id": "CASE-4", "status": "gov_denied", "category": "graffiti",
+     "location": {"free_text": "Oak Avenue"}, "scores": None},
+]
+UPLOADS = [{"id": "up9", "transcript": "..."}, {"id": "up10", "transcript": "..."}]
+
+
+@pytest.fixture
+def endpoints(monkeypatch):
+    """Fake GET endpoints; the upload endpoint ignores upload_id and returns every document"""
+    calls = []
+
+    def fake_get_json(url, params=None):
+        calls.append((url, params))
+        if url == agent_tools.GET_ALL_WORK_URL:
+            return {"workItems": WORK_ITEMS}
+        return {"count": len(UPLOADS), "documents": UPLOADS}
+
+    monkeypatch.setattr(agent_tools, "_get_json", fake_get_json)
+    monkeypatch.setattr(agent_tools.registry, "cache", agent_tools.TTLCache())
+    return calls
+
+
+def test_status_by_case_id_and_upload_id(endpoints):
+    assert agent_tools.check_report_status("CASE-1")["status"] == "identified"
+    assert agent_tools.check_report_status("up1")["report_id"] == "CASE-1"
+
+
+def test_status_of_unanalyzed_upload_needs_an_exact_id_match(endpoints):
+    assert agent_tools.check_report_status("up9") == {
+        "found": True, "report_id": "up9", "status": "received",
+        "status_description": "received and still being reviewed"}
+    # The endpoint returned documents, but none of them is this ID
+    assert agent_tools.check_report_status("made-up-42") == {"found": False, "report_id": "made-up-42"}
+
+
+def test_nearby_skips_closed_reports(endpoints):
+    result = agent_tools.find_nearby_reports("Main Street and 5th", lat=37.0, lon=-122.0, category="pothole")
+    ids = [report["report_id"] for report in result["reports"]]
+    assert "CASE-2" not in ids
+    assert ids == ["CASE-1", "CASE-3"]
+    assert agent_tools.find_nearby_reports("Oak Avenue")["count"] == 0
+
+
+def test_nearby_tolerates_missing_scores(endpoints):
+    result = agent_tools.find_nearby_reports("Main Street and 5th")
+    assert {report["report_id"] for report in result["reports"]} == {"CASE-1", "CASE-3"}
+
+
+def test_registry_call_returns_json(endpoints):
+    output = json.loads(agent_tools.registry.call("check_report_status", '{"report_id": "CASE-3"}'))
+    assert output["status_description"] == "being fixed now"
+    output = json.loads(agent_tools.registry.call("no_such_tool", "{}"))
+    assert "error" in output
@@ -0,0 +1,54 @@
+import json
+import asyncio
+import pytest
+import asgi_app
+from transcript_archive import TranscriptArchive
+from transcript_manager import TranscriptManager
+
+
+def request(method, path, query="", body=None):
+    """Run one request through the HTTP router and return (status, JSON body)"""
+    sent = []
+
+    async def receive():
+        return {"body": json.dumps(body).encode() if body is not None else b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(), "headers": []}
+    asyncio.run(asgi_app.http_app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch):
+    """Two concurrent calls, the second one started last"""
+    archive = TranscriptArchive(tmp_path)
+    monkeypatch.setattr(asgi_app, "sessions", {})
+    ids = []
+    for sid, said in [("sid-a", "pothole on Oak"), ("sid-b", "graffiti on Pine")]:
+        session = asgi_app.CallSession(sid)
+        session.transcript = TranscriptManager(archive=archive)
+        ids.append(session.transcript.start_session())
+        session.transcript.add_user_message(said)
+        asgi_app.sessions[sid] = session
+    return ids
+
+
+def test_requests_without_session_id_are_rejected(calls):
+    assert request("GET", "/transcript")[0] == 400
+    assert request("POST", "/upload_picture", body={"picture": "abc"})[0] == 400
+    assert all(s.transcript.picture_data is None for s in asgi_app.sessions.values())
+
+
+def test_requests_reach_the_named_call(calls):
+    first, _ = calls
+    status, body = request("GET", "/transcript", query=f"session_id={first}")
+    assert status == 200 and "pothole on Oak" in body["transcript"] and "graffiti" not in body["transcript"]
+
+    assert request("POST", "/upload_picture", body={"picture": "abc", "session_id": first})[0] == 200
+    assert asgi_app.sessions["sid-a"].transcript.picture_data == "abc"
+    assert asgi_app.sessions["sid-b"].transcript.picture_data is None
+
+    assert request("GET", "/transcript", query="session_id=unknown")[0] == 404
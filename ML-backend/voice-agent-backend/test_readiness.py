@@ -0,0 +1,41 @@
+from readiness import Readiness
+
+
+def flaky(failures):
+    calls = []
+
+    def build():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RuntimeError("not yet")
+    return build, calls
+
+
+def test_warm_retries_until_success():
+    readiness = Readiness(["client"], attempts=3, backoff=0)
+    build, calls = flaky(2)
+    assert readiness.warm("client", build)
+    assert len(calls) == 3
+    assert readiness.is_ready()
+    assert readiness.report()["errors"] == {}
+
+
+def test_failed_warm_up_is_marked_on_first_real_use():
+    readiness = Readiness(["client", "prompt"], attempts=2, backoff=0)
+    build, calls = flaky(5)
+    assert not readiness.warm("client", build)
+    assert len(calls) == 2
+    readiness.warm("prompt", lambda: None)
+    assert not readiness.is_ready()
+    assert readiness.report()["errors"]["client"] == "not yet"
+
+    readiness.used("client")
+    assert readiness.is_ready()
+    assert readiness.report()["errors"] == {}
+
+
+def test_used_keeps_the_warm_up_time():
+    readiness = Readiness(["client"])
+    readiness.mark("client", 1.5)
+    readiness.used("client")
+    assert readiness.report()["warmup_seconds"]["client"] == 1.5
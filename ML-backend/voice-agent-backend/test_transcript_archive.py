@@ -0,0 +1,54 @@
+import gzip
+import threading
+from transcript_archive import TranscriptArchive, shared_archive
+
+
+def test_append_and_get(tmp_path):
+    archive = TranscriptArchive(tmp_path)
+    archive.append("A", "transcript A", started_at="2025-10-26 07:00:00")
+    archive.append("B", "transcript B", started_at="2025-10-26 08:00:00")
+    assert archive.get("A") == "transcript A"
+    assert archive.get("B") == "transcript B"
+    assert [entry["session_id"] for entry, _ in archive.range(since="2025-10-26 07:30:00")] == ["B"]
+
+
+def test_two_instances_on_one_directory_keep_offsets_consistent(tmp_path):
+    a = TranscriptArchive(tmp_path)
+    b = TranscriptArchive(tmp_path)
+    a.append("A", "transcript A " * 50)
+    b.append("B", "transcript B " * 50)
+    a.append("C", "transcript C " * 50)
+
+    for archive in (a, b, TranscriptArchive(tmp_path)):
+        assert archive.get("A") == "transcript A " * 50
+        assert archive.get("B") == "transcript B " * 50
+        assert archive.get("C") == "transcript C " * 50
+    # The segment is still one valid multi-member gzip file
+    segment = next(tmp_path.glob("segment_*.gz"))
+    assert gzip.decompress(segment.read_bytes()).decode().count("transcript") == 150
+
+
+def test_instances_appending_concurrently(tmp_path):
+    archives = [TranscriptArchive(tmp_path, max_segment_bytes=2000) for _ in range(4)]
+
+    def write(n, archive):
+        for i in range(25):
+            archive.append(f"s{n}_{i}", f"session {n} line {i} " * 20)
+
+    threads = [threading.Thread(target=write, args=(n, archive)) for n, archive in enumerate(archives)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reader = TranscriptArchive(tmp_path)
+    assert len(reader) == 100
+    for n in range(4):
+        for i in range(25):
+            assert reader.get(f"s{n}_{i}") == f"session {n} line {i} " * 20
+    assert len(list(tmp_path.glob("segment_*.gz"))) > 1
+
+
+def test_shared_archive_is_one_instance_per_directory(tmp_path):
+    assert shared_archive(tmp_path) is shared_archive(str(tmp_path))
+    assert shared_archive(tmp_path) is not shared_archive(tmp_path / "other")
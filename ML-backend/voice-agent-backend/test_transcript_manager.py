@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import asgi_app
+from transcript_archive import TranscriptArchive
+from transcript_manager import TranscriptManager
+
+
+def test_finalize_archives_each_session_once(tmp_path):
+    archive = TranscriptArchive(tmp_path)
+    manager = TranscriptManager(archive=archive)
+    session_id = manager.start_session()
+    manager.add_user_message("There is a pothole on Main Street")
+
+    # end_call followed by disconnect
+    assert manager.finalize() is not None
+    assert manager.finalize() is None
+    assert len(archive) == 1
+    assert archive.get(session_id).count("Session Ended") == 1
+
+    # A new session on the same manager archives again
+    manager.start_session()
+    assert manager.finalize() is not None
+    assert len(archive) == 2
+
+
+def test_concurrent_finalize_archives_once(tmp_path):
+    archive = TranscriptArchive(tmp_path)
+    manager = TranscriptManager(archive=archive)
+    manager.start_session()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.finalize())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(1 for r in results if r) == 1
+    segment = next(tmp_path.glob("segment_*.gz"))
+    assert archive.entry(manager.current_session_id)["length"] == segment.stat().st_size
+
+
+def test_drain_archives_every_session_intact(tmp_path, monkeypatch):
+    archive = TranscriptArchive(tmp_path)
+    monkeypatch.setattr(asgi_app, "sessions", {})
+    uploads = []
+
+    async def fake_upload(payload):
+        uploads.append(payload)
+        return "ok"
+
+    async def fake_analyzer():
+        return None
+
+    monkeypatch.setattr(asgi_app, "send_transcript_to_cloud", fake_upload)
+    monkeypatch.setattr(asgi_app, "trigger_grok_analyzer", fake_analyzer)
+    monkeypatch.setattr(asgi_app, "draining", False)
+
+    for n in range(5):
+        session = asgi_app.CallSession(f"sid{n}")
+        session.transcript = TranscriptManager(archive=archive)
+        session.transcript.start_session()
+        session.transcript.add_user_message(f"report number {n} " * 40)
+        asgi_app.sessions[session.sid] = session
+
+    report = asyncio.run(asgi_app.drain(deadline=5))
+    assert len(report["uploaded"]) == 5
+    assert len(uploads) == 5
+    for session_id in report["uploaded"]:
+        n = int(archive.get(session_id).split("report number ")[1].split()[0])
+        assert archive.get(session_id).count(f"report number {n} ") == 40
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Compressed, indexed transcript archive
+
+Sessions are appended to rotating segment files as independent gzip members
+(so a segment is still a valid .gz file for zcat). A JSONL index records the
+segment, byte offset and length of every session, which gives random access
+by session ID and ordered range scans by start time without touching the
+other sessions.
+
+Usage:
+    python transcript_archive.py migrate transcripts ../transcripts
+    python transcript_archive.py list --since 2025-10-26
+    python transcript_archive.py get 20251026_070526
+"""
+import os
+import re
+import sys
+import gzip
+import hashlib
+import json
+import uuid
+import argparse
+import threading
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl  # POSIX only; without it appends are serialized within one process
+except ImportError:
+    fcntl = None
+
+DEFAULT_ARCHIVE_DIR = os.environ.get("TRANSCRIPT_ARCHIVE_DIR", "transcripts/archive")
+DEFAULT_SEGMENT_BYTES = int(os.environ.get("TRANSCRIPT_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+
+INDEX_NAME = "index.jsonl"
+LOCK_NAME = ".lock"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def new_session_id(now=None):
+    """Timestamped session ID with a random suffix so concurrent sessions never collide"""
+    now = now or datetime.now()
+    return f"{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_archive(root=DEFAULT_ARCHIVE_DIR):
+    """The process-wide TranscriptArchive for a directory (all calls append through it)"""
+    key = str(Path(root).resolve())
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = TranscriptArchive(root)
+        return _shared[key]
+
+
+class TranscriptArchive:
+    """
+    Append-only store of session transcripts in compressed segment files
+
+    Appends hold a file lock on the archive directory and take their offset
+    from the segment's size on disk, so several instances or worker
+    processes can share one directory. Index entries written by other
+    instances are picked up on the next append or lookup miss.
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR, max_segment_bytes=DEFAULT_SEGMENT_BYTES):
+        self.root = Path(root)
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._entries = {}        # session_id -> index entry (latest save wins)
+        self._by_time = None      # sorted [(started_at, session_id)], rebuilt lazily
+        self._index_pos = 0       # bytes of index.jsonl already read
+        self._segment = None
+        self._segment_size = 0
+        self._load_index()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, session_id):
+        return self.entry(session_id) is not None
+
+    def _load_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._refresh_index()
+        self._refresh_segment()
+
+    def _refresh_index(self):
+        """Read index lines appended since the last read (by this or another instance)"""
+        index_path = self.root / INDEX_NAME
+        if not index_path.exists():
+            return
+        with open(index_path, 'rb') as f:
+            f.seek(self._index_pos)
+            data = f.read()
+        # A line still being written by another process is left for the next read
+        complete = data[:data.rfind(b"\n") + 1]
+        self._index_pos += len(complete)
+        for line in complete.decode('utf-8').splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._entries[entry["session_id"]] = entry
+                self._by_time = None
+
+    def _refresh_segment(self):
+        """Find the newest segment and its size on disk"""
+        segments = sorted(self.root.glob("segment_*.gz"))
+        if segments:
+            self._segment = segments[-1].name
+            self._segment_size = segments[-1].stat().st_size
+        else:
+            self._segment = "segment_000001.gz"
+            self._segment_size = 0
+
+    def _rotate(self):
+        number = int(re.search(r"(\d+)", self._segment).group(1)) + 1
+        self._segment = f"segment_{number:06d}.gz"
+        self._segment_size = 0
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the archive directory, shared with other instances and processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.root / LOCK_NAME, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append(self, session_id, text, started_at=None, ended_at=None, **metadata):
+        """
+        Append one session to the archive
+
+        Args:
+            session_id: Unique session ID (see new_session_id)
+            text: Full transcript text
+            started_at: Session start time string ("YYYY-MM-DD HH:MM:SS")
+            ended_at: Session end time string
+            **metadata: Extra JSON-serializable fields stored in the index
+
+        Returns:
+            The index entry for the stored session
+        """
+        data = gzip.compress(text.encode('utf-8'), mtime=0)
+        with self._lock, self._file_lock():
+            # Another instance may have written or rotated since our last append
+            self._refresh_segment()
+            if self._segment_size and self._segment_size + len(data) > self.max_segment_bytes:
+                self._rotate()
+            with open(self.root / self._segment, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            self._segment_size = offset + len(data)
+
+            entry = {
+                "session_id": session_id,
+                "started_at": started_at,
+                "ended_at": ended_at,
+                "segment": self._segment,
+                "offset": offset,
+                "length": len(data),
+                "lines": text.count("\n") + 1 if text else 0,
+                **metadata,
+            }
+            with open(self.root / INDEX_NAME, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+            # Picks up our own line plus any other instance's since the last read
+            self._refresh_index()
+        return entry
+
+    def _read(self, entry, handles=None):
+        path = self.root / entry["segment"]
+        if handles is None:
+            with open(path, 'rb') as f:
+                f.seek(entry["offset"])
+                data = f.read(entry["length"])
+        else:
+            if entry["segment"] not in handles:
+                handles[entry["segment"]] = open(path, 'rb')
+            f = handles[entry["segment"]]
+            f.seek(entry["offset"])
+            data = f.read(entry["length"])
+        return gzip.decompress(data).decode('utf-8')
+
+    def get(self, session_id):
+        """Return the transcript text for a session, or None if it is not archived"""
+        entry = self.entry(session_id)
+        return self._read(entry) if entry else None
+
+    def entry(self, session_id):
+        """Return the index entry for a session, or None"""
+        if session_id not in self._entries:
+            with self._lock:
+                self._refresh_index()
+        return self._entries.get(session_id)
+
+    def range(self, since=None, until=None):
+        """
+        Iterate over sessions that started within [since, until], oldest first
+
+        Args:
+            since: Start time string (inclusive), or None for the beginning
+            until: End time string (inclusive), or None for the end
+
+        Yields:
+            (index entry, transcript text) tuples
+        """
+        with self._lock:
+            self._refresh_index()
+            if self._by_time is None:
+                self._by_time = sorted((e["started_at"] or "", sid) for sid, e in self._entries.items())
+            by_time = self._by_time
+        lo = bisect_left(by_time, (since or "",))
+        hi = bisect_right(by_time, (until + "\uffff",)) if until else len(by_time)
+        handles = {}
+        try:
+            for _, session_id in by_time[lo:hi]:
+                entry = self._entries[session_id]
+                yield entry, self._read(entry, handles)
+        finally:
+            for f in handles.values():
+                f.close()
+
+
+def _parse_transcript_times(text, fallback_id):
+    started = re.search(r"^Session Started: (.+)$", text, re.MULTILINE)
+    ended = re.findall(r"^Session Ended: (.+)$", text, re.MULTILINE)
+    started_at = started.group(1).strip() if started else None
+    if not started_at:
+        try:
+            started_at = datetime.strptime(fallback_id[:15], "%Y%m%d_%H%M%S").strftime(TIME_FORMAT)
+        except ValueError:
+            started_at = None
+    return started_at, (ended[-1].strip() if ended else None)
+
+
+def migrate(directories, archive, delete=False):
+    """
+    Move legacy transcripts/transcript_<timestamp>.txt files into the archive
+
+    Already-archived session IDs are skipped, so the migration can be re-run.
+
+    Returns:
+        Dictionary with migrated, skipped and deleted counts
+    """
+    counts = {"migrated": 0, "skipped": 0, "deleted": 0}
+    for directory in directories:
+        for path in sorted(Path(directory).glob("transcript_*.txt")):
+            session_id = path.stem[len("transcript_"):]
+            text = path.read_text()
+            if session_id in archive and archive.get(session_id) != text:
+                # Same-second timestamp from another session: keep both
+                session_id = f"{session_id}_{hashlib.sha1(text.encode('utf-8')).hexdigest()[:8]}"
+            if session_id not in archive:
+                started_at, ended_at = _parse_transcript_times(text, session_id)
+                archive.append(session_id, text, started_at, ended_at, source=str(path))
+                counts["migrated"] += 1
+            else:
+                counts["skipped"] += 1
+            if delete:
+                path.unlink()
+                counts["deleted"] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed transcript archive")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_DIR, help="Archive directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_migrate = sub.add_parser("migrate", help="Import legacy transcript_*.txt directories")
+    p_migrate.add_argument("directories", nargs="+")
+    p_migrate.add_argument("--delete", action="store_true", help="Delete the .txt files once archived")
+
+    p_get = sub.add_parser("get", help="Print one session")
+    p_get.add_argument("session_id")
+
+    p_list = sub.add_parser("list", help="List sessions by start time")
+    p_list.add_argument("--since", help="e.g. 2025-10-26 or '2025-10-26 07:00:00'")
+    p_list.add_argument("--until")
+    p_list.add_argument("--text", action="store_true", help="Print transcript text too")
+
+    args = parser.parse_args()
+    archive = TranscriptArchive(args.archive)
+
+    if args.command == "migrate":
+        counts = migrate(args.directories, archive, delete=args.delete)
+        sizes = sum(p.stat().st_size for p in Path(args.archive).glob("segment_*.gz"))
+        print(f"✓ Migrated {counts['migrated']} transcript(s), skipped {counts['skipped']} already archived"
+              f"{', deleted ' + str(counts['deleted']) if args.delete else ''}")
+        print(f"  Archive: {len(archive)} session(s), {sizes} bytes in segments")
+    elif args.command == "get":
+        text = archive.get(args.session_id)
+        if text is None:
+            print(f"Session {args.session_id} not found", file=sys.stderr)
+            return 1
+        print(text)
+    elif args.command == "list":
+        for entry, text in archive.range(args.since, args.until):
+            print(f"{entry['session_id']}  {entry['started_at']}  {entry['lines']} lines  "
+                  f"{entry['segment']}@{entry['offset']}")
+            if args.text:
+                print(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import threading
+from datetime import datetime
+from agent_config import (
+    CLOUD_FUNCTION_URL,
+    ANALYZER_INGEST_URL,
+    analyzer_ingest_request,
+    upload_id_from_data,
+)
+from transcript_archive import shared_archive, new_session_id
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def upload_session():
+    """Shared requests.Session for uploads (keeps the TLS connection to the Cloud Function warm)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Deferred: requests is only needed once the first call ends
+                import requests
+                _session = requests.Session()
+    return _session
+
+
+# Transcript management
+class TranscriptManager:
+    def __init__(self, archive=None):
+        self.transcript_lines = []
+        self.current_session_id = None
+        self.session_started_at = None
+        self.picture_data = None
+        self.archived = False
+        self._finalize_lock = threading.Lock()
+        # One archive per process: every call appends through the same instance
+        self.archive = archive if archive is not None else shared_archive()
+    
+    def start_session(self):
+        """Start a new transcript session"""
+        now = datetime.now()
+        self.current_session_id = new_session_id(now)
+        self.session_started_at = now.strftime('%Y-%m-%d %H:%M:%S')
+        self.transcript_lines = []
+        self.picture_data = None
+        self.archived = False
+        self.transcript_lines.append(f"=== Conversation Transcript ===")
+        self.transcript_lines.append(f"Session Started: {self.session_started_at}")
+        self.transcript_lines.append("")
+        return self.current_session_id
+    
+    def add_user_message(self, message):
+        """Add user message to transcript"""
+        if message.strip():
+            self.transcript_lines.append(f"[User] {message}")
+    
+    def add_agent_message(self, message):
+        """Add agent message to transcript"""
+        if message.strip():
+            self.transcript_lines.append(f"[Agent] {message}")
+    
+    def add_thinking(self, thinking_text):
+        """Add agent thinking to transcript"""
+        if thinking_text.strip():
+            self.transcript_lines.append(f"[Agent Thinking] {thinking_text}")
+    
+    def finalize(self):
+        """
+        Close the session and append it to the compressed archive (no upload)
+        
+        Only the first call per session archives; later calls (end_call followed
+        by disconnect, or a drain racing a disconnect) return None.
+        """
+        with self._finalize_lock:
+            if not self.current_session_id or self.archived:
+                return None
+            self.archived = True
+        
+        ended_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.transcript_lines.append("")
+        self.transcript_lines.append(f"Session Ended: {ended_at}")
+        
+        try:
+            entry = self.archive.append(
+                self.current_session_id,
+                self.get_transcript_text(),
+                started_at=self.session_started_at,
+                ended_at=ended_at,
+            )
+        except Exception:
+            self.archived = False
+            raise
+        return f"{self.archive.root / entry['segment']}#{self.current_session_id}"
+
+    def save_transcript(self):
+        """Append transcript to the compressed archive and upload it"""
+        transcript_file = self.finalize()
+        if transcript_file:
+            self.send_transcript_to_cloud()
+        return transcript_file
+    
+    def get_transcript_text(self):
+        """Get current transcript as string"""
+        return '\n'.join(self.transcript_lines)
+
+    def set_picture(self, picture_base64: str | None):
+        """Store the uploaded picture data for later upload"""
+        self.picture_data = picture_base64
+
+    def build_upload_payload(self):
+        """Cloud Function payload for the current transcript, or None if it is empty"""
+        if not self.transcript_lines:
+            return None
+        return {
+            "transcript": self.get_transcript_text(),
+            "picture": self.picture_data or ""
+        }
+
+    def send_transcript_to_cloud(self):
+        """Send the current transcript to the Cloud Function"""
+        import requests
+
+        payload = self.build_upload_payload()
+        if payload is None:
+            return None
+
+        try:
+            response = upload_session().post(CLOUD_FUNCTION_URL, json=payload, timeout=10)
+            response.raise_for_status()
+            print(f"Transcript uploaded successfully: {response.text}")
+        except requests.RequestException as exc:
+            print(f"Failed to upload transcript: {exc}")
+            return None
+
+        if ANALYZER_INGEST_URL:
+            notify_analyzer(_upload_id_from_response(response))
+        return response
+
+def _upload_id_from_response(response):
+    """Pull the new upload document ID out of the Cloud Function response"""
+    try:
+        return upload_id_from_data(response.json())
+    except ValueError:
+        return None
+
+def notify_analyzer(upload_id):
+    """Push a new upload to the analyzer ingest endpoint so it is processed right away"""
+    import requests
+
+    body, headers = analyzer_ingest_request(upload_id)
+    try:
+        response = upload_session().post(ANALYZER_INGEST_URL, json=body, headers=headers, timeout=5)
+        response.raise_for_status()
+        print(f"📥 Analyzer notified of upload {upload_id or '(reconcile)'}")
+        return True
+    except requests.RequestException as exc:
+        # The analyzer's reconciliation poll will still pick the upload up
+        print(f"⚠️ Failed to notify analyzer: {exc}")
+        return False
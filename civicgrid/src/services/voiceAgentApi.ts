@@ -29,6 +29,9 @@ export interface VoiceAgentEvents {
   onError?: (data: { data: { message: string; type?: string; details?: unknown } }) => void;
 }
 
+// 1024 samples at 16 kHz = 64 ms per user_audio frame
+const MIC_FRAME_SAMPLES = 1024;
+
 class VoiceAgentService {
   private socket: Socket | null = null;
   private audioContext: AudioContext | null = null;
@@ -39,6 +42,8 @@ class VoiceAgentService {
   private audioQueue: Int16Array[] = [];
   private isPlaying = false;
   private events: VoiceAgentEvents = {};
+  // Transcript session of the current call; the backend needs it to tell concurrent calls apart
+  private sessionId: string | null = null;
   
   // ML Backend URL - update this based on your deployment
   private ML_BACKEND_URL = import.meta.env.VITE_ML_BACKEND_URL || 'https://localhost:3000';
@@ -82,9 +87,8 @@ class VoiceAgentService {
     // Initialize audio context for playing received audio
     await this.initAudioContext();
 
-    // No need for microphone - server uses pyaudio
-    console.log('Note: Voice agent uses server microphone/speakers');
-    console.log('Speak into the server\'s microphone to interact');
+    // Ask for the microphone up front so the permission prompt does not delay the call
+    await this.initMicrophone();
 
     // Connect to Socket.IO server
     console.log('Connecting to Socket.IO at:', this.ML_BACKEND_URL);
@@ -106,12 +110,13 @@ class VoiceAgentService {
     this.socket.on('connect', () => {
       console.log('Connected to voice agent server');
       this.isConnected = true;
-      this.startAudioStreaming();
       this.events.onConnect?.();
     });
 
     this.socket.on('deepgram_ready', () => {
       console.log('Deepgram agent is ready');
+      // Frames sent before the agent connection is up would be dropped server-side
+      this.startAudioStreaming();
       this.events.onReady?.();
     });
 
@@ -129,6 +134,7 @@ class VoiceAgentService {
 
     this.socket.on('session_started', (data) => {
       console.log('Session started:', data);
+      this.sessionId = data.session_id;
       this.events.onSessionStarted?.(data);
     });
 
@@ -180,10 +186,46 @@ class VoiceAgentService {
     });
   }
 
+  private async initMicrophone() {
+    if (this.mediaStream) return;
+    try {
+      this.mediaStream = await navigator.mediaDevices.getUserMedia({
+        audio: {
+          channelCount: 1,
+          echoCancellation: true, // keep the agent's own voice out of the upstream audio
+          noiseSuppression: true,
+          autoGainControl: true,
+        },
+      });
+    } catch (error) {
+      console.error('Microphone access denied:', error);
+      this.events.onError?.({ data: { message: 'Microphone access is required for voice calls' } });
+    }
+  }
+
   private startAudioStreaming() {
-    // Audio is handled by server-side microphone/speaker via pyaudio
-    // Frontend just displays transcript
-    console.log('Voice agent using server-side microphone and speakers');
+    if (!this.audioContext || !this.mediaStream || this.processor) return;
+
+    // The audio context runs at 16 kHz, so the browser resamples the mic for us
+    this.mediaStreamSource = this.audioContext.createMediaStreamSource(this.mediaStream);
+    this.processor = this.audioContext.createScriptProcessor(MIC_FRAME_SAMPLES, 1, 1);
+
+    this.processor.onaudioprocess = (event) => {
+      if (!this.socket?.connected) return;
+      const input = event.inputBuffer.getChannelData(0);
+      const pcm = new Int16Array(input.length);
+      for (let i = 0; i < input.length; i++) {
+        const s = Math.max(-1, Math.min(1, input[i]));
+        pcm[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+      }
+      // Sent as a binary attachment (linear16); the server gates silent frames
+      this.socket.emit('user_audio', pcm.buffer);
+    };
+
+    this.mediaStreamSource.connect(this.processor);
+    // ScriptProcessor only runs while connected to the destination; it outputs silence
+    this.processor.connect(this.audioContext.destination);
+    console.log('Streaming microphone audio to voice agent');
   }
 
   private stopAudioStreaming() {
@@ -238,13 +280,17 @@ class VoiceAgentService {
 
   async uploadPicture(pictureBase64: string): Promise<void> {
     try {
+      if (!this.sessionId) {
+        throw new Error('No call in progress');
+      }
       const response = await fetch(`${this.ML_BACKEND_URL}/upload_picture`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          picture: pictureBase64
+          picture: pictureBase64,
+          session_id: this.sessionId
         })
       });
 
@@ -259,7 +305,11 @@ class VoiceAgentService {
 
   async getTranscript(): Promise<{ transcript: string; session_id: string }> {
     try {
-      const response = await fetch(`${this.ML_BACKEND_URL}/transcript`);
+      if (!this.sessionId) {
+        throw new Error('No call in progress');
+      }
+      const params = new URLSearchParams({ session_id: this.sessionId });
+      const response = await fetch(`${this.ML_BACKEND_URL}/transcript?${params}`);
       if (!response.ok) {
         throw new Error('Failed to get transcript');
       }
@@ -283,6 +333,7 @@ class VoiceAgentService {
       this.socket.disconnect();
       this.socket = null;
     }
+    this.sessionId = null;
     
     this.stopAudioStreaming();
     